@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime
+import database
+from database import BLOB_ORIGINAL, Database, TRANSFER_FIELDS
+from image_loader import file_digest, store_image_file
+
+# 导出的归档是一个目录：notes.jsonl 每行一个便签（第一行是文件头），
+# 背景图片按内容哈希存放在 assets/ 下，多个便签引用同一张图片时只保存一份；
+# 导入时图片存进数据库，便签按哈希引用
+ARCHIVE_FORMAT = 'desktop-note-archive'
+ARCHIVE_VERSION = 1
+NOTES_FILE = 'notes.jsonl'
+ASSETS_DIR = 'assets'
+
+# 导入的行缺少某列时使用的值，与 Database._insert_note 一致
+NOTE_DEFAULTS = {
+    'content': '',
+    'position_x': 50,
+    'position_y': 50,
+    'size_width': 300,
+    'size_height': 200,
+    'is_top_most': False,
+    'is_bottom_most': False,
+    'background_color': '#FFFF99',
+    'font_family': 'Arial',
+    'font_size': 12,
+    'font_color': '#000000',
+    'background_image': None,
+    'background_blob': None,
+}
+
+# 每处理多少个便签报告一次进度
+PROGRESS_INTERVAL = 1000
+
+# asset_name 生成的路径：<哈希前两位>/<SHA-1哈希><扩展名>
+_ASSET_NAME = re.compile(r'([0-9a-f]{2})/\1[0-9a-f]{38}(\.[0-9a-z]+)?')
+
+_encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+
+def asset_name(digest, ext):
+    # 归档内的相对路径，统一使用 /；同一种格式的不同扩展名统一，避免同一张图片存两份
+    ext = ext.lower()
+    return f"{digest[:2]}/{digest}{'.jpg' if ext == '.jpeg' else ext}"
+
+
+def asset_path(assets_root, name):
+    # 导入时名称来自归档文件：只接受 asset_name 的格式，含 .. 或绝对路径的名称不能指向 assets/ 之外
+    if not isinstance(name, str) or not _ASSET_NAME.fullmatch(name):
+        raise ValueError(f'无效的图片路径: {name!r}')
+    return os.path.join(assets_root, *name.split('/'))
+
+
+def write_asset(target, write):
+    # 先写临时文件再改名，中途失败不会留下不完整的图片
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp = target + '.part'
+    with open(temp, 'wb') as f:
+        write(f)
+    os.replace(temp, target)
+    return os.path.getsize(target)
+
+
+def export_blob(db, digest, assets_root):
+    # 数据库中的图片分块写出；返回 (归档内路径, 新写入的字节数)，图片不存在时路径为None
+    original = db.blob_variants(digest).get(BLOB_ORIGINAL)
+    if original is None:
+        return None, 0
+    name = asset_name(digest, '.' + original['format'])
+    target = asset_path(assets_root, name)
+    if os.path.exists(target):
+        return name, 0
+    return name, write_asset(target, lambda f: db.copy_blob(digest, BLOB_ORIGINAL, f))
+
+
+def export_file(path, assets_root):
+    # 还没有存进数据库的图片文件，按内容哈希复制
+    name = asset_name(file_digest(path), os.path.splitext(path)[1])
+    target = asset_path(assets_root, name)
+    if os.path.exists(target):
+        return name, 0
+    with open(path, 'rb') as source:
+        return name, write_asset(target, lambda f: shutil.copyfileobj(source, f))
+
+
+def export_notes(db, archive_dir, progress=None, batch_size=500):
+    # 流式导出：游标分批读取，逐行写出，内存占用与便签数量无关
+    # progress(已导出的便签数, 便签总数)
+    start = time.perf_counter()
+    assets_root = os.path.join(archive_dir, ASSETS_DIR)
+    os.makedirs(assets_root, exist_ok=True)
+    total = db.count_notes()
+    stats = {'notes': 0, 'assets': 0, 'asset_bytes': 0, 'missing_assets': 0}
+    exported_assets = {}  # 图片哈希或本机路径 -> 归档内路径，同一张图片只处理一次
+    notes_path = os.path.join(archive_dir, NOTES_FILE)
+    with open(notes_path + '.part', 'w', encoding='utf-8', newline='\n') as f:
+        header = {'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION,
+                  'exported_at': datetime.now().isoformat(timespec='seconds'), 'notes': total}
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for row in db.iter_export_rows(batch_size):
+            # 归档里只记录图片在 assets/ 下的路径
+            source = row.pop('background_blob') or row['background_image']
+            if source:
+                if source in exported_assets:
+                    row['background_image'] = exported_assets[source]
+                else:
+                    if row['background_image'] == source:
+                        name, nbytes = export_file(source, assets_root) if os.path.isfile(source) else (None, 0)
+                    else:
+                        name, nbytes = export_blob(db, source, assets_root)
+                    exported_assets[source] = row['background_image'] = name
+                    if nbytes:
+                        stats['assets'] += 1
+                        stats['asset_bytes'] += nbytes
+                if row['background_image'] is None:
+                    stats['missing_assets'] += 1
+            row['is_top_most'] = bool(row['is_top_most'])
+            row['is_bottom_most'] = bool(row['is_bottom_most'])
+            f.write(_encoder.encode(row) + '\n')
+            stats['notes'] += 1
+            if progress is not None and stats['notes'] % PROGRESS_INTERVAL == 0:
+                progress(stats['notes'], total)
+    os.replace(notes_path + '.part', notes_path)
+    if progress is not None:
+        progress(stats['notes'], total)
+    stats['bytes'] = os.path.getsize(notes_path)
+    stats['ms'] = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def read_header(f):
+    line = f.readline()
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != ARCHIVE_FORMAT:
+        raise ValueError('不是便签导出文件')
+    if header.get('version', 0) > ARCHIVE_VERSION:
+        raise ValueError(f"导出文件版本 {header.get('version')} 高于当前支持的版本 {ARCHIVE_VERSION}")
+    return header
+
+
+def referenced_assets(f):
+    # 第一遍只收集便签引用的图片，不保留便签数据
+    names = set()
+    for line in f:
+        # 导出时没有图片的便签写的是 null，这些行不需要解析
+        if b'background_image' not in line or b'"background_image": null' in line:
+            continue
+        try:
+            note = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(note, dict) and isinstance(note.get('background_image'), str):
+            names.add(note['background_image'])
+    return names
+
+
+def import_notes(db, archive_dir, progress=None):
+    # 流式导入：先把用到的图片存进数据库，再逐行解析，交给 Database.import_rows 分批插入，
+    # 内存占用与文件大小无关；图片的写入不会提交 import_rows 中未完成的事务
+    # progress(已读取的字节数, 文件总字节数)
+    start = time.perf_counter()
+    archive_assets = os.path.join(archive_dir, ASSETS_DIR)
+    notes_path = os.path.join(archive_dir, NOTES_FILE)
+    total = os.path.getsize(notes_path)
+    stats = {'notes': 0, 'assets': 0, 'asset_bytes': 0, 'missing_assets': 0, 'skipped': 0}
+    imported_assets = {}  # 归档内路径 -> 图片哈希；只记录本次用到的图片
+
+    def store_asset(name):
+        if name in imported_assets:
+            return imported_assets[name]
+        try:
+            path = asset_path(archive_assets, name)
+        except ValueError:
+            path = None
+        digest = None
+        if path is not None and os.path.isfile(path):
+            # 文件名就是内容哈希，存入时重新计算并校验，损坏的图片不导入
+            expected = os.path.basename(name).split('.')[0]
+            if db.has_blob(expected):
+                digest = expected
+            elif file_digest(path) == expected:
+                digest = store_image_file(db, path)
+                stats['assets'] += 1
+                stats['asset_bytes'] += os.path.getsize(path)
+        imported_assets[name] = digest
+        return digest
+
+    def rows(f):
+        now = datetime.now()
+        done = f.tell()
+        for line in f:
+            done += len(line)
+            if not line.strip():
+                continue
+            try:
+                note = json.loads(line)
+            except ValueError:
+                stats['skipped'] += 1
+                continue
+            if not isinstance(note, dict):
+                stats['skipped'] += 1
+                continue
+            values = dict(NOTE_DEFAULTS, created_at=now, updated_at=now)
+            values.update((key, note[key]) for key in TRANSFER_FIELDS if note.get(key) is not None)
+            if values['background_image']:
+                name = values['background_image']
+                values['background_blob'] = imported_assets.get(name) if isinstance(name, str) else None
+                values['background_image'] = None
+                if values['background_blob'] is None:
+                    stats['missing_assets'] += 1
+            stats['notes'] += 1
+            if progress is not None and stats['notes'] % PROGRESS_INTERVAL == 0:
+                progress(done, total)
+            yield tuple(values[key] for key in TRANSFER_FIELDS)
+
+    with open(notes_path, 'rb') as f:
+        read_header(f)
+        body = f.tell()
+        for name in sorted(referenced_assets(f)):
+            store_asset(name)
+        f.seek(body)
+        db.import_rows(rows(f))
+    if progress is not None:
+        progress(total, total)
+    stats['ms'] = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def print_progress(done, total):
+    percent = done * 100 / total if total else 100.0
+    print(f"\r{percent:5.1f}%", end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='便签批量导出/导入')
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('archive', help='导出目录（notes.jsonl 和 assets/）')
+    parser.add_argument('--db', default=database.DB_PATH, help=f'数据库文件，默认 {database.DB_PATH}')
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        if args.command == 'export':
+            stats = export_notes(db, args.archive, progress=print_progress)
+        else:
+            stats = import_notes(db, args.archive, progress=print_progress)
+    except (OSError, ValueError) as e:
+        print(f"\n{'导出' if args.command == 'export' else '导入'}失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        database.close_connections()
+    print(file=sys.stderr)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
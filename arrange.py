@@ -0,0 +1,129 @@
+import math
+from spatial import SpatialGrid
+
+# 便签之间以及与屏幕边缘的间距
+GAP = 10
+# 层叠时每个便签的偏移，以及一列放不下时新的一列相对上一列的偏移
+CASCADE_OFFSET = 30
+CASCADE_COLUMN_OFFSET = 300
+# 平铺时便签不小于的尺寸，与 StickyNote 的最小尺寸一致
+MIN_TILE_SIZE = (200, 150)
+
+
+def rect_tuple(rect):
+    return rect.x(), rect.y(), rect.width(), rect.height()
+
+
+def note_rect(note):
+    # 按模型中记录的位置和大小，与控件在构造、拖动过程中的临时几何无关
+    model = note.model
+    return model.position_x, model.position_y, model.size_width, model.size_height
+
+
+def find_free_position(index, bounds, size, gap=GAP):
+    # 在bounds内从左上角开始逐行查找能放下size且与已有矩形保持gap间距的位置；
+    # 碰到已有矩形时直接跳到它的右侧，一行放不下时跳到这一行遇到的矩形中最高的下边，
+    # 查询次数与沿途的矩形数量成正比，与总数无关
+    # index 为 SpatialGrid 或任何提供 hits(rect) 的对象；没有空位时返回None
+    bx, by, bw, bh = bounds
+    w, h = size
+    y = by + gap
+    while y + h + gap <= by + bh:
+        x = bx + gap
+        next_y = None
+        while x + w + gap <= bx + bw:
+            hits = index.hits((x - gap, y - gap, w + 2 * gap, h + 2 * gap))
+            if not hits:
+                return x, y
+            x = max(rect[0] + rect[2] for rect in hits) + gap
+            bottom = min(rect[1] + rect[3] for rect in hits) + gap
+            next_y = bottom if next_y is None else min(next_y, bottom)
+        if next_y is None:
+            return None
+        y = next_y
+    return None
+
+
+def tile_rects(count, bounds, min_size=MIN_TILE_SIZE, gap=GAP):
+    # 平铺：按区域的宽高比选择行列数，每个便签缩放到一格的大小；
+    # 格子小于最小尺寸时按最小尺寸排列，一屏放不下的依次错开放在下一“页”
+    if count == 0:
+        return []
+    bx, by, bw, bh = bounds
+    cols = max(1, round(math.sqrt(count * bw / bh)))
+    rows = math.ceil(count / cols)
+    cell_w = max(min_size[0], (bw - gap * (cols + 1)) // cols)
+    cell_h = max(min_size[1], (bh - gap * (rows + 1)) // rows)
+    cols = max(1, min(cols, (bw - gap) // (cell_w + gap)))
+    rows = max(1, min(rows, (bh - gap) // (cell_h + gap)))
+    rects = []
+    for i in range(count):
+        page, slot = divmod(i, cols * rows)
+        row, col = divmod(slot, cols)
+        offset = page * CASCADE_OFFSET
+        rects.append((bx + gap + col * (cell_w + gap) + offset, by + gap + row * (cell_h + gap) + offset,
+                      cell_w, cell_h))
+    return rects
+
+
+def cascade_rects(sizes, bounds, gap=GAP):
+    # 层叠：保持大小，从左上角依次向右下错开，超出区域时另起一列
+    bx, by, bw, bh = bounds
+    rects = []
+    column = step = 0
+    for w, h in sizes:
+        x = bx + gap + column * CASCADE_COLUMN_OFFSET + step * CASCADE_OFFSET
+        y = by + gap + step * CASCADE_OFFSET
+        if step and (y + h > by + bh or x + w > bx + bw):
+            column += 1
+            step = 0
+            x = bx + gap + column * CASCADE_COLUMN_OFFSET
+            y = by + gap
+        if x + w > bx + bw:
+            # 列数超出区域宽度时从头开始
+            column = 0
+            x = bx + gap
+        rects.append((x, y, w, h))
+        step += 1
+    return rects
+
+
+def pack_rects(sizes, bounds, gap=GAP):
+    # 紧凑排列：保持大小，从大到小依次放进第一个空位；放不下的层叠在后面
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    grid = SpatialGrid()
+    rects = [None] * len(sizes)
+    overflow = []
+    for i in order:
+        pos = find_free_position(grid, bounds, sizes[i], gap)
+        if pos is None:
+            overflow.append(i)
+            continue
+        rects[i] = (pos[0], pos[1]) + tuple(sizes[i])
+        grid.insert(i, rects[i])
+    for i, rect in zip(overflow, cascade_rects([sizes[i] for i in overflow], bounds, gap)):
+        rects[i] = rect
+    return rects
+
+
+class NoteIndex:
+    # 控制面板中所有便签（包括休眠的占位窗口）的位置索引，按 autosave_key 登记
+    def __init__(self):
+        self.grid = SpatialGrid()
+
+    def __len__(self):
+        return len(self.grid)
+
+    def add(self, note):
+        self.grid.insert(note.autosave_key, note_rect(note))
+
+    def update(self, note):
+        # 只更新已登记的便签，还没加入控制面板的便签忽略
+        if note.autosave_key in self.grid:
+            self.grid.insert(note.autosave_key, note_rect(note))
+
+    def remove(self, note):
+        self.grid.remove(note.autosave_key)
+
+    def free_position(self, bounds, size):
+        return find_free_position(self.grid, bounds, size)
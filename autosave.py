@@ -0,0 +1,217 @@
+import itertools
+import queue
+import threading
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from note_model import FIELD_BITS
+
+# 默认合并窗口（毫秒）：窗口内对同一便签的多次修改只写一次
+DEFAULT_WINDOW_MS = 800
+
+_keys = itertools.count(1)
+
+
+def next_autosave_key():
+    return next(_keys)
+
+
+class AutoSaver(QObject):
+    # 后台写入新便签后通知界面线程：(autosave_key, note_id)
+    note_saved = pyqtSignal(int, int)
+    # 写入失败后交回界面线程：(saves, deleted, 错误信息)，修改重新记为未保存，下次合并窗口再写
+    save_failed = pyqtSignal(object, object, str)
+    # 写入失败时通知界面提示用户
+    error = pyqtSignal(str)
+    # 写入线程写完一批（无论成败）后通知界面线程提交写入期间合并的修改
+    batch_done = pyqtSignal()
+
+    def __init__(self, db, window_ms=DEFAULT_WINDOW_MS, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.dirty = {}  # autosave_key -> StickyNote
+        self.deleted = []  # (autosave_key, note_id)
+        self.note_ids = {}  # 写入线程已知的 autosave_key -> note_id
+
+        # 统计信息
+        self.edits = 0
+        self.writes = 0
+        self.flushes = 0
+        self.failures = 0
+        self.deferred = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(window_ms)
+        self.timer.timeout.connect(self.flush)
+
+        self.note_saved.connect(self._on_note_saved)
+        self.save_failed.connect(self._on_save_failed)
+        self.batch_done.connect(self._on_batch_done)
+
+        # 后台写入线程，界面线程只负责投递快照
+        # 同一时间只有一批在写：写入期间的修改留在dirty中合并（每个便签只取最新的值），写完后作为一批提交
+        self.writing = False
+        self.pending = False
+        self.idle = threading.Condition()
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._writer_loop, name='autosave-writer', daemon=True)
+        self.writer.start()
+
+    def set_window(self, window_ms):
+        self.timer.setInterval(window_ms)
+
+    def mark_dirty(self, note):
+        self.edits += 1
+        self.dirty[note.autosave_key] = note
+        # 窗口从第一次修改开始计时，持续输入时也能定期落盘
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def mark_deleted(self, note):
+        self.dirty.pop(note.autosave_key, None)
+        self.deleted.append((note.autosave_key, note.note_id))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self, wait=False):
+        self.timer.stop()
+        if self.writing:
+            if not wait:
+                self.deferred += 1
+                self.pending = True
+                return
+            self._wait_writer()
+        batch = None
+        if self.dirty or self.deleted:
+            # 在界面线程上读取控件状态，生成快照后交给写入线程
+            # 已有id的便签只写修改过的列，新便签写入完整数据
+            # 正在连续输入的大便签（save_deferred）留到停顿后再写，wait=True时（退出等）照常写入
+            saves = []
+            deferred = {}
+            for key, note in self.dirty.items():
+                if not wait and getattr(note, 'save_deferred', False):
+                    deferred[key] = note
+                    continue
+                changes = note.take_changes()
+                if note.note_id is None:
+                    saves.append((key, None, note.to_note_data()))
+                elif changes:
+                    saves.append((key, note.note_id, changes))
+            if saves or self.deleted:
+                batch = (saves, self.deleted)
+            self.dirty = deferred
+            self.deleted = []
+        with self.idle:
+            self.writing = batch is not None
+            self.pending = False
+            self.idle.notify_all()
+        if batch is not None:
+            self.queue.put(batch)
+        if wait:
+            self._wait_writer()
+
+    def wait_idle(self):
+        # 可在其他线程调用：等到写入线程空闲，写入期间合并的修改也已写完
+        with self.idle:
+            self.idle.wait_for(lambda: not self.writing and not self.pending)
+
+    def _wait_writer(self):
+        with self.idle:
+            self.idle.wait_for(lambda: not self.writing)
+
+    def stop(self):
+        if not self.writer.is_alive():
+            return
+        # 最多等正在写的一批和合并后的一批
+        self.flush(wait=True)
+        self.queue.put(None)
+        self.writer.join()
+
+    def stats(self):
+        return {
+            'edits': self.edits,
+            'writes': self.writes,
+            'coalesced': max(0, self.edits - self.writes),
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'deferred': self.deferred,
+            'last_flush_ms': self.last_flush_ms,
+            'max_flush_ms': self.max_flush_ms,
+            'avg_flush_ms': self.total_flush_ms / self.flushes if self.flushes else 0.0,
+        }
+
+    def _writer_loop(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                self._write_batch(*batch)
+            except Exception as e:
+                print(f"自动保存失败: {e}")
+                self.save_failed.emit(batch[0], batch[1], str(e))
+            finally:
+                self.queue.task_done()
+            with self.idle:
+                self.writing = False
+                self.idle.notify_all()
+            self.batch_done.emit()
+
+    def _write_batch(self, saves, deleted):
+        start = time.perf_counter()
+        rows = [(note_id or self.note_ids.get(key), data) for key, note_id, data in saves]
+        deletes = []
+        for key, note_id in deleted:
+            note_id = note_id or self.note_ids.get(key)
+            if note_id is not None:
+                deletes.append(note_id)
+        note_ids = self.db.write_notes(rows, deletes)
+        # 写入成功后才丢弃已删除便签的id，失败时重试还需要
+        for key, _ in deleted:
+            self.note_ids.pop(key, None)
+
+        for (key, old_id, _), note_id in zip(saves, note_ids):
+            if old_id is None and key not in self.note_ids:
+                self.note_ids[key] = note_id
+                self.note_saved.emit(key, note_id)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.writes += len(saves)
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+
+    def _on_save_failed(self, saves, deleted, message):
+        # 写入线程的事务已回滚：把这批修改合并回便签的修改记录，删除放回队列，由下一次flush重写
+        # 之后又被关闭的便签不再保存
+        self.failures += 1
+        notes = {note.autosave_key: note for note in getattr(self.parent(), 'notes', [])}
+        for key, note_id, data in saves:
+            note = self.dirty.get(key) or notes.get(key)
+            if note is None:
+                continue
+            for name in data:
+                bit = FIELD_BITS.get(name)
+                if bit is not None:
+                    note.model.dirty |= bit
+            self.mark_dirty(note)
+        if deleted:
+            self.deleted = list(deleted) + self.deleted
+            if not self.timer.isActive():
+                self.timer.start()
+        self.error.emit(message)
+
+    def _on_batch_done(self):
+        if self.pending and not self.writing:
+            self.flush()
+
+    def _on_note_saved(self, key, note_id):
+        # 回到界面线程后把数据库id写回便签
+        parent = self.parent()
+        for note in getattr(parent, 'notes', []):
+            if note.autosave_key == key and note.note_id is None:
+                note.note_id = note_id
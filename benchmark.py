@@ -0,0 +1,1102 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 无界面环境下运行
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# offscreen插件对部分窗口操作会输出不支持的警告
+os.environ.setdefault('QT_LOGGING_RULES', 'qt.qpa.*=false')
+
+import database
+from database import Database
+
+_app = None
+
+
+def get_app():
+    global _app
+    from PyQt6.QtWidgets import QApplication
+    _app = QApplication.instance() or QApplication(sys.argv)
+    return _app
+
+
+def mouse_event(event_type, pos, button=None):
+    from PyQt6.QtCore import QEvent, QPointF, Qt
+    from PyQt6.QtGui import QMouseEvent
+    button = button or Qt.MouseButton.LeftButton
+    types = {'press': QEvent.Type.MouseButtonPress, 'move': QEvent.Type.MouseMove, 'release': QEvent.Type.MouseButtonRelease}
+    buttons = Qt.MouseButton.NoButton if event_type == 'release' else button
+    point = QPointF(pos[0], pos[1])
+    return QMouseEvent(types[event_type], point, point, button, buttons, Qt.KeyboardModifier.NoModifier)
+
+
+def timeit(func, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000  # 毫秒/次
+
+
+def time_median(func, repeat=50):
+    # 每次单独计时取中位数，偶发的GC或调度抖动不影响结果，便于多次运行之间比较
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+@contextlib.contextmanager
+def quiet():
+    # 界面代码会打印状态信息，基准运行时不输出
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def process_events(app, rounds=3):
+    for _ in range(rounds):
+        app.processEvents()
+
+
+def legacy_font_menu_open(db_path):
+    # 旧实现：每次调用都新建连接，并重复检查表结构
+    for _ in range(2):
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE IF NOT EXISTS recent_fonts (id INTEGER PRIMARY KEY AUTOINCREMENT, font_name TEXT UNIQUE, last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+        conn.commit()
+        conn.close()
+    conn = sqlite3.connect(db_path)
+    conn.execute('SELECT font_name FROM recent_fonts ORDER BY last_used DESC LIMIT 5').fetchall()
+    conn.close()
+
+
+def shared_font_menu_open(db_path):
+    Database(db_path).get_recent_fonts()
+
+
+def bench_font_menu_open(repeat=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        Database(db_path).add_recent_font('Arial')
+        before = timeit(lambda: legacy_font_menu_open(db_path), repeat)
+        after = timeit(lambda: shared_font_menu_open(db_path), repeat)
+        database.close_connections()
+    return {'font_menu_db_before_ms': before, 'font_menu_db_after_ms': after}
+
+
+def create_legacy_db(db_path, count):
+    # 旧版 init_db 创建的表结构
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT,
+            font TEXT,
+            bg_color TEXT,
+            text_color TEXT,
+            position_x INTEGER,
+            position_y INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO notes (content, font, bg_color, text_color, position_x, position_y) VALUES (?, ?, ?, ?, ?, ?)',
+        ((f'便签内容 {i} ' * 10, '微软雅黑', '#FFFF99', '#000000', i % 1000, i % 800) for i in range(count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench_migration(count=10000):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'legacy.db')
+        create_legacy_db(db_path, count)
+        start = time.perf_counter()
+        Database(db_path)
+        migrate_ms = (time.perf_counter() - start) * 1000
+        # 已是最新版本时的启动开销
+        database._initialized.clear()
+        start = time.perf_counter()
+        Database(db_path)
+        startup_ms = (time.perf_counter() - start) * 1000
+        database.close_connections()
+    return {f'migrate_{count}_notes_ms': migrate_ms, 'startup_schema_check_ms': startup_ms}
+
+
+def run_resize_drag(note, steps, event_interval=0.004):
+    # 模拟250Hz鼠标：每个移动事件后处理事件循环，只统计处理耗时，不含等待
+    app = get_app()
+    start_x, start_y = note.width() - 2, note.height() - 2
+    note.mousePressEvent(mouse_event('press', (start_x, start_y)))
+    frame_times = []
+    for i in range(steps):
+        start = time.perf_counter()
+        note.mouseMoveEvent(mouse_event('move', (start_x + i * 3, start_y + i * 2)))
+        app.processEvents()
+        frame_times.append((time.perf_counter() - start) * 1000)
+        time.sleep(event_interval)
+    start = time.perf_counter()
+    note.mouseReleaseEvent(mouse_event('release', (start_x + steps * 3, start_y + steps * 2)))
+    release_ms = (time.perf_counter() - start) * 1000
+    return frame_times, release_ms
+
+
+def bench_live_resize(steps=120):
+    # 4K背景图的便签拖拽调整大小，比较旧的逐事件精细缩放与实时预览模式
+    get_app()
+    from PyQt6.QtGui import QColor, QPixmap
+    import main as app_main
+    results = {}
+    for name, live in (('eager', False), ('live', True)):
+        note = app_main.StickyNote()
+        note.text_edit.setPlainText('便签内容 ' * 20)
+        image = QPixmap(3840, 2160)
+        image.fill(QColor('#88AACC'))
+        note.background_image = image
+        note.live_resize_enabled = live
+        note.show()
+        frame_times, release_ms = run_resize_drag(note, steps)
+        frame_times.sort()
+        results[f'resize_4k_{name}_frame_avg_ms'] = sum(frame_times) / len(frame_times)
+        results[f'resize_4k_{name}_frame_p95_ms'] = frame_times[int(len(frame_times) * 0.95)]
+        results[f'resize_4k_{name}_release_ms'] = release_ms
+        note.close()
+    return results
+
+
+def legacy_apply_bg_color(notes, color, text_color='#000000'):
+    # 旧实现：每个便签拼接样式表并重新解析
+    for note in notes:
+        note.text_edit.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {color};
+                color: {text_color};
+                border: 1px solid #CCCCCC;
+                border-radius: 5px;
+                padding: 5px;
+            }}
+        """)
+
+
+def bench_recolor(count=500, rounds=5):
+    app = get_app()
+    import main as app_main
+    panel = app_main.ControlPanel()
+    for _ in range(count):
+        note = app_main.StickyNote(panel)
+        panel.apply_note_style(note)
+        panel.notes.append(note)
+    colors = ['#FFB6C1', '#87CEEB', '#98FB98', '#DDA0DD', '#F0E68C']
+    results = {}
+    for name, recolor in (('before', lambda c: legacy_apply_bg_color(panel.notes, c)),
+                          ('after', panel.apply_bg_color)):
+        start = time.perf_counter()
+        for i in range(rounds):
+            recolor(colors[i % len(colors)])
+            app.processEvents()
+        results[f'recolor_{count}_notes_{name}_ms'] = (time.perf_counter() - start) * 1000 / rounds
+    panel.autosaver.stop()
+    for note in panel.notes:
+        note.deleteLater()
+    panel.deleteLater()
+    return results
+
+
+SAMPLE_CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严龙飞'
+
+
+def random_note_text(rng, length):
+    return ''.join(rng.choice(SAMPLE_CHARS) for _ in range(length))
+
+
+def bench_search(count=100000, repeat=20):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'search.db'))
+        start = time.perf_counter()
+        batch = []
+        for i in range(count):
+            batch.append((None, {
+                'content': random_note_text(rng, rng.randint(20, 200)),
+                'position_x': 0, 'position_y': 0, 'size_width': 300, 'size_height': 200,
+            }))
+            if len(batch) == 5000:
+                db.write_notes(batch)
+                batch = []
+        if batch:
+            db.write_notes(batch)
+        results = {f'search_index_{count}_notes_s': time.perf_counter() - start}
+        queries = {'3char': '的一是', '4char': '中国人民', 'latin': 'abc', '2char_like': '国家'}
+        for name, query in queries.items():
+            results[f'search_{count}_{name}_ms'] = timeit(lambda: db.search_notes(query), repeat)
+        database.close_connections()
+    return results
+
+
+def bench_revisions(edits=2000, note_chars=20000, lookups=200):
+    # 一条长便签反复编辑，每次在随机位置插入或删除几个字
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'revisions.db'))
+        content = random_note_text(rng, note_chars)
+        note = {'content': content, 'position_x': 0, 'position_y': 0, 'size_width': 300, 'size_height': 200}
+        note_id = db.save_note(note)
+        history = [content]
+        start = time.perf_counter()
+        for _ in range(edits):
+            position = rng.randrange(len(content))
+            if rng.random() < 0.7:
+                content = content[:position] + random_note_text(rng, rng.randint(1, 8)) + content[position:]
+            else:
+                content = content[:position] + content[position + rng.randint(1, 8):]
+            db.update_note(note_id, dict(note, content=content))
+            history.append(content)
+        update_ms = (time.perf_counter() - start) / edits * 1000
+        stats = db.revision_stats()
+
+        picks = [rng.randrange(len(history)) for _ in range(lookups)]
+        start = time.perf_counter()
+        for index in picks:
+            assert db.get_note_revision(note_id, index + 1) == history[index]
+        lookup_ms = (time.perf_counter() - start) / lookups * 1000
+        database.close_connections()
+    return {
+        f'revision_{note_chars}_chars_full_text_bytes': len(content.encode('utf-8')),
+        f'revision_{note_chars}_chars_bytes_per_revision': stats['bytes'] / stats['revisions'],
+        f'revision_{note_chars}_chars_update_ms': update_ms,
+        f'revision_{note_chars}_chars_lookup_ms': lookup_ms,
+    }
+
+
+def bench_create_note(count=50):
+    app = get_app()
+    import main as app_main
+    with quiet():
+        panel = app_main.ControlPanel()
+        process_events(app)
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            panel.create_new_note()
+            app.processEvents()
+            samples.append((time.perf_counter() - start) * 1000)
+        panel.autosaver.stop()
+    for note in panel.notes:
+        note.deleteLater()
+    panel.deleteLater()
+    process_events(app)
+    return {'create_note_ms': statistics.median(samples)}
+
+
+def bench_font_fit(lengths=(10, 100, 1000, 5000), repeat=20):
+    # 冷：清空排版缓存后首次计算；热：相同文本再次计算
+    get_app()
+    import main as app_main
+    from font_fit import font_fit_cache
+    rng = random.Random(3)
+    note = app_main.StickyNote()
+    note.show()
+    results = {}
+    for length in lengths:
+        text = random_note_text(rng, length)
+
+        def fit():
+            note.resize(300, 200)
+            note.adjust_font_size_to_fit()
+
+        note.text_edit.blockSignals(True)
+        note.text_edit.setPlainText(text)
+        note.text_edit.blockSignals(False)
+
+        def cold():
+            font_fit_cache.clear()
+            fit()
+
+        results[f'font_fit_{length}_chars_cold_ms'] = time_median(cold, repeat)
+        results[f'font_fit_{length}_chars_warm_ms'] = time_median(fit, repeat)
+    note.close()
+    note.deleteLater()
+    return results
+
+
+def bench_typing_latency(sizes=(1000, 100000, 1000000), keystrokes=50, legacy_keystrokes=3, keystroke_interval=0.03):
+    # 在粘贴了日志的便签末尾逐字输入，自动保存开启，每个按键计时到事件处理完毕（不含按键之间的间隔）；
+    # legacy为旧行为：每次修改都立即适配字体、按合并窗口保存，超长文本只测少量按键
+    # 另外记录停顿后保存时界面线程的耗时、后台写入的耗时，以及写入期间继续输入的按键延迟
+    app = get_app()
+    from PyQt6.QtCore import QEvent, Qt
+    from PyQt6.QtGui import QKeyEvent, QTextCursor
+    import main as app_main
+    rng = random.Random(4)
+    panel = app_main.ControlPanel()
+    panel.finish_startup()
+    while panel.restore_iter is not None:
+        app.processEvents()
+    autosaver = panel.autosaver
+
+    def type_key(note, i):
+        char = 'abcdefghij'[i % 10]
+        start = time.perf_counter()
+        app.sendEvent(note.text_edit, QKeyEvent(QEvent.Type.KeyPress, Qt.Key.Key_A, Qt.KeyboardModifier.NoModifier, char))
+        app.processEvents()
+        elapsed = (time.perf_counter() - start) * 1000
+        time.sleep(keystroke_interval)
+        return elapsed
+
+    results = {}
+    for size in sizes:
+        text = '\n'.join(random_note_text(rng, 79) for _ in range(size // 80))
+        label = f'{size // 1000}kb'
+        for mode in ('legacy', 'current'):
+            panel.create_new_note()
+            note = panel.notes[-1]
+            if mode == 'legacy':
+                note.deferred_fit_chars = note.large_note_chars = float('inf')
+            note.text_edit.setPlainText(text)
+            note.text_edit.moveCursor(QTextCursor.MoveOperation.End)
+            note.fit_timer.stop()
+            note.end_deferred_save()
+            autosaver.flush(wait=True)
+            process_events(app)
+            samples = sorted(type_key(note, i) for i in range(legacy_keystrokes if mode == 'legacy' else keystrokes))
+            if mode == 'legacy':
+                results[f'typing_{label}_legacy_ms'] = statistics.median(samples)
+            else:
+                results[f'typing_{label}_ms'] = statistics.median(samples)
+                results[f'typing_{label}_p95_ms'] = samples[int(len(samples) * 0.95) - 1]
+                # 输入停顿后的字体适配（大便签模式下跳过）
+                start = time.perf_counter()
+                note.fit_timer.stop()
+                note.adjust_font_size_to_fit()
+                results[f'typing_{label}_idle_fit_ms'] = (time.perf_counter() - start) * 1000
+                # 停顿后保存：界面线程读取内容交给写入线程，写入期间继续输入
+                note.end_deferred_save()
+                start = time.perf_counter()
+                autosaver.flush()
+                results[f'typing_{label}_save_ui_ms'] = (time.perf_counter() - start) * 1000
+                during = []
+                while autosaver.writing and len(during) < keystrokes:
+                    during.append(type_key(note, len(during)))
+                if during:
+                    results[f'typing_{label}_during_save_ms'] = statistics.median(during)
+                    results[f'typing_{label}_during_save_max_ms'] = max(during)
+                autosaver.flush(wait=True)
+                results[f'typing_{label}_save_write_ms'] = autosaver.last_flush_ms
+            note.end_deferred_save()
+            autosaver.flush(wait=True)
+            if panel.db.get_note_content(note.note_id) != note.text_edit.toPlainText():
+                raise AssertionError('便签内容没有保存')
+            note.close()
+            note.deleteLater()
+            process_events(app)
+    autosaver.stop()
+    panel.deleteLater()
+    process_events(app)
+    return results
+
+
+def bench_drag_move(steps=200, event_interval=0.001):
+    # 拖动便签：模拟1000Hz鼠标，统计每个移动事件的处理耗时、实际移动窗口的次数，
+    # 以及拖动期间提交给自动保存的位置修改次数（应只在松开时一次）
+    app = get_app()
+    import main as app_main
+    note = app_main.StickyNote()
+    note.autosave_enabled = False
+    note.move(100, 100)
+    note.show()
+    process_events(app)
+    commits = []
+    note.model.listen(lambda model, field: commits.append(field) if field == 'position_x' else None)
+    note.mousePressEvent(mouse_event('press', (40, 10)))
+    samples = []
+    drag_start = time.perf_counter()
+    for i in range(steps):
+        start = time.perf_counter()
+        note.mouseMoveEvent(mouse_event('move', (40 + i, 10 + i // 2)))
+        app.processEvents()
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(event_interval)
+    start = time.perf_counter()
+    note.mouseReleaseEvent(mouse_event('release', (40 + steps, 10 + steps // 2)))
+    release_ms = (time.perf_counter() - start) * 1000
+    drag_seconds = time.perf_counter() - drag_start
+    mover = note.drag_mover
+    note.close()
+    note.deleteLater()
+    samples.sort()
+    return {
+        'drag_move_event_ms': statistics.median(samples),
+        'drag_move_event_p95_ms': samples[int(len(samples) * 0.95)],
+        'drag_release_ms': release_ms,
+        'drag_raw_events_per_s': mover.raw_events / drag_seconds,
+        'drag_window_moves_per_s': mover.applied_moves / drag_seconds,
+        'drag_position_commits': len(commits),
+    }
+
+
+class LinearIndex:
+    # 对照：逐个检查所有矩形
+    def __init__(self, rects):
+        self.rects = rects
+
+    def hits(self, rect):
+        from spatial import intersects
+        return [other for other in self.rects if intersects(other, rect)]
+
+
+def bench_arrange(count=5000, repeat=20):
+    # 在5000个便签中为新便签找空位：网格索引与逐个检查比较；以及排列一屏便签的耗时
+    from arrange import find_free_position, pack_rects, tile_rects
+    from spatial import SpatialGrid
+    rng = random.Random(17)
+    rects = [(rng.randrange(0, 30000), rng.randrange(0, 17000), rng.randint(200, 300), rng.randint(150, 200))
+             for _ in range(count)]
+    grid = SpatialGrid()
+    for key, rect in enumerate(rects):
+        grid.insert(key, rect)
+    linear = LinearIndex(rects)
+    screens = [(rng.randrange(0, 28000), rng.randrange(0, 16000), 1920, 1080) for _ in range(repeat)]
+    iterator = iter(screens * 2)
+
+    def move():
+        key = rng.randrange(count)
+        x, y, w, h = rects[key]
+        grid.insert(key, (x + rng.randint(-50, 50), y + rng.randint(-50, 50), w, h))
+
+    sizes = [(rng.randint(200, 300), rng.randint(150, 200)) for _ in range(40)]
+    return {
+        f'place_grid_{count}_ms': time_median(lambda: find_free_position(grid, next(iterator), (300, 200)), repeat),
+        f'place_linear_{count}_ms': time_median(lambda: find_free_position(linear, next(iterator), (300, 200)), repeat),
+        'index_move_ms': timeit(move, 1000),
+        'pack_40_ms': time_median(lambda: pack_rects(sizes, (0, 0, 1920, 1080)), repeat),
+        f'tile_{count}_ms': time_median(lambda: tile_rects(count, (0, 0, 1920, 1080)), 5),
+    }
+
+
+def bench_snap(counts=(300, 1000), repeat=2000, desktop=(3840, 2160)):
+    # 拖动时每帧的吸附计算：从网格索引取附近的便签，与遍历全部便签比较；
+    # 便签分布在四个1920x1080屏幕大小的桌面上
+    get_app()
+    from screens import screen_layout
+    from snap import NEIGHBOR_RANGE, Snapper, snap_rect
+    from spatial import SpatialGrid, intersects
+    layout = screen_layout()
+    rng = random.Random(19)
+    width, height = desktop
+    results = {}
+    for count in counts:
+        rects = [(rng.randrange(0, width), rng.randrange(0, height), rng.randint(200, 300), rng.randint(150, 200))
+                 for _ in range(count)]
+        grid = SpatialGrid()
+        for key, rect in enumerate(rects):
+            grid.insert(key, rect)
+        snapper = Snapper(grid, None, layout)
+        moves = [(rng.randrange(0, width), rng.randrange(0, height), 300, 200) for _ in range(repeat)]
+        iterator = iter(moves * 2)
+
+        def linear():
+            x, y, w, h = rect = next(iterator)
+            area = (x - NEIGHBOR_RANGE, y - NEIGHBOR_RANGE, w + 2 * NEIGHBOR_RANGE, h + 2 * NEIGHBOR_RANGE)
+            return snap_rect(rect, [other for other in rects if intersects(other, area)], (0, 0, width, height))
+
+        results[f'snap_move_grid_{count}_ms'] = timeit(lambda: snapper.snap(next(iterator)), repeat)
+        results[f'snap_move_linear_{count}_ms'] = timeit(linear, repeat)
+    return results
+
+
+def bench_resize_event(steps=120):
+    # 无背景图的便签拖拽调整大小（4K背景图的情况见live_resize）
+    get_app()
+    import main as app_main
+    note = app_main.StickyNote()
+    note.autosave_enabled = False
+    note.text_edit.setPlainText('便签内容 ' * 20)
+    note.show()
+    frame_times, release_ms = run_resize_drag(note, steps)
+    note.close()
+    note.deleteLater()
+    frame_times.sort()
+    return {
+        'resize_event_ms': statistics.median(frame_times),
+        'resize_event_p95_ms': frame_times[int(len(frame_times) * 0.95)],
+        'resize_release_ms': release_ms,
+    }
+
+
+def bench_font_menu_construct(repeat=50):
+    app = get_app()
+    import main as app_main
+    from font_catalog import get_font_catalog
+    catalog = get_font_catalog()
+    catalog.start()
+    catalog.thread.join()
+    process_events(app)
+
+    def construct():
+        menu = app_main.FontMenu()
+        menu.deleteLater()
+
+    result = {'font_menu_construct_ms': time_median(construct, repeat)}
+    process_events(app)
+    return result
+
+
+def bench_group_apply(count=200, rounds=5):
+    # 控制面板对所有便签统一设置背景色和字体
+    app = get_app()
+    import main as app_main
+    with quiet():
+        panel = app_main.ControlPanel()
+        for _ in range(count):
+            note = app_main.StickyNote(panel)
+            note.text_edit.setPlainText('便签内容 ' * 10)
+            panel.apply_note_style(note)
+            panel.notes.append(note)
+        process_events(app)
+        colors = ['#FFB6C1', '#87CEEB', '#98FB98', '#DDA0DD', '#F0E68C']
+        fonts = ['Arial', 'Times New Roman', '宋体', '黑体', '微软雅黑']
+        results = {}
+        for name, apply, values in (('bg_color', panel.apply_bg_color, colors),
+                                    ('font', panel.apply_font, fonts)):
+            samples = []
+            for i in range(rounds):
+                start = time.perf_counter()
+                apply(values[i % len(values)])
+                app.processEvents()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[f'apply_{name}_{count}_notes_ms'] = statistics.median(samples)
+        panel.autosaver.stop()
+    for note in panel.notes:
+        note.deleteLater()
+    panel.deleteLater()
+    process_events(app)
+    return results
+
+
+def bench_database(count=500, repeat=50):
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'ops.db'))
+        notes = [{
+            'content': random_note_text(rng, 100), 'position_x': rng.randint(0, 1800),
+            'position_y': rng.randint(0, 1000), 'size_width': 300, 'size_height': 200,
+        } for _ in range(count)]
+
+        start = time.perf_counter()
+        for note in notes[:repeat]:
+            db.save_note(note)
+        save_ms = (time.perf_counter() - start) / repeat * 1000
+        start = time.perf_counter()
+        note_ids = db.write_notes([(None, note) for note in notes[repeat:]])
+        batch_ms = (time.perf_counter() - start) * 1000
+
+        def update():
+            note_id = rng.choice(note_ids)
+            db.update_note(note_id, dict(notes[0], content=random_note_text(rng, 100)))
+
+        results = {
+            'db_save_note_ms': save_ms,
+            f'db_write_notes_batch_{count - repeat}_ms': batch_ms,
+            'db_update_note_ms': time_median(update, repeat),
+            f'db_iter_notes_{count}_ms': time_median(lambda: list(db.iter_notes((0, 0, 1920, 1080))), 10),
+            'db_get_recent_fonts_ms': time_median(db.get_recent_fonts, repeat),
+            'db_add_recent_font_ms': time_median(lambda: db.add_recent_font(rng.choice(SAMPLE_CHARS)), repeat),
+        }
+        database.close_connections()
+    return results
+
+
+def bench_archive(count=10000, images=20):
+    # 导出再导入到空数据库；每个便签引用若干张图片之一，导出时按内容去重
+    import archive
+    from PyQt6.QtGui import QColor, QImage
+    get_app()
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(images):
+            image = QImage(64, 64, QImage.Format.Format_RGB32)
+            image.fill(QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            paths.append(os.path.join(tmp, f'bg{i}.png'))
+            image.save(paths[-1])
+        db = Database(os.path.join(tmp, 'export.db'))
+        db.write_notes([(None, {
+            'content': random_note_text(rng, rng.randint(20, 200)),
+            'position_x': 0, 'position_y': 0, 'size_width': 300, 'size_height': 200,
+            'background_image': rng.choice(paths) if i % 2 else None,
+        }) for i in range(count)])
+        export_stats = archive.export_notes(db, os.path.join(tmp, 'archive'))
+        os.mkdir(os.path.join(tmp, 'import'))
+        import_db = Database(os.path.join(tmp, 'import', 'import.db'))
+        import_stats = archive.import_notes(import_db, os.path.join(tmp, 'archive'))
+        database.close_connections()
+    return {
+        f'archive_export_{count}_notes_ms': export_stats['ms'],
+        f'archive_import_{count}_notes_ms': import_stats['ms'],
+        'archive_assets': export_stats['assets'],
+        'archive_jsonl_mb': export_stats['bytes'] / 1024 / 1024,
+    }
+
+
+def bench_blob_store(width=4000, height=3000, repeat=10):
+    # 恢复便签时读取预先生成的缩放版本，与每次从原图解码缩小相比
+    from PyQt6.QtGui import QColor, QImage, QPainter
+    from image_loader import decode_image, load_stored_image, store_image_file
+    get_app()
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as tmp:
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        painter = QPainter(image)
+        for _ in range(200):
+            color = QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            painter.fillRect(rng.randrange(width), rng.randrange(height), 400, 300, color)
+        painter.end()
+        path = os.path.join(tmp, 'photo.jpg')
+        image.save(path, 'JPG', 90)
+        db = Database(os.path.join(tmp, 'blobs.db'))
+        start = time.perf_counter()
+        digest = store_image_file(db, path)
+        store_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        load_stored_image(db, digest, 800, 600)
+        variants_ms = (time.perf_counter() - start) * 1000
+        results = {
+            'blob_original_mb': os.path.getsize(path) / 1024 / 1024,
+            'blob_store_original_ms': store_ms,
+            'blob_generate_variants_ms': variants_ms,
+            'blob_read_original_ms': time_median(lambda: db.read_blob(digest), repeat),
+            'blob_decode_original_fit_ms': time_median(lambda: decode_image(path, 800, 600), repeat),
+            'blob_load_variant_ms': time_median(lambda: load_stored_image(db, digest, 800, 600), repeat),
+        }
+        database.close_connections()
+    return results
+
+
+def log_text(rng, lines):
+    # 日志类的长文本，重复的结构和真实日志一样容易压缩
+    return '\n'.join(
+        f'2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d} '
+        f'{rng.choice(("INFO", "WARN", "DEBUG"))} worker-{rng.randint(1, 8)} processed item {rng.randint(0, 99999)}'
+        for _ in range(lines))
+
+
+def bench_cold_storage(count=3000, long_ratio=0.1, years=3):
+    # 多年积累的便签：大多是短便签，少数粘贴了长日志；修改时间分布在最近几年
+    # legacy为旧的存储方式（内容不压缩、没有冷表），比较文件大小和启动时恢复便签读取的耗时
+    import revisions
+    rng = random.Random(12)
+    notes = []
+    for _ in range(count):
+        content = log_text(rng, rng.randint(200, 2000)) if rng.random() < long_ratio \
+            else random_note_text(rng, rng.randint(20, 1000))
+        notes.append({'content': content, 'position_x': rng.randint(0, 1800), 'position_y': rng.randint(0, 1000),
+                      'size_width': 300, 'size_height': 200})
+    ages = [rng.uniform(0, years * 365) for _ in range(count)]
+    results = {'content_mb': sum(len(note['content'].encode('utf-8')) for note in notes) / 1024 / 1024}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('legacy', 'current'):
+            path = os.path.join(tmp, f'{mode}.db')
+            compress_chars = revisions.CONTENT_COMPRESS_CHARS
+            if mode == 'legacy':
+                revisions.CONTENT_COMPRESS_CHARS = float('inf')
+            try:
+                with quiet():
+                    db = Database(path)
+                note_ids = db.write_notes([(None, note) for note in notes])
+            finally:
+                revisions.CONTENT_COMPRESS_CHARS = compress_chars
+            with db.transaction() as cursor:
+                now = datetime.now()
+                cursor.executemany('UPDATE notes SET updated_at = ? WHERE id = ?',
+                                   [(now - timedelta(days=age), note_id) for age, note_id in zip(ages, note_ids)])
+            if mode == 'current':
+                stats = db.freeze_cold_notes(time_budget_ms=float('inf'))
+                results['freeze_ms_per_note'] = stats['ms'] / max(stats['notes'], 1)
+                content = db.content_stats()
+                results['cold_notes'] = content['cold']['notes']
+                results['hot_mb'] = content['hot']['bytes'] / 1024 / 1024
+                results['cold_mb'] = content['cold']['bytes'] / 1024 / 1024
+            db.conn.execute('VACUUM')
+            results[f'{mode}_db_file_mb'] = os.path.getsize(path) / 1024 / 1024
+            # 重新打开连接，页缓存为空，与启动时相同
+            database.close_connections()
+            db = Database(path)
+            start = time.perf_counter()
+            list(db.iter_notes((0, 0, 1920, 1080)))
+            results[f'{mode}_restore_read_ms'] = (time.perf_counter() - start) * 1000
+            results[f'{mode}_restore_read_warm_ms'] = time_median(lambda: list(db.iter_notes((0, 0, 1920, 1080))), 5)
+            database.close_connections()
+    return results
+
+
+def bench_large_note_update(sizes=(100000, 1000000), repeat=5, legacy_repeat=2):
+    # 在大便签末尾追加一个字后保存一次的耗时（自动保存在数据库锁内执行的部分）
+    # legacy为全文索引收录整篇内容的旧方式；另外记录只出现在索引范围之外的文本的搜索耗时
+    import revisions
+    rng = random.Random(14)
+    texts = {size: '\n'.join(random_note_text(rng, 79) for _ in range(size // 80)) + ' tailonlymarker'
+             for size in sizes}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, count in (('legacy', legacy_repeat), ('current', repeat)):
+            index_chars = revisions.FTS_INDEX_CHARS
+            if mode == 'legacy':
+                revisions.FTS_INDEX_CHARS = 1 << 40
+            try:
+                with quiet():
+                    db = Database(os.path.join(tmp, f'{mode}.db'))
+                for size, text in texts.items():
+                    note_id = db.save_note({'content': text, 'position_x': 0, 'position_y': 0,
+                                            'size_width': 300, 'size_height': 200})
+                    edits = iter(range(count))
+                    results[f'{mode}_update_{size // 1000}kb_ms'] = time_median(
+                        lambda: db.update_note(note_id, {'content': text + 'x' * (next(edits) + 1)}), count)
+                    if mode == 'current':
+                        results[f'search_tail_{size // 1000}kb_ms'] = time_median(
+                            lambda: db.search_notes('tailonlymarker'), 5)
+                        if db.search_notes('tailonlymarker') != [note_id]:
+                            raise AssertionError('索引范围之外的文本没有搜索到')
+                        db.delete_note(note_id)
+            finally:
+                revisions.FTS_INDEX_CHARS = index_chars
+            database.close_connections()
+    return results
+
+
+def bench_note_model(count=100000, chars=20000, repeat=50):
+    # 每个 NoteModel 与等价的 dict 占用的内存（字段值共享，只计对象本身），
+    # 以及只改位置时按修改的列更新与整行更新的耗时
+    import tracemalloc
+    from note_model import NOTE_MODEL_DEFAULTS, NoteModel
+    rng = random.Random(13)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    models = [NoteModel(i, **NOTE_MODEL_DEFAULTS) for i in range(count)]
+    model_bytes = tracemalloc.get_traced_memory()[0] - base
+    del models
+    base = tracemalloc.get_traced_memory()[0]
+    dicts = [dict(NOTE_MODEL_DEFAULTS, id=i) for i in range(count)]
+    dict_bytes = tracemalloc.get_traced_memory()[0] - base
+    del dicts
+    tracemalloc.stop()
+
+    models = [NoteModel(i, **NOTE_MODEL_DEFAULTS) for i in range(count)]
+    start = time.perf_counter()
+    for i, model in enumerate(models):
+        model.update(position_x=i, position_y=i)
+    update_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    changes = [model.take_changes() for model in models]
+    take_ms = (time.perf_counter() - start) * 1000
+    del models, changes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'model.db'))
+        note = NoteModel(**NOTE_MODEL_DEFAULTS)
+        note.content = random_note_text(rng, chars)
+        note.note_id = db.save_note(note.to_note_data())
+
+        def update_position():
+            note.update(position_x=rng.randint(0, 1800), position_y=rng.randint(0, 1000))
+            db.update_note(note.note_id, note.take_changes())
+
+        def update_full():
+            note.update(position_x=rng.randint(0, 1800), position_y=rng.randint(0, 1000))
+            note.take_changes()
+            db.update_note(note.note_id, note.to_note_data())
+
+        results = {
+            'model_bytes_per_note': model_bytes / count,
+            'dict_bytes_per_note': dict_bytes / count,
+            f'model_update_{count // 1000}k_ms': update_ms,
+            f'model_take_changes_{count // 1000}k_ms': take_ms,
+            'db_update_position_ms': time_median(update_position, repeat),
+            'db_update_all_columns_ms': time_median(update_full, repeat),
+        }
+        database.close_connections()
+    return results
+
+
+def bench_startup(runs=5, notes=20):
+    # 以子进程启动程序，读取 --startup-report 输出的启动报告，比较按需加载与旧的启动方式
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    rng = random.Random(5)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'notes.db'))
+        db.write_notes([(None, {
+            'content': random_note_text(rng, 50), 'position_x': rng.randint(0, 1500),
+            'position_y': rng.randint(0, 800), 'size_width': 300, 'size_height': 200,
+        }) for _ in range(notes)])
+        database.close_connections()
+        for name, flags in (('lazy', []), ('eager', ['--eager-startup'])):
+            reports = []
+            for _ in range(runs):
+                proc = subprocess.run(
+                    [sys.executable, main_path, '--startup-report', '--quit-after-startup'] + flags,
+                    cwd=tmp, capture_output=True, text=True, timeout=60,
+                )
+                lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+                reports.append(json.loads(lines[-1]))
+            for key in ('import_ms', 'panel_ms', 'first_frame_ms', 'first_note_ms', 'all_notes_ms'):
+                results[f'startup_{name}_{key}'] = statistics.median(report[key] for report in reports)
+    return results
+
+
+def bench_profiler_overhead(repeat=20000):
+    # 性能统计关闭与开启时，一次很快的数据库调用的耗时
+    from profiler import Profiler
+    profiler = Profiler()
+    profiler.register(Database, ('get_recent_fonts',))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'profile.db'))
+        off = timeit(db.get_recent_fonts, repeat)
+        profiler.enable()
+        on = timeit(db.get_recent_fonts, repeat)
+        profiler.disable()
+        database.close_connections()
+    return {'profiler_off_call_us': off * 1000, 'profiler_on_call_us': on * 1000}
+
+
+def rss_bytes():
+    # 当前进程的常驻内存，只在Linux上可用；先让glibc把空闲的堆内存还给系统，否则释放后RSS不会下降
+    import ctypes
+    import gc
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def bench_hibernation(count=100, chars=2000):
+    # 全部便签休眠后估算回收的内存、实际常驻内存的变化，以及鼠标移入时唤醒一个便签的耗时
+    from PyQt6.QtCore import QEvent
+    app = get_app()
+    import main as app_main
+    rng = random.Random(5)
+    with quiet():
+        panel = app_main.ControlPanel()
+        panel.finish_startup()
+        while panel.restore_iter is not None:
+            app.processEvents()
+        for i in range(count):
+            panel.create_new_note()
+            note = panel.notes[-1]
+            note.text_edit.setPlainText(random_note_text(rng, chars))
+            note.move(20 + i % 20 * 30, 20 + i // 20 * 30)
+        panel.autosaver.flush(wait=True)
+        process_events(app)
+        before = rss_bytes()
+        start = time.perf_counter()
+        panel.hibernation.check(idle_seconds=0)
+        hibernate_ms = (time.perf_counter() - start) * 1000
+        # 删除被替换的便签
+        process_events(app)
+        app.sendPostedEvents(None, QEvent.Type.DeferredDelete.value)
+        after = rss_bytes()
+        placeholders = [note for note in panel.notes if panel.hibernation.is_hibernated(note)]
+        for placeholder in placeholders[:20]:
+            panel.hibernation.wake(placeholder)
+            app.processEvents()
+        stats = panel.hibernation.stats()
+        panel.autosaver.stop()
+    for note in panel.notes:
+        note.deleteLater()
+    panel.deleteLater()
+    process_events(app)
+    results = {
+        'hibernated_notes': len(placeholders),
+        'hibernate_all_ms': hibernate_ms,
+        'wake_ms': stats['avg_wake_ms'],
+        'reclaimed_estimate_mb': stats['reclaimed_bytes'] / 1024 / 1024,
+    }
+    if before is not None:
+        results['rss_reclaimed_mb'] = (before - after) / 1024 / 1024
+    return results
+
+
+# 名称 -> (基准函数, 是否耗时较长)；--quick 时跳过耗时较长的
+BENCHMARKS = {
+    'font_menu_open': (bench_font_menu_open, False),
+    'font_menu_construct': (bench_font_menu_construct, False),
+    'create_note': (bench_create_note, False),
+    'font_fit': (bench_font_fit, False),
+    'typing_latency': (bench_typing_latency, False),
+    'drag_move': (bench_drag_move, False),
+    'arrange': (bench_arrange, False),
+    'snap': (bench_snap, False),
+    'resize_event': (bench_resize_event, False),
+    'live_resize': (bench_live_resize, False),
+    'group_apply': (bench_group_apply, False),
+    'recolor': (bench_recolor, False),
+    'database': (bench_database, False),
+    'migration': (bench_migration, False),
+    'startup': (bench_startup, False),
+    'profiler_overhead': (bench_profiler_overhead, False),
+    'hibernation': (bench_hibernation, False),
+    'archive': (bench_archive, False),
+    'blob_store': (bench_blob_store, False),
+    'note_model': (bench_note_model, False),
+    'cold_storage': (bench_cold_storage, False),
+    'large_note_update': (bench_large_note_update, False),
+    'search': (bench_search, True),
+    'revisions': (bench_revisions, True),
+}
+
+# 比较时低于这个差值（毫秒）的变化视为噪声
+NOISE_FLOOR_MS = 0.05
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    from PyQt6.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'qt': QT_VERSION_STR,
+        'pyqt': PYQT_VERSION_STR,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'qpa_platform': os.environ.get('QT_QPA_PLATFORM'),
+    }
+
+
+def run_worker(name):
+    # 在子进程中运行单个基准，结果以JSON写到标准输出
+    with tempfile.TemporaryDirectory() as tmp:
+        # 界面相关的基准使用临时数据库，不影响当前目录的notes.db
+        database.DB_PATH = os.path.join(tmp, 'notes.db')
+        func, _ = BENCHMARKS[name]
+        with quiet():
+            results = func()
+        database.close_connections()
+    json.dump(results, sys.stdout)
+
+
+def run_benchmarks(names):
+    # 每个基准使用独立的进程，前一个基准留下的窗口、缓存和线程不会影响后面的结果
+    # 返回 (指标 -> 数值, 基准 -> 产生的指标名, 失败的基准 -> 错误信息)
+    results = {}
+    metrics = {}
+    failed = {}
+    for name in names:
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', name],
+            capture_output=True, text=True,
+        )
+        try:
+            values = json.loads(proc.stdout) if proc.returncode == 0 else None
+        except ValueError:
+            values = None
+        if values is None:
+            lines = proc.stderr.strip().splitlines()
+            failed[name] = lines[-1] if lines else f'退出码 {proc.returncode}'
+            print(f"[{name}] 失败:\n{proc.stderr}", file=sys.stderr)
+            continue
+        results.update(values)
+        metrics[name] = sorted(values)
+        print(f"[{name}] {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return results, metrics, failed
+
+
+def compare(results, baseline, threshold, failed=None, missing=()):
+    # 只比较耗时类指标（_ms结尾），返回变慢超过阈值的指标；
+    # 失败的基准（failed: 基准 -> 错误信息）和本次没有产生的基准指标（missing）同样算作变慢
+    regressions = []
+    for name, error in sorted((failed or {}).items()):
+        regressions.append(name)
+        print(f"{name}: 运行失败（{error}）  <-- 失败")
+    for name in missing:
+        regressions.append(name)
+        print(f"{name}: {baseline[name]:.4f} -> 缺失  <-- 缺失")
+    for name, value in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (value - old) / old if old else 0.0
+        flag = ''
+        if name.endswith('_ms') and change > threshold and value - old > NOISE_FLOOR_MS:
+            regressions.append(name)
+            flag = '  <-- 变慢'
+        print(f"{name}: {old:.4f} -> {value:.4f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='便签程序性能基准（无界面运行）')
+    parser.add_argument('names', nargs='*', help=f"只运行指定的基准: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help='跳过耗时较长的基准')
+    parser.add_argument('--json', metavar='PATH', help="把结果写入JSON文件（'-'为标准输出）")
+    parser.add_argument('--compare', metavar='PATH', help='与之前保存的JSON结果比较，有变慢时返回1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定变慢的相对阈值，默认0.2')
+    parser.add_argument('--worker', metavar='NAME', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        run_worker(args.worker)
+        return 0
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+    names = args.names or [name for name, (_, slow) in BENCHMARKS.items() if not (args.quick and slow)]
+
+    results, metrics, failed = run_benchmarks(names)
+    report = {'environment': environment(), 'results': results, 'benchmarks': metrics, 'failed': failed}
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for name, value in report['results'].items():
+            print(f"{name}: {value:.4f}")
+        for name, error in failed.items():
+            print(f"{name}: 运行失败（{error}）")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline_report = json.load(f)
+        baseline = baseline_report['results']
+        # 本次运行的基准在基准结果中产生过、这次却没有的指标（旧的基准结果没有记录各基准的指标，不检查）
+        expected = baseline_report.get('benchmarks', {})
+        missing = sorted(metric for name in names if name not in failed
+                         for metric in expected.get(name, ()) if metric not in results)
+        regressions = compare(results, baseline, args.threshold, failed, missing)
+        if regressions:
+            print(f"变慢的指标: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,169 +1,720 @@
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import os
+import time
+import migrations
+import revisions
+
+DB_PATH = 'notes.db'
+
+# 连接参数：WAL日志 + 调优后的pragma
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-8000',  # 约8MB页缓存
+    'PRAGMA mmap_size=67108864',  # 64MB内存映射
+    'PRAGMA temp_store=MEMORY',
+)
+
+# 常用语句保持为固定字符串，sqlite3会按语句文本缓存预编译结果
+SQL_ADD_RECENT_FONT = '''
+    INSERT OR REPLACE INTO recent_fonts (font_name, last_used)
+    VALUES (?, CURRENT_TIMESTAMP)
+'''
+SQL_GET_RECENT_FONTS = '''
+    SELECT font_name FROM recent_fonts
+    ORDER BY last_used DESC
+    LIMIT ?
+'''
+
+SQL_INSERT_NOTE = '''
+    INSERT INTO notes (
+        content, position_x, position_y, size_width, size_height,
+        created_at, updated_at, is_top_most, is_bottom_most,
+        background_color, font_family, font_size, font_color, background_image, background_blob
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# 更新便签时可写的列；只写传入的列，未修改内容时不会触发全文索引和版本记录
+UPDATE_FIELDS = (
+    'content', 'position_x', 'position_y', 'size_width', 'size_height',
+    'is_top_most', 'is_bottom_most', 'background_color', 'font_family', 'font_size', 'font_color',
+    'background_image', 'background_blob',
+)
+_update_sql = {}
+
+
+def update_sql(fields):
+    # 同一组列的语句只拼接一次，也让 sqlite3 的语句缓存能够命中
+    sql = _update_sql.get(fields)
+    if sql is None:
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        if 'content' in fields:
+            # 写入内容时便签回到热数据，预览不再需要
+            assignments += ', preview = NULL'
+        sql = _update_sql[fields] = f'UPDATE notes SET {assignments}, updated_at = ? WHERE id = ?'
+    return sql
+
+
+SQL_DELETE_NOTE = 'DELETE FROM notes WHERE id = ?'
+
+SQL_SEARCH_NOTES = '''
+    SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT ?
+'''
+# 便签内容的原文：较短的TEXT直接比较，压缩的和冷表中的才调用note_text()解压
+SQL_NOTE_TEXT = '''
+    CASE typeof(content) WHEN 'text' THEN content
+    ELSE note_text(COALESCE(content, (SELECT data FROM cold_contents WHERE note_id = notes.id))) END
+'''
+SQL_SEARCH_NOTES_LIKE = f"SELECT id FROM notes WHERE {SQL_NOTE_TEXT} LIKE ? ESCAPE '\\' ORDER BY updated_at DESC LIMIT ?"
+# 全文索引只收录前FTS_INDEX_CHARS个字：可能超出这个长度的只有压缩的和冷表中的内容，补查它们的全文
+SQL_SEARCH_LONG_NOTES_LIKE = f'''
+    SELECT id FROM notes WHERE (content IS NULL OR typeof(content) = 'blob')
+    AND {SQL_NOTE_TEXT} LIKE ? ESCAPE '\\' ORDER BY updated_at DESC LIMIT ?
+'''
+
+# 内容（可能是压缩的BLOB）以及是否在冷表中
+SQL_GET_CONTENT = '''
+    SELECT COALESCE(content, (SELECT data FROM cold_contents WHERE note_id = notes.id)), content IS NULL
+    FROM notes WHERE id = ?
+'''
+SQL_DELETE_COLD_CONTENT = 'DELETE FROM cold_contents WHERE note_id = ?'
+SQL_INSERT_COLD_CONTENT = 'INSERT OR REPLACE INTO cold_contents (note_id, data) VALUES (?, ?)'
+# 只把修改时间早于期限、内容比预览长（压缩过的内容都比预览长）的便签移到冷表；移动不算修改，不更新updated_at
+SQL_COLD_CANDIDATES = '''
+    SELECT id FROM notes
+    WHERE content IS NOT NULL AND updated_at < ? AND (typeof(content) = 'blob' OR length(content) > ?)
+'''
+SQL_FREEZE_NOTE = 'UPDATE notes SET content = NULL, preview = ? WHERE id = ? AND content IS NOT NULL'
+SQL_INSERT_REVISION = '''
+    INSERT OR REPLACE INTO note_revisions (note_id, revision, kind, data, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_LAST_REVISION = '''
+    SELECT revision FROM note_revisions WHERE note_id = ?
+    ORDER BY revision DESC LIMIT 1
+'''
+# 不晚于指定版本的最近一个快照，读取版本时从这里开始回放差量
+SQL_BASE_SNAPSHOT = f'''
+    SELECT revision FROM note_revisions
+    WHERE note_id = ? AND revision <= ? AND kind = {revisions.KIND_SNAPSHOT}
+    ORDER BY revision DESC LIMIT 1
+'''
+SQL_REVISION_CHAIN = '''
+    SELECT kind, data, created_at FROM note_revisions
+    WHERE note_id = ? AND revision BETWEEN ? AND ?
+    ORDER BY revision
+'''
+SQL_LIST_REVISIONS = '''
+    SELECT revision, kind, created_at, length(data) FROM note_revisions
+    WHERE note_id = ? ORDER BY revision
+'''
+# 有不止一个版本早于保留期限的便签
+SQL_COMPACT_CANDIDATES = '''
+    SELECT note_id FROM note_revisions WHERE created_at < ?
+    GROUP BY note_id HAVING COUNT(*) > 1
+'''
+SQL_OLDEST_KEPT_REVISION = 'SELECT MAX(revision) FROM note_revisions WHERE note_id = ? AND created_at < ?'
+SQL_DELETE_OLD_REVISIONS = 'DELETE FROM note_revisions WHERE note_id = ? AND revision < ?'
+
+# 历史版本默认保留天数，更早的版本在整理时合并为一个快照
+REVISION_RETENTION_DAYS = 30
+
+# 长期未修改的便签多少天后移到冷表，可用环境变量覆盖
+COLD_AFTER_DAYS = 90
+COLD_AFTER_ENV = 'NOTE_COLD_AFTER_DAYS'
+# 冷表中的便签在notes表中保留的预览字数，恢复时显示为休眠的占位窗口
+COLD_PREVIEW_CHARS = 500
+
+# 恢复便签时读取的列；冷表中的便签content为None，只有preview
+NOTE_FIELDS = (
+    'id', 'content', 'position_x', 'position_y', 'size_width', 'size_height',
+    'is_top_most', 'background_color', 'font_family', 'font_size', 'font_color',
+    'background_image', 'background_blob', 'preview',
+)
+SQL_SELECT_NOTES = f'SELECT {", ".join(NOTE_FIELDS)} FROM notes'
+# 置顶或与屏幕区域相交的便签
+SQL_VISIBLE_CONDITION = '''
+    COALESCE(is_top_most OR (position_x < ? AND position_x + size_width > ?
+                             AND position_y < ? AND position_y + size_height > ?), 0)
+'''
+SQL_RESTORE_ORDER = ' ORDER BY is_top_most DESC, updated_at DESC'
+
+# 导出和批量导入的列（导入时重新分配id）
+TRANSFER_FIELDS = migrations.NOTE_COLUMNS + ('background_image', 'background_blob')
+# 导出时内容解压为原文，冷表中的便签同样导出完整内容
+SQL_EXPORT_NOTES = f'''
+    SELECT id, {", ".join(SQL_NOTE_TEXT if field == 'content' else field for field in TRANSFER_FIELDS)}
+    FROM notes ORDER BY id
+'''
+CONTENT_INDEX = TRANSFER_FIELDS.index('content')
+SQL_IMPORT_NOTE = f'''
+    INSERT INTO notes ({", ".join(TRANSFER_FIELDS)})
+    VALUES ({", ".join("?" * len(TRANSFER_FIELDS))})
+'''
+# 批量导入时每次executemany的行数，以及每个事务最多写入的行数
+IMPORT_BATCH_SIZE = 1000
+IMPORT_TRANSACTION_ROWS = 50000
+
+# 背景图片存储：(digest, variant) 唯一，原图的variant为'original'
+BLOB_ORIGINAL = 'original'
+# 增量读写大图片时每次的字节数
+BLOB_CHUNK_SIZE = 256 * 1024
+# Connection.blobopen需要Python 3.11；更早的版本整个文件一次插入，读取时用substr分块
+HAS_BLOBOPEN = hasattr(sqlite3.Connection, 'blobopen')
+# 引用计数归零多久之后才删除（秒），期间重新引用的图片不需要再写入
+BLOB_GRACE_SECONDS = 86400
+SQL_HAS_BLOB = 'SELECT 1 FROM blobs WHERE digest = ? AND variant = ?'
+SQL_BLOB_VARIANTS = 'SELECT variant, id, format, width, height, size FROM blobs WHERE digest = ?'
+SQL_INSERT_BLOB = '''
+    INSERT OR IGNORE INTO blobs (digest, variant, format, width, height, size, data)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_INSERT_BLOB_ZERO = '''
+    INSERT OR IGNORE INTO blobs (digest, variant, format, width, height, size, data)
+    VALUES (?, ?, ?, ?, ?, ?, zeroblob(?))
+'''
+SQL_BLOB_LOCATION = 'SELECT id, size FROM blobs WHERE digest = ? AND variant = ?'
+SQL_BLOB_CHUNK = 'SELECT substr(data, ?, ?) FROM blobs WHERE id = ?'
+SQL_BLOB_BYTES = 'SELECT COALESCE(SUM(size), 0) FROM blobs WHERE digest = ?'
+SQL_INSERT_BLOB_REF = '''
+    INSERT OR IGNORE INTO blob_refs (digest, refcount, updated_at) VALUES (?, 0, ?)
+'''
+SQL_UNREFERENCED_BLOBS = 'SELECT digest FROM blob_refs WHERE refcount <= 0 AND updated_at < ?'
+SQL_DELETE_BLOBS = 'DELETE FROM blobs WHERE digest = ?'
+SQL_DELETE_BLOB_REF = 'DELETE FROM blob_refs WHERE digest = ?'
+
+# 开启性能统计时计时的方法（iter_notes是生成器，调用本身不耗时，不计入）
+PROFILED_METHODS = (
+    'save_note', 'update_note', 'write_notes', 'delete_note', 'search_notes',
+    'get_recent_fonts', 'add_recent_font', 'get_note_revision', 'compact_revisions',
+    'store_blob_file', 'read_blob', 'get_note_content', 'freeze_cold_notes',
+)
+
+# 进程内共享的连接（按数据库路径），所有Database实例共用
+_connections = {}
+# 搜索专用的只读连接：WAL模式下读取不阻塞写入，较慢的LIKE扫描不占用共享连接的锁
+_search_connections = {}
+_search_lock = threading.Lock()
+_initialized = set()
+_lock = threading.RLock()
+
+
+def get_connection(db_path=None):
+    db_path = db_path or DB_PATH
+    with _lock:
+        conn = _connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+            # 全文索引的触发器用它读取压缩的内容
+            conn.create_function('note_text', 1, revisions.unpack_content, deterministic=True)
+            conn.create_function('note_index_text', 1, revisions.index_text, deterministic=True)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            _connections[db_path] = conn
+        return conn
+
+
+def get_search_connection(db_path=None):
+    # 调用时持有_search_lock；加锁顺序总是先_search_lock再_lock
+    db_path = db_path or DB_PATH
+    conn = _search_connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.create_function('note_text', 1, revisions.unpack_content, deterministic=True)
+        for pragma in PRAGMAS[1:] + ('PRAGMA query_only=1',):
+            conn.execute(pragma)
+        _search_connections[db_path] = conn
+    return conn
+
+
+def close_connections():
+    with _search_lock, _lock:
+        for conn in list(_connections.values()) + list(_search_connections.values()):
+            conn.close()
+        _connections.clear()
+        _search_connections.clear()
+        _initialized.clear()
+
 
 class Database:
-    def __init__(self):
-        self.db_path = 'notes.db'
-        self.init_db()
+    def __init__(self, db_path=None):
+        db_path = db_path or DB_PATH
+        self.db_path = db_path
+        self.lock = _lock
+        self.conn = get_connection(db_path)
+        # 每个进程只检查一次结构版本
+        with self.lock:
+            if db_path not in _initialized:
+                self.init_db()
+                _initialized.add(db_path)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            with self.conn:
+                yield self.conn.cursor()
         
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建便签表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT,
-                font TEXT,
-                bg_color TEXT,
-                text_color TEXT,
-                position_x INTEGER,
-                position_y INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建最近使用字体表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS recent_fonts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                font_name TEXT UNIQUE,
-                last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        # 按 PRAGMA user_version 升级结构，已是最新版本时不执行DDL
+        with self.lock:
+            migrations.migrate(self.conn)
         
     def add_recent_font(self, font_name):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
             # 更新或插入字体记录
-            cursor.execute('''
-                INSERT OR REPLACE INTO recent_fonts (font_name, last_used)
-                VALUES (?, CURRENT_TIMESTAMP)
-            ''', (font_name,))
-            
-            conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute(SQL_ADD_RECENT_FONT, (font_name,))
         except Exception as e:
             print(f"Error adding recent font: {e}")
-        finally:
-            conn.close()
         
     def get_recent_fonts(self, limit=5):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                SELECT font_name FROM recent_fonts
-                ORDER BY last_used DESC
-                LIMIT ?
-            ''', (limit,))
-            
-            fonts = [row[0] for row in cursor.fetchall()]
-            return fonts
+            with self.lock:
+                cursor = self.conn.execute(SQL_GET_RECENT_FONTS, (limit,))
+                return [row[0] for row in cursor.fetchall()]
         except Exception as e:
             print(f"Error getting recent fonts: {e}")
             return []
-        finally:
-            conn.close()
         
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT,
-                position_x INTEGER,
-                position_y INTEGER,
-                size_width INTEGER,
-                size_height INTEGER,
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP,
-                is_top_most BOOLEAN,
-                is_bottom_most BOOLEAN,
-                background_color TEXT,
-                font_family TEXT,
-                font_size INTEGER,
-                font_color TEXT
-            )
-        ''')
-        self.conn.commit()
-        
-    def save_note(self, note_data):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO notes (
-                content, position_x, position_y, size_width, size_height,
-                created_at, updated_at, is_top_most, is_bottom_most,
-                background_color, font_family, font_size, font_color
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            note_data['content'],
+        self.init_db()
+
+    def _insert_note(self, cursor, note_data, packed=None):
+        # packed: 调用方在数据库锁外压缩好的内容
+        if packed is None:
+            packed = revisions.pack_content(note_data['content'])
+        now = datetime.now()
+        cursor.execute(SQL_INSERT_NOTE, (
+            packed,
             note_data['position_x'],
             note_data['position_y'],
             note_data['size_width'],
             note_data['size_height'],
-            datetime.now(),
-            datetime.now(),
+            now,
+            now,
             note_data.get('is_top_most', False),
             note_data.get('is_bottom_most', False),
             note_data.get('background_color', '#FFFF99'),
             note_data.get('font_family', 'Arial'),
             note_data.get('font_size', 12),
-            note_data.get('font_color', '#000000')
+            note_data.get('font_color', '#000000'),
+            note_data.get('background_image'),
+            note_data.get('background_blob'),
         ))
-        self.conn.commit()
-        return cursor.lastrowid
+        note_id = cursor.lastrowid
+        self._record_revision(cursor, note_id, None, note_data['content'], packed)
+        return note_id
+
+    def _update_note(self, cursor, note_id, note_data, packed=None):
+        # note_data 可以只包含修改过的列（NoteModel.take_changes），缺少的列保持不变
+        fields = tuple(field for field in UPDATE_FIELDS if field in note_data)
+        if not fields:
+            return
+        row = None
+        values = [note_data[field] for field in fields]
+        if 'content' in note_data:
+            row = cursor.execute(SQL_GET_CONTENT, (note_id,)).fetchone()
+            if packed is None:
+                packed = revisions.pack_content(note_data['content'])
+            values[fields.index('content')] = packed
+        cursor.execute(update_sql(fields), values + [datetime.now(), note_id])
+        if row is not None:
+            if row[1]:
+                # 冷表中的便签修改后回到notes表；索引的触发器已经用过冷表中的原文
+                cursor.execute(SQL_DELETE_COLD_CONTENT, (note_id,))
+            self._record_revision(cursor, note_id, revisions.unpack_content(row[0]), note_data['content'], packed)
+
+    def _record_revision(self, cursor, note_id, old_content, new_content, packed=None):
+        # 最新版本的内容总是等于notes表中的content，新版本记为对它的差量
+        # 压缩保存的内容与快照的编码相同，需要快照时直接使用
+        if old_content == new_content:
+            return
+        now = time.time()
+        row = cursor.execute(SQL_LAST_REVISION, (note_id,)).fetchone()
+        if row is None:
+            revision = 1
+            if old_content:
+                # 升级前就存在的便签，先把原内容记为第一个版本
+                cursor.execute(SQL_INSERT_REVISION, (
+                    note_id, revision, revisions.KIND_SNAPSHOT,
+                    revisions.encode_snapshot(old_content), now))
+                revision = 2
+            cursor.execute(SQL_INSERT_REVISION, (
+                note_id, revision, revisions.KIND_SNAPSHOT, self._snapshot(new_content, packed), now))
+            return
+        revision = row[0] + 1
+        base = cursor.execute(SQL_BASE_SNAPSHOT, (note_id, row[0])).fetchone()
+        if base is None or revision - base[0] >= revisions.SNAPSHOT_INTERVAL:
+            kind, data = revisions.KIND_SNAPSHOT, self._snapshot(new_content, packed)
+        else:
+            kind, data = revisions.KIND_DELTA, revisions.encode_delta(old_content or '', new_content or '')
+        cursor.execute(SQL_INSERT_REVISION, (note_id, revision, kind, data, now))
+
+    @staticmethod
+    def _snapshot(content, packed):
+        if isinstance(packed, bytes):
+            return packed
+        return revisions.encode_snapshot(content or '')
+
+    def _load_revision(self, cursor, note_id, revision):
+        # 从最近的快照开始依次应用差量
+        base = cursor.execute(SQL_BASE_SNAPSHOT, (note_id, revision)).fetchone()
+        if base is None:
+            return None
+        rows = cursor.execute(SQL_REVISION_CHAIN, (note_id, base[0], revision)).fetchall()
+        if len(rows) != revision - base[0] + 1:
+            return None
+        content = revisions.decode_snapshot(rows[0][1])
+        for kind, data, _ in rows[1:]:
+            content = revisions.apply_delta(content, data)
+        return content
+
+    def get_note_content(self, note_id):
+        # 便签的完整内容，冷表中的便签也从这里读取；便签不存在时返回None
+        with self.lock:
+            row = self.conn.execute(SQL_GET_CONTENT, (note_id,)).fetchone()
+        return None if row is None else revisions.unpack_content(row[0])
+
+    def freeze_cold_notes(self, cold_after_days=None, time_budget_ms=50):
+        # 长期未修改的便签内容压缩后移到冷表，notes表只留预览；超出时间预算时停止，返回done=False等下次继续
+        # 每个便签单独一个事务，与compact_revisions一样不会长时间阻塞自动保存
+        if cold_after_days is None:
+            days = os.environ.get(COLD_AFTER_ENV)
+            cold_after_days = float(days) if days else COLD_AFTER_DAYS
+        start = time.perf_counter()
+        cutoff = datetime.now() - timedelta(days=cold_after_days)
+        stats = {'notes': 0, 'bytes': 0, 'done': True}
+        with self.lock:
+            note_ids = [row[0] for row in self.conn.execute(SQL_COLD_CANDIDATES, (cutoff, COLD_PREVIEW_CHARS))]
+        for note_id in note_ids:
+            if (time.perf_counter() - start) * 1000 > time_budget_ms:
+                stats['done'] = False
+                break
+            with self.transaction() as cursor:
+                row = cursor.execute(SQL_GET_CONTENT, (note_id,)).fetchone()
+                if row is None or row[1]:
+                    continue
+                text = revisions.unpack_content(row[0])
+                data = row[0] if isinstance(row[0], bytes) else revisions.encode_snapshot(text)
+                cursor.execute(SQL_INSERT_COLD_CONTENT, (note_id, data))
+                cursor.execute(SQL_FREEZE_NOTE, (text[:COLD_PREVIEW_CHARS], note_id))
+                stats['bytes'] += len(data)
+            stats['notes'] += 1
+        stats['ms'] = (time.perf_counter() - start) * 1000
+        return stats
+
+    def content_stats(self):
+        # 便签内容按存储方式统计：notes表中的原文、压缩的内容，以及冷表；字节数为实际存储的大小
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT typeof(content), COUNT(*), COALESCE(SUM(length(CAST(content AS BLOB))), 0), "
+                "COALESCE(SUM(length(preview)), 0) FROM notes GROUP BY typeof(content)"
+            ).fetchall()
+            cold = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM cold_contents').fetchone()
+            page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+            pages = self.conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        by_type = {kind: (count, nbytes, preview) for kind, count, nbytes, preview in rows}
+        plain = by_type.get('text', (0, 0, 0))
+        compressed = by_type.get('blob', (0, 0, 0))
+        return {
+            'hot': {'notes': plain[0] + compressed[0], 'bytes': plain[1] + compressed[1],
+                    'compressed_notes': compressed[0], 'compressed_bytes': compressed[1]},
+            'cold': {'notes': cold[0], 'bytes': cold[1], 'preview_chars': by_type.get('null', (0, 0, 0))[2]},
+            'file_bytes': pages * page_size,
+            'free_bytes': free_pages * page_size,
+        }
+
+    def get_note_revision(self, note_id, revision):
+        # 返回便签在指定版本时的内容，版本不存在（或已被整理掉）时返回None
+        with self.lock:
+            return self._load_revision(self.conn.cursor(), note_id, revision)
+
+    def list_revisions(self, note_id):
+        with self.lock:
+            rows = self.conn.execute(SQL_LIST_REVISIONS, (note_id,)).fetchall()
+        return [
+            {'revision': revision, 'snapshot': kind == revisions.KIND_SNAPSHOT,
+             'created_at': created_at, 'size': size}
+            for revision, kind, created_at, size in rows
+        ]
+
+    def compact_revisions(self, retention_days=REVISION_RETENTION_DAYS, time_budget_ms=50):
+        # 早于保留期限的版本合并为一个快照；超出时间预算时停止，返回done=False等下次继续
+        # 每个便签单独一个事务，不会长时间阻塞自动保存
+        start = time.perf_counter()
+        cutoff = time.time() - retention_days * 86400
+        stats = {'notes': 0, 'deleted': 0, 'done': True}
+        with self.lock:
+            note_ids = [row[0] for row in self.conn.execute(SQL_COMPACT_CANDIDATES, (cutoff,))]
+        for note_id in note_ids:
+            if (time.perf_counter() - start) * 1000 > time_budget_ms:
+                stats['done'] = False
+                break
+            with self.transaction() as cursor:
+                keep = cursor.execute(SQL_OLDEST_KEPT_REVISION, (note_id, cutoff)).fetchone()[0]
+                content = self._load_revision(cursor, note_id, keep)
+                if content is None:
+                    continue
+                created_at = cursor.execute(SQL_REVISION_CHAIN, (note_id, keep, keep)).fetchone()[2]
+                cursor.execute(SQL_INSERT_REVISION, (
+                    note_id, keep, revisions.KIND_SNAPSHOT, revisions.encode_snapshot(content), created_at))
+                cursor.execute(SQL_DELETE_OLD_REVISIONS, (note_id, keep))
+                stats['deleted'] += cursor.rowcount
+            stats['notes'] += 1
+        stats['ms'] = (time.perf_counter() - start) * 1000
+        return stats
+
+    def revision_stats(self):
+        with self.lock:
+            count, snapshots, nbytes = self.conn.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(kind = {revisions.KIND_SNAPSHOT}), 0), COALESCE(SUM(length(data)), 0) '
+                'FROM note_revisions'
+            ).fetchone()
+        return {'revisions': count, 'snapshots': snapshots, 'bytes': nbytes}
+        
+    def save_note(self, note_data):
+        return self.write_notes([(None, note_data)])[0]
         
     def update_note(self, note_id, note_data):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE notes SET
-                content = ?,
-                position_x = ?,
-                position_y = ?,
-                size_width = ?,
-                size_height = ?,
-                updated_at = ?,
-                is_top_most = ?,
-                is_bottom_most = ?,
-                background_color = ?,
-                font_family = ?,
-                font_size = ?,
-                font_color = ?
-            WHERE id = ?
-        ''', (
-            note_data['content'],
-            note_data['position_x'],
-            note_data['position_y'],
-            note_data['size_width'],
-            note_data['size_height'],
-            datetime.now(),
-            note_data.get('is_top_most', False),
-            note_data.get('is_bottom_most', False),
-            note_data.get('background_color', '#FFFF99'),
-            note_data.get('font_family', 'Arial'),
-            note_data.get('font_size', 12),
-            note_data.get('font_color', '#000000'),
-            note_id
-        ))
-        self.conn.commit()
+        self.write_notes([(note_id, note_data)])
+
+    def write_notes(self, saves, deletes=()):
+        # 在同一个事务中批量写入：saves为(note_id, note_data)列表，note_id为None时插入
+        # 返回与saves一一对应的便签id
+        # 内容在获取数据库锁之前压缩：大便签压缩一次要上百毫秒，期间其他线程仍可读写
+        packed = [revisions.pack_content(note_data['content']) if 'content' in note_data else None
+                  for _, note_data in saves]
+        note_ids = []
+        with self.transaction() as cursor:
+            for (note_id, note_data), content in zip(saves, packed):
+                if note_id is None:
+                    note_id = self._insert_note(cursor, note_data, content)
+                else:
+                    self._update_note(cursor, note_id, note_data, content)
+                note_ids.append(note_id)
+            if deletes:
+                cursor.executemany(SQL_DELETE_NOTE, [(note_id,) for note_id in deletes])
+        return note_ids
         
     def get_all_notes(self):
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM notes')
-        return cursor.fetchall()
+        # 原始行：较长的内容是压缩的BLOB，冷表中的便签内容为NULL
+        with self.lock:
+            cursor = self.conn.execute('SELECT * FROM notes')
+            return cursor.fetchall()
+
+    def iter_notes(self, screen_rect=None, batch_size=32):
+        # 用游标分批读取便签，先返回置顶及在屏幕内的，再返回其余的
+        # screen_rect: (x, y, width, height)
+        if screen_rect is None:
+            queries = [(SQL_SELECT_NOTES + SQL_RESTORE_ORDER, ())]
+        else:
+            x, y, width, height = screen_rect
+            params = (x + width, x, y + height, y)
+            queries = [
+                (SQL_SELECT_NOTES + ' WHERE' + SQL_VISIBLE_CONDITION + SQL_RESTORE_ORDER, params),
+                (SQL_SELECT_NOTES + ' WHERE NOT' + SQL_VISIBLE_CONDITION + SQL_RESTORE_ORDER, params),
+            ]
+        for query, params in queries:
+            with self.lock:
+                cursor = self.conn.execute(query, params)
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    note_data = dict(zip(NOTE_FIELDS, row))
+                    note_data['content'] = revisions.unpack_content(note_data['content'])
+                    yield note_data
         
-    def delete_note(self, note_id):
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-        self.conn.commit()
+    def has_blob(self, digest, variant=BLOB_ORIGINAL):
+        with self.lock:
+            return self.conn.execute(SQL_HAS_BLOB, (digest, variant)).fetchone() is not None
+
+    def blob_variants(self, digest):
+        # variant -> {'id', 'format', 'width', 'height', 'size'}
+        with self.lock:
+            rows = self.conn.execute(SQL_BLOB_VARIANTS, (digest,)).fetchall()
+        return {
+            variant: {'id': blob_id, 'format': fmt, 'width': width, 'height': height, 'size': size}
+            for variant, blob_id, fmt, width, height, size in rows
+        }
+
+    def store_blob_file(self, digest, path, fmt, width=None, height=None):
+        # 先插入同样大小的zeroblob，再分块写入文件内容，大图片不需要整个读入内存
+        # 已存在时不写入，返回写入的字节数
+        size = os.path.getsize(path)
+        with self.transaction() as cursor:
+            cursor.execute(SQL_INSERT_BLOB_REF, (digest, time.time()))
+            if not HAS_BLOBOPEN:
+                if cursor.execute(SQL_HAS_BLOB, (digest, BLOB_ORIGINAL)).fetchone() is not None:
+                    return 0
+                with open(path, 'rb') as f:
+                    data = f.read()
+                cursor.execute(SQL_INSERT_BLOB, (digest, BLOB_ORIGINAL, fmt, width, height, len(data), data))
+                return len(data)
+            cursor.execute(SQL_INSERT_BLOB_ZERO, (digest, BLOB_ORIGINAL, fmt, width, height, size, size))
+            if cursor.rowcount == 0:
+                return 0
+            with self.conn.blobopen('blobs', 'data', cursor.lastrowid) as blob, open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(BLOB_CHUNK_SIZE), b''):
+                    blob.write(chunk)
+        return size
+
+    def store_blob(self, digest, variant, fmt, width, height, data):
+        # 缩放版本和缩略图，数据较小，直接写入
+        with self.transaction() as cursor:
+            cursor.execute(SQL_INSERT_BLOB_REF, (digest, time.time()))
+            cursor.execute(SQL_INSERT_BLOB, (digest, variant, fmt, width, height, len(data), data))
+
+    def read_blob(self, digest, variant=BLOB_ORIGINAL):
+        # 分块读入预先分配的缓冲区，不存在时返回None
+        with self.lock:
+            row = self.conn.execute(SQL_BLOB_LOCATION, (digest, variant)).fetchone()
+            if row is None:
+                return None
+            blob_id, size = row
+            data = bytearray(size)
+            offset = 0
+            for chunk in self._blob_chunks(blob_id):
+                data[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+        return bytes(data)
+
+    def copy_blob(self, digest, variant, f):
+        # 分块写到文件对象，返回写入的字节数；不存在时返回None
+        with self.lock:
+            row = self.conn.execute(SQL_BLOB_LOCATION, (digest, variant)).fetchone()
+            if row is None:
+                return None
+            for chunk in self._blob_chunks(row[0]):
+                f.write(chunk)
+        return row[1]
+
+    def _blob_chunks(self, blob_id):
+        # 调用时持有数据库锁，按BLOB_CHUNK_SIZE依次返回图片数据
+        if HAS_BLOBOPEN:
+            with self.conn.blobopen('blobs', 'data', blob_id, readonly=True) as blob:
+                yield from iter(lambda: blob.read(BLOB_CHUNK_SIZE), b'')
+            return
+        offset = 1
+        while True:
+            chunk = self.conn.execute(SQL_BLOB_CHUNK, (offset, BLOB_CHUNK_SIZE, blob_id)).fetchone()[0]
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+
+    def collect_blobs(self, grace_seconds=BLOB_GRACE_SECONDS):
+        # 删除已经没有便签引用的图片及其缩放版本
+        stats = {'blobs': 0, 'bytes': 0}
+        with self.transaction() as cursor:
+            digests = [row[0] for row in cursor.execute(SQL_UNREFERENCED_BLOBS, (time.time() - grace_seconds,))]
+            for digest in digests:
+                stats['bytes'] += cursor.execute(SQL_BLOB_BYTES, (digest,)).fetchone()[0]
+                cursor.execute(SQL_DELETE_BLOBS, (digest,))
+                cursor.execute(SQL_DELETE_BLOB_REF, (digest,))
+                stats['blobs'] += 1
+        return stats
+
+    def blob_stats(self):
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT variant, COUNT(*), COALESCE(SUM(size), 0) FROM blobs GROUP BY variant'
+            ).fetchall()
+            referenced = self.conn.execute('SELECT COUNT(*) FROM blob_refs WHERE refcount > 0').fetchone()[0]
+        return {
+            'images': referenced,
+            'variants': {variant: {'count': count, 'bytes': nbytes} for variant, count, nbytes in rows},
+            'bytes': sum(row[2] for row in rows),
+        }
+
+    def count_notes(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
+
+    def iter_export_rows(self, batch_size=500):
+        # 按id顺序分批读取全部列，便签数量再多也只占用一批的内存
+        with self.lock:
+            cursor = self.conn.execute(SQL_EXPORT_NOTES)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(('id',) + TRANSFER_FIELDS, row))
+
+    def import_rows(self, rows, batch_size=IMPORT_BATCH_SIZE, transaction_rows=IMPORT_TRANSACTION_ROWS):
+        # 批量插入：rows为按TRANSFER_FIELDS排列的元组，可以是生成器
+        # 每批用executemany插入，多批合并在一个大事务里；导入的便签没有历史版本，第一次修改时补记
+        count = 0
+        batch = []
+        rows = (self._pack_row(row) for row in rows)
+        while True:
+            with self.transaction() as cursor:
+                written = 0
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        cursor.executemany(SQL_IMPORT_NOTE, batch)
+                        written += len(batch)
+                        batch = []
+                        if written >= transaction_rows:
+                            break
+                else:
+                    if batch:
+                        cursor.executemany(SQL_IMPORT_NOTE, batch)
+                        written += len(batch)
+                        batch = []
+                    count += written
+                    return count
+            count += written
+
+    @staticmethod
+    def _pack_row(row):
+        content = row[CONTENT_INDEX]
+        packed = revisions.pack_content(content)
+        if packed is content:
+            return row
+        row = list(row)
+        row[CONTENT_INDEX] = packed
+        return row
+
+    def has_fulltext_index(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+            ).fetchone()
+        return row is not None
+
+    def search_notes(self, query, limit=100):
+        # 返回内容包含查询文本的便签id，按相关度排序
+        # 在单独的只读连接上查询，LIKE扫描期间自动保存照常写入
+        query = query.strip()
+        if not query:
+            return []
+        use_index = len(query) >= 3 and self.has_fulltext_index()
+        with _search_lock:
+            conn = get_search_connection(self.db_path)
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            if not use_index:
+                # 一两个字的查询（中文常见）用LIKE扫描
+                return [row[0] for row in conn.execute(SQL_SEARCH_NOTES_LIKE, (pattern, limit))]
+            # trigram索引至少需要3个字符，整体作为短语匹配
+            phrase = '"' + query.replace('"', '""') + '"'
+            note_ids = [row[0] for row in conn.execute(SQL_SEARCH_NOTES, (phrase, limit))]
+            found = set(note_ids)
+            for (note_id,) in conn.execute(SQL_SEARCH_LONG_NOTES_LIKE, (pattern, limit)):
+                if len(note_ids) >= limit:
+                    break
+                if note_id not in found:
+                    note_ids.append(note_id)
+            return note_ids
         
-    def __del__(self):
-        self.conn.close() 
\ No newline at end of file
+    def delete_note(self, note_id):
+        with self.transaction() as cursor:
+            cursor.execute(SQL_DELETE_NOTE, (note_id,))
\ No newline at end of file
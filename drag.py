@@ -0,0 +1,76 @@
+from PyQt6.QtCore import QObject, QPoint, QRect, Qt, QTimer
+from PyQt6.QtWidgets import QApplication
+from screens import screen_layout
+from snap import snap_guides
+
+# 屏幕没有报告刷新率时按60Hz合并
+DEFAULT_REFRESH_RATE = 60.0
+
+
+def frame_interval(screen):
+    # 一帧的毫秒数
+    rate = screen.refreshRate() if screen is not None else 0
+    return max(1, round(1000 / (rate if rate > 0 else DEFAULT_REFRESH_RATE)))
+
+
+class DragMover(QObject):
+    # 拖动窗口：鼠标移动事件只记录目标位置，按屏幕刷新率每帧移动一次；
+    # 位置限制使用缓存的屏幕布局，拖动期间不查询屏幕
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.widget = widget
+        self.active = False
+        self.grab_offset = None  # 按下时鼠标相对窗口左上角的位置（全局坐标之差）
+        self.layout = None
+        self.snapper = None  # 吸附到屏幕边缘和附近的便签，按住Alt时不吸附
+        self.pending_pos = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.apply_pending)
+
+        # 统计信息：收到的移动事件数和实际移动窗口的次数
+        self.raw_events = 0
+        self.applied_moves = 0
+
+    def begin(self, global_pos, snapper=None):
+        self.layout = screen_layout()
+        self.snapper = snapper
+        self.timer.setInterval(frame_interval(self.widget.screen()))
+        self.grab_offset = global_pos - self.widget.pos()
+        self.pending_pos = None
+        self.active = True
+
+    def move_to(self, global_pos):
+        if not self.active:
+            return
+        self.raw_events += 1
+        self.pending_pos = self.clamp(global_pos - self.grab_offset)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def clamp(self, pos):
+        # 按目标位置所在的屏幕限制，便签可以拖到其他显示器上，但不会完全移出屏幕
+        return self.layout.clamp_position(QRect(pos, self.widget.size()))
+
+    def apply_pending(self):
+        if self.pending_pos is not None:
+            pos = self.pending_pos
+            self.pending_pos = None
+            if self.snapper is not None:
+                guides = []
+                if not QApplication.keyboardModifiers() & Qt.KeyboardModifier.AltModifier:
+                    x, y, guides = self.snapper.snap((pos.x(), pos.y(), self.widget.width(), self.widget.height()))
+                    pos = QPoint(x, y)
+                snap_guides().show_guides(guides)
+            if pos != self.widget.pos():
+                self.widget.move(pos)
+                self.applied_moves += 1
+
+    def end(self):
+        # 松开时立即移动到最后的位置
+        self.timer.stop()
+        self.apply_pending()
+        if self.snapper is not None:
+            snap_guides().show_guides([])
+            self.snapper = None
+        self.active = False
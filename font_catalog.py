@@ -0,0 +1,159 @@
+import bisect
+import threading
+from PyQt6.QtCore import QObject, QRect, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QFontDatabase, QImage, QPainter
+from database import Database
+
+PREVIEW_TEXT = "你好"
+PREVIEW_POINT_SIZE = 10
+RECENT_LIMIT = 5
+
+# 常用字体，启动时和最近使用的字体一起预先渲染
+COMMON_FONTS = ['微软雅黑', '宋体', '黑体', 'Arial', 'Times New Roman',
+                '楷体', '仿宋', '幼圆', '方正舒体', '华文行楷']
+
+
+class GlyphAtlas:
+    # 把每个字体的预览文字渲染到共享的大图上，菜单只需从中截取绘制
+    def __init__(self, cell_width=80, cell_height=28, page_size=1024):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.page_size = page_size
+        self.columns = page_size // cell_width
+        self.cells_per_page = self.columns * (page_size // cell_height)
+        self.pages = []
+        self.cells = {}  # family -> (page_index, QRect)
+        self.lock = threading.Lock()
+
+    def get(self, family):
+        with self.lock:
+            cell = self.cells.get(family)
+            if cell is None:
+                cell = self._render(family)
+            page_index, rect = cell
+            return self.pages[page_index], rect
+
+    def _render(self, family):
+        index = len(self.cells)
+        page_index, slot = divmod(index, self.cells_per_page)
+        if page_index == len(self.pages):
+            page = QImage(self.page_size, self.page_size, QImage.Format.Format_ARGB32_Premultiplied)
+            page.fill(Qt.GlobalColor.transparent)
+            self.pages.append(page)
+        row, col = divmod(slot, self.columns)
+        rect = QRect(col * self.cell_width, row * self.cell_height, self.cell_width, self.cell_height)
+
+        # QImage可以在非界面线程上绘制
+        painter = QPainter(self.pages[page_index])
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        painter.setFont(QFont(family, PREVIEW_POINT_SIZE))
+        painter.setPen(QColor('#333333'))
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, PREVIEW_TEXT)
+        painter.end()
+
+        self.cells[family] = (page_index, rect)
+        return self.cells[family]
+
+    def nbytes(self):
+        return sum(page.sizeInBytes() for page in self.pages)
+
+
+class FontCatalog(QObject):
+    # 后台枚举完成后发出
+    ready = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.families = []
+        self.sorted_keys = []  # 排序后的(小写名称, 字体名)，用于前缀查找
+        self.recent = []
+        self.atlas = GlyphAtlas()
+        self.is_ready = False
+        self.version = 0  # 最近字体变化时递增，菜单据此决定是否重建
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._load, name='font-catalog', daemon=True)
+            self.thread.start()
+
+    def _load(self):
+        try:
+            recent = Database().get_recent_fonts(RECENT_LIMIT)
+            families = QFontDatabase.families()
+            sorted_keys = sorted((family.lower(), family) for family in families)
+            # 预先渲染菜单默认显示的字体
+            for family in dict.fromkeys(recent + COMMON_FONTS):
+                self.atlas.get(family)
+            self.recent = recent
+            self.families = families
+            self.sorted_keys = sorted_keys
+            self.is_ready = True
+            self.version += 1
+        except Exception as e:
+            print(f"加载字体列表失败: {e}")
+        self.ready.emit()
+
+    def recent_fonts(self):
+        return list(self.recent)
+
+    def add_recent_font(self, font_name):
+        # 内存中立即生效，同时写入数据库
+        self.recent = [font_name] + [name for name in self.recent if name != font_name]
+        del self.recent[RECENT_LIMIT:]
+        self.version += 1
+        Database().add_recent_font(font_name)
+
+    def menu_fonts(self):
+        return list(dict.fromkeys(self.recent + COMMON_FONTS))
+
+    def preview(self, family):
+        return self.atlas.get(family)
+
+    def search(self, query, limit=50):
+        query = query.strip().lower()
+        if not query:
+            return [family for _, family in self.sorted_keys[:limit]]
+
+        # 先按前缀二分查找
+        results = []
+        index = bisect.bisect_left(self.sorted_keys, (query, ''))
+        while index < len(self.sorted_keys) and len(results) < limit:
+            key, family = self.sorted_keys[index]
+            if not key.startswith(query):
+                break
+            results.append(family)
+            index += 1
+        if len(results) >= limit:
+            return results
+
+        # 再做模糊匹配：包含子串的优先，其次是按顺序包含所有字符的
+        found = set(results)
+        substring = []
+        subsequence = []
+        for key, family in self.sorted_keys:
+            if family in found:
+                continue
+            position = key.find(query)
+            if position >= 0:
+                substring.append((position, family))
+            elif self._is_subsequence(query, key):
+                subsequence.append(family)
+        substring.sort()
+        results.extend(family for _, family in substring)
+        results.extend(subsequence)
+        return results[:limit]
+
+    def _is_subsequence(self, query, key):
+        chars = iter(key)
+        return all(char in chars for char in query)
+
+
+_font_catalog = None
+
+
+def get_font_catalog():
+    global _font_catalog
+    if _font_catalog is None:
+        _font_catalog = FontCatalog()
+    return _font_catalog
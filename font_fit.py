@@ -0,0 +1,100 @@
+import hashlib
+from collections import OrderedDict
+from PyQt6.QtGui import QFont, QTextDocument
+
+# 缓存条目上限（两个缓存各自计算）
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class FontFitCache:
+    # 所有便签共享的字体适配缓存：
+    # sizes: 文本在某个字号下的排版尺寸
+    # fits:  文本在某个可用区域内能用的最大字号
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.sizes = OrderedDict()
+        self.fits = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.layouts = 0  # 实际执行的排版次数
+        self.doc = None
+
+    def _font_key(self, font):
+        return (font.family(), font.bold(), font.italic())
+
+    def _get(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def _put(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def text_size(self, text, font, point_size=None, digest=None):
+        if point_size is None:
+            point_size = font.pointSize()
+        if digest is None:
+            digest = text_digest(text)
+        key = (digest, self._font_key(font), point_size)
+        size = self._get(self.sizes, key)
+        if size is None:
+            # 只在界面线程使用，复用同一个QTextDocument
+            if self.doc is None:
+                self.doc = QTextDocument()
+            test_font = QFont(font)
+            test_font.setPointSize(point_size)
+            self.doc.setDefaultFont(test_font)
+            self.doc.setPlainText(text)
+            doc_size = self.doc.size()
+            size = (doc_size.width(), doc_size.height())
+            self.layouts += 1
+            self._put(self.sizes, key, size)
+        return size
+
+    def best_size(self, text, font, available_width, available_height, min_size, max_size, digest=None):
+        # 返回能放下文本的最大字号，放不下时返回0
+        if digest is None:
+            digest = text_digest(text)
+        key = (digest, self._font_key(font), available_width, available_height, min_size, max_size)
+        best = self._get(self.fits, key)
+        if best is not None:
+            self.hits += 1
+            return best
+
+        self.misses += 1
+        best = 0
+        while min_size <= max_size:
+            mid_size = (min_size + max_size) // 2
+            width, height = self.text_size(text, font, mid_size, digest)
+            if width <= available_width and height <= available_height:
+                best = mid_size
+                min_size = mid_size + 1
+            else:
+                max_size = mid_size - 1
+        self._put(self.fits, key, best)
+        return best
+
+    def clear(self):
+        self.sizes.clear()
+        self.fits.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'layouts': self.layouts,
+            'fit_entries': len(self.fits),
+            'size_entries': len(self.sizes),
+        }
+
+
+font_fit_cache = FontFitCache()
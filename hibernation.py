@@ -0,0 +1,360 @@
+import os
+import time
+from PyQt6.QtCore import QObject, QPoint, QRect, QRectF, Qt, QTimer
+from PyQt6.QtGui import QFont, QPainter, QPen, QPixmap
+from PyQt6.QtWidgets import QWidget
+import theme
+from autosave import next_autosave_key
+from image_loader import THUMB_VARIANT, pixmap_cache, pixmap_nbytes
+from note_model import GEOMETRY_FIELDS, NoteModel, model_field
+from screens import screen_layout
+
+# 空闲多久的便签进入休眠（秒）
+DEFAULT_IDLE_SECONDS = 600
+DEFAULT_CHECK_INTERVAL_MS = 30000
+# 所有未休眠便签的估算内存超过目标时，按最久未使用的顺序继续休眠
+DEFAULT_MEMORY_TARGET_BYTES = 64 * 1024 * 1024
+MEMORY_TARGET_ENV = 'NOTE_MEMORY_TARGET_MB'
+
+# 估算用的常数，按 benchmark.py hibernation 在offscreen平台上休眠前后的常驻内存差校准：
+# 每个便签的控件树约208KB，文档每个字符约8字节
+WIDGET_TREE_BYTES = 208 * 1024
+DOCUMENT_BYTES_PER_CHAR = 8
+PLACEHOLDER_BYTES = 16 * 1024
+
+
+def window_bytes(width, height):
+    # 可见窗口的后备缓冲区
+    return width * height * 4
+
+
+def is_on_screen(rect):
+    return screen_layout().is_on_screen(rect)
+
+
+def estimate_note_bytes(note):
+    # 无法精确统计单个便签的内存，按控件树、文档和窗口缓冲区估算；
+    # 背景图在共享缓存里，休眠时实际移出缓存的部分另外计算
+    total = WIDGET_TREE_BYTES + note.text_edit.document().characterCount() * DOCUMENT_BYTES_PER_CHAR
+    if note.isVisible():
+        total += window_bytes(note.width(), note.height())
+    return total
+
+
+class NotePlaceholder(QWidget):
+    # 休眠便签的占位窗口：只保留便签数据，背景图片画缩略图，鼠标移入或点击时重建完整的便签
+    note_id = model_field('note_id')
+    background_color = model_field('background_color')
+    font_color = model_field('font_color')
+
+    def __init__(self, manager, model, autosave_key, background=None, snapshot=None, thumbnail=None, preview=None):
+        super().__init__(None)
+        self.manager = manager
+        self.parent_control = manager.panel
+        self.model = model
+        self.model.listen(self.on_model_changed)
+        self.autosave_key = autosave_key
+        self.autosave_enabled = True
+        self.background = background or {}  # 背景图片的缩放方式；不在数据库中的图片保留原图
+        self.snapshot = snapshot  # 不在数据库中的背景图片只能保留截图
+        self.thumbnail = thumbnail  # 数据库中预先生成的缩略图（压缩数据，第一次绘制时解码）
+        self.thumbnail_pixmap = None
+        self.preview = preview  # 内容在冷表中的便签恢复时只读取预览，model.content为None
+        self.show_text_panel = True
+        self.highlighted = False
+        flags = Qt.WindowType.FramelessWindowHint
+        if model.is_top_most:
+            flags |= Qt.WindowType.WindowStaysOnTopHint
+        self.setWindowFlags(flags)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
+        self.setGeometry(model.position_x, model.position_y, model.size_width, model.size_height)
+
+    def nbytes(self):
+        total = PLACEHOLDER_BYTES
+        if self.snapshot is not None:
+            total += pixmap_nbytes(self.snapshot)
+        if self.thumbnail is not None:
+            total += len(self.thumbnail)
+        if self.thumbnail_pixmap is not None:
+            total += pixmap_nbytes(self.thumbnail_pixmap)
+        if self.isVisible():
+            total += window_bytes(self.width(), self.height())
+        return total
+
+    def take_changes(self):
+        return self.model.take_changes()
+
+    def to_note_data(self):
+        note_data = self.model.to_note_data()
+        del note_data['id']
+        return note_data
+
+    def on_model_changed(self, model, field):
+        if field in GEOMETRY_FIELDS:
+            self.parent_control.note_index.update(self)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        autosaver = getattr(self.parent_control, 'autosaver', None)
+        if autosaver is not None and self.autosave_enabled:
+            autosaver.mark_dirty(self)
+
+    def set_colors(self, background_color, font_color):
+        # 休眠期间的修改只更新数据，截图已过期，改为按数据绘制
+        self.model.update(background_color=background_color, font_color=font_color)
+        self.snapshot = None
+        self.update()
+
+    def set_text_font(self, font):
+        self.model.update(font_family=font.family(), font_size=font.pointSize())
+        self.snapshot = None
+        self.update()
+
+    def set_note_geometry(self, rect):
+        # 排列便签时移动占位窗口，位置和大小按修改保存
+        self.setGeometry(rect)
+        self.model.update(position_x=rect.x(), position_y=rect.y(),
+                          size_width=rect.width(), size_height=rect.height())
+        self.show()
+
+    def relocate(self, pos):
+        # 临时移动到屏幕上，不记为修改
+        self.move(pos)
+        self.model.load({'position_x': pos.x(), 'position_y': pos.y()})
+        self.show()
+
+    def set_highlighted(self, highlighted):
+        if self.highlighted != highlighted:
+            self.highlighted = highlighted
+            self.update()
+
+    def enterEvent(self, event):
+        self.manager.wake(self)
+
+    def mousePressEvent(self, event):
+        self.manager.wake(self)
+
+    def closeEvent(self, event):
+        self.parent_control.remove_note(self)
+        event.accept()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if self.snapshot is not None:
+            painter.drawPixmap(0, 0, self.snapshot)
+        else:
+            if self.thumbnail is not None:
+                if self.thumbnail_pixmap is None:
+                    self.thumbnail_pixmap = QPixmap()
+                    self.thumbnail_pixmap.loadFromData(self.thumbnail)
+                pixmap = self.thumbnail_pixmap
+                size = pixmap.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio)
+                topleft = QPoint((self.width() - size.width()) // 2, (self.height() - size.height()) // 2)
+                painter.drawPixmap(QRect(topleft, size), pixmap)
+            rect = QRectF(self.rect()).adjusted(5.5, 5.5, -5.5, -5.5)
+            if self.show_text_panel:
+                painter.setPen(theme.color(theme.NOTE_BORDER_COLOR))
+                painter.setBrush(theme.color(self.background_color))
+                painter.drawRoundedRect(rect, theme.NOTE_BORDER_RADIUS, theme.NOTE_BORDER_RADIUS)
+            painter.setPen(theme.color(self.font_color))
+            painter.setFont(QFont(self.model.font_family, self.model.font_size))
+            painter.drawText(rect.adjusted(5, 5, -5, -5),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap,
+                             self.model.content[:2000] if self.model.content is not None else self.preview or '')
+        if self.highlighted:
+            painter.setPen(QPen(theme.color(theme.HIGHLIGHT_COLOR), 3))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(QRectF(self.rect()).adjusted(1.5, 1.5, -1.5, -1.5),
+                                    theme.NOTE_BORDER_RADIUS, theme.NOTE_BORDER_RADIUS)
+
+
+class HibernationManager(QObject):
+    # 定期把空闲或不在屏幕内的便签换成占位窗口，释放控件树、文档和背景图
+    def __init__(self, panel, memory_target_bytes=None, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 interval_ms=DEFAULT_CHECK_INTERVAL_MS):
+        super().__init__(panel)
+        self.panel = panel
+        if memory_target_bytes is None:
+            target_mb = os.environ.get(MEMORY_TARGET_ENV)
+            memory_target_bytes = int(float(target_mb) * 1024 * 1024) if target_mb else DEFAULT_MEMORY_TARGET_BYTES
+        self.memory_target_bytes = memory_target_bytes
+        self.idle_seconds = idle_seconds
+
+        # 统计信息
+        self.hibernations = 0
+        self.wakes = 0
+        self.reclaimed_bytes = 0
+        self.total_wake_ms = 0.0
+        self.max_wake_ms = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.check)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def set_memory_target(self, memory_target_bytes):
+        self.memory_target_bytes = memory_target_bytes
+        self.check()
+
+    def is_hibernated(self, note):
+        return isinstance(note, NotePlaceholder)
+
+    def can_hibernate(self, note):
+        # 正在使用的便签不休眠
+        return not (note.underMouse() or note.isActiveWindow() or note.is_dragging or note.is_resizing
+                    or note.live_resize or note.background_request is not None)
+
+    def check(self, idle_seconds=None):
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        now = time.monotonic()
+        awake = [note for note in self.panel.notes if not self.is_hibernated(note)]
+        candidates = [note for note in awake if self.can_hibernate(note)]
+        selected = [note for note in candidates
+                    if not is_on_screen(note.frameGeometry()) or now - note.last_active >= idle_seconds]
+
+        # 超出内存目标时，按最久未使用的顺序继续选择
+        remaining = sum(estimate_note_bytes(note) for note in awake if note not in selected)
+        if remaining > self.memory_target_bytes:
+            for note in sorted(candidates, key=lambda note: note.last_active):
+                if remaining <= self.memory_target_bytes:
+                    break
+                if note not in selected:
+                    selected.append(note)
+                    remaining -= estimate_note_bytes(note)
+
+        if not selected:
+            return 0
+        # 先把未保存的修改交给自动保存，占位窗口之后只持有数据
+        if any(note.autosave_key in self.panel.autosaver.dirty for note in selected):
+            self.panel.autosaver.flush()
+        reclaimed = sum(self.hibernate(note) for note in selected)
+        print(f"便签休眠: {len(selected)}个, 约回收{reclaimed / 1024 / 1024:.1f}MB")
+        return len(selected)
+
+    def placeholder_for(self, note_data):
+        # 恢复时不在屏幕内的便签、内容在冷表中的便签直接以休眠状态创建
+        self.hibernations += 1
+        placeholder = NotePlaceholder(self, NoteModel.from_note_data(note_data), next_autosave_key(),
+                                      preview=note_data.get('preview'))
+        # 与 ControlPanel.build_note 一致：有背景图片的便签不画文本区域
+        if note_data.get('background_blob') is not None or note_data.get('background_image') is not None:
+            placeholder.show_text_panel = False
+        return placeholder
+
+    def hibernate(self, note):
+        before = estimate_note_bytes(note)
+        on_screen = is_on_screen(note.frameGeometry())
+        background = {'mode': note.background_mode}
+        if note.background_source is not None and note.background_source.key[0] == 'pixmap':
+            # 不在数据库中的图片无法重新加载，只能保留
+            background['source'] = note.background_source
+        snapshot = thumbnail = None
+        if on_screen:
+            # 数据库中的背景图片画缩略图，其余按数据绘制，都不额外占用多少内存
+            if note.background_blob is not None:
+                thumbnail = self.panel.db.read_blob(note.background_blob, THUMB_VARIANT)
+            elif 'source' in background:
+                # 截图不含搜索高亮，高亮由占位窗口自己绘制
+                highlighted = note.highlighted
+                note.highlighted = False
+                snapshot = note.grab()
+                note.highlighted = highlighted
+        # 模型连同未保存的修改记录一起交给占位窗口
+        note.sync_model()
+        note.model.unlisten(note.on_model_changed)
+        placeholder = NotePlaceholder(self, note.model, note.autosave_key, background, snapshot, thumbnail)
+        placeholder.highlighted = note.highlighted
+        placeholder.show_text_panel = note.show_text_panel
+
+        index = self.panel.notes.index(note)
+        self.panel.notes[index] = placeholder
+        dirty = self.panel.autosaver.dirty
+        if note.autosave_key in dirty:
+            dirty[note.autosave_key] = placeholder
+        if on_screen:
+            placeholder.show()
+        released = self.release_background(note)
+        note.autosave_enabled = False
+        note.background_source = None
+        note.background_image = None
+        note.close()
+        note.deleteLater()
+
+        reclaimed = before + released - placeholder.nbytes()
+        self.hibernations += 1
+        self.reclaimed_bytes += reclaimed
+        return reclaimed
+
+    def release_background(self, note):
+        # 没有其他便签使用同一张背景图时，把原图及其缩放版本移出共享缓存，唤醒时从数据库重新读取
+        source = note.background_source
+        if source is None or source.key[0] != 'file':
+            return 0
+        for other in self.panel.notes:
+            if not self.is_hibernated(other) and other is not note and \
+                    other.background_source is not None and other.background_source.key == source.key:
+                return 0
+        return pixmap_cache.release(source.key)
+
+    def wake(self, placeholder):
+        # 已经醒着的便签（例如重复的唤醒请求）和已关闭的便签不处理
+        if not self.is_hibernated(placeholder) or placeholder not in self.panel.notes:
+            return None
+        start = time.perf_counter()
+        if placeholder.model.content is None:
+            # 冷表中的便签在唤醒时才读取内容
+            placeholder.model.load({'content': self.panel.db.get_note_content(placeholder.note_id) or ''})
+        note = self.panel.build_note(placeholder.model.to_note_data(), autosave_key=placeholder.autosave_key)
+        if placeholder.model.dirty:
+            # 休眠期间的修改还没有保存
+            note.model.dirty |= placeholder.model.dirty
+            note.mark_dirty()
+        note.set_highlighted(placeholder.highlighted)
+        note.show_text_panel = placeholder.show_text_panel
+        # 数据库中的背景图片由build_note按便签数据重新加载
+        background = placeholder.background
+        note.background_mode = background.get('mode', note.background_mode)
+        if background.get('source') is not None:
+            note.background_source = background['source']
+            note.update_background()
+
+        index = self.panel.notes.index(placeholder)
+        self.panel.notes[index] = note
+        placeholder.thumbnail_pixmap = None
+        placeholder.close()
+        placeholder.deleteLater()
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.wakes += 1
+        self.total_wake_ms += elapsed
+        self.max_wake_ms = max(self.max_wake_ms, elapsed)
+        return note
+
+    def wake_all(self):
+        for note in list(self.panel.notes):
+            if self.is_hibernated(note):
+                self.wake(note)
+
+    def stats(self):
+        awake = [note for note in self.panel.notes if not self.is_hibernated(note)]
+        hibernated = [note for note in self.panel.notes if self.is_hibernated(note)]
+        return {
+            'awake_notes': len(awake),
+            'hibernated_notes': len(hibernated),
+            'awake_bytes': sum(estimate_note_bytes(note) for note in awake),
+            'placeholder_bytes': sum(note.nbytes() for note in hibernated),
+            'memory_target_bytes': self.memory_target_bytes,
+            'pixmap_cache_bytes': pixmap_cache.nbytes,
+            'hibernations': self.hibernations,
+            'wakes': self.wakes,
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'avg_wake_ms': self.total_wake_ms / self.wakes if self.wakes else 0.0,
+            'max_wake_ms': self.max_wake_ms,
+        }
@@ -0,0 +1,284 @@
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QImageReader, QPixmap
+
+# 共享图片缓存的默认内存预算
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def pixmap_nbytes(pixmap):
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+
+def file_digest(path):
+    # 按文件内容计算哈希，相同图片不论路径都共用一份解码结果
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PixmapCache:
+    # 进程内共享的图片缓存，按内存预算做LRU淘汰
+    # 键：('file', 内容哈希, 最大宽, 最大高)、('solid', 颜色, 宽, 高) 及其缩放版本 (源键, 宽, 高, 缩放方式)
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()  # 解码线程只读取键是否存在
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            pixmap = self.entries.get(key)
+            if pixmap is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return pixmap
+
+    def put(self, key, pixmap):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= pixmap_nbytes(old)
+            self.entries[key] = pixmap
+            self.nbytes += pixmap_nbytes(pixmap)
+            # 仍被便签引用的图片淘汰后不会释放，只是不再由缓存持有
+            while self.nbytes > self.budget_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= pixmap_nbytes(evicted)
+                self.evictions += 1
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        with self.lock:
+            while self.nbytes > self.budget_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= pixmap_nbytes(evicted)
+                self.evictions += 1
+
+    def release(self, source_key):
+        # 移除一张原图及其所有缩放版本，返回移出的字节数
+        with self.lock:
+            keys = [key for key in self.entries if key == source_key or key[0] == source_key]
+            released = 0
+            for key in keys:
+                released += pixmap_nbytes(self.entries.pop(key))
+            self.nbytes -= released
+            return released
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'bytes': self.nbytes,
+            'budget_bytes': self.budget_bytes,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+pixmap_cache = PixmapCache()
+
+
+# 背景图片存进数据库时预先生成的版本：适合便签最大尺寸的缩放版本，以及休眠占位窗口用的缩略图
+THUMB_VARIANT = 'thumb'
+THUMB_SIZE = 256
+
+
+def fit_variant(max_width, max_height):
+    return f'fit{max_width}x{max_height}'
+
+
+def image_reader(source):
+    # source为文件路径或图片数据（bytes）
+    if isinstance(source, str):
+        return QImageReader(source)
+    buffer = QBuffer()
+    buffer.setData(QByteArray(source))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.buffer = buffer  # 读取期间保持缓冲区存活
+    return reader
+
+
+def decode_image(source, max_width, max_height, name=None):
+    # 解码时直接缩小到最大尺寸以内，大图不会先完整解码再缩放
+    reader = image_reader(source)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and (size.width() > max_width or size.height() > max_height):
+        reader.setScaledSize(size.scaled(max_width, max_height, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        print(f"加载图片失败: {name or source}, {reader.errorString()}")
+    return image
+
+
+def encode_image(image):
+    # 有透明通道的用PNG，其余用JPEG；返回 (数据, 格式)
+    fmt = 'png' if image.hasAlphaChannel() else 'jpg'
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, fmt.upper(), -1 if fmt == 'png' else 90)
+    return bytes(data), fmt
+
+
+def store_image_file(db, path):
+    # 按内容哈希把图片文件存进数据库，返回哈希；已存在时只计算哈希
+    digest = file_digest(path)
+    if not db.has_blob(digest):
+        reader = QImageReader(path)
+        size = reader.size()
+        fmt = bytes(reader.format()).decode() or os.path.splitext(path)[1].lstrip('.').lower()
+        db.store_blob_file(digest, path, fmt, size.width(), size.height())
+    return digest
+
+
+def load_stored_image(db, digest, max_width, max_height):
+    # 优先读取预先生成的缩放版本；没有时从原图解码，并生成缩放版本和缩略图
+    data = db.read_blob(digest, fit_variant(max_width, max_height))
+    if data is not None:
+        return QImage.fromData(data)
+    data = db.read_blob(digest)
+    if data is None:
+        print(f"图片不存在: {digest}")
+        return QImage()
+    image = decode_image(data, max_width, max_height, name=digest)
+    if image.isNull():
+        return image
+    variant, fmt = encode_image(image)
+    db.store_blob(digest, fit_variant(max_width, max_height), fmt, image.width(), image.height(), variant)
+    thumb = image.scaled(THUMB_SIZE, THUMB_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                         Qt.TransformationMode.SmoothTransformation)
+    variant, fmt = encode_image(thumb)
+    db.store_blob(digest, THUMB_VARIANT, fmt, thumb.width(), thumb.height(), variant)
+    return image
+
+
+class DecodeTask(QRunnable):
+    # 有path时先把图片文件存进数据库，再按哈希读取适合便签尺寸的版本
+    def __init__(self, loader, request_id, digest, path, max_width, max_height, force):
+        super().__init__()
+        self.loader = loader
+        self.request_id = request_id
+        self.digest = digest
+        self.path = path
+        self.max_width = max_width
+        self.max_height = max_height
+        self.force = force
+
+    def run(self):
+        from database import Database
+        try:
+            db = Database()
+            digest = self.digest
+            if self.path is not None:
+                digest = store_image_file(db, self.path)
+            # 缓存中已有同样内容的解码结果时跳过解码
+            if not self.force and pixmap_cache.contains(('file', digest, self.max_width, self.max_height)):
+                self.loader.loaded.emit(self.request_id, digest, QImage(), False)
+                return
+            image = load_stored_image(db, digest, self.max_width, self.max_height)
+        except Exception as e:
+            print(f"读取图片失败: {self.path or self.digest}, {e}")
+            self.loader.loaded.emit(self.request_id, '', QImage(), True)
+            return
+        self.loader.loaded.emit(self.request_id, digest, image, True)
+
+
+class ImageLoader(QObject):
+    # 解码完成后在界面线程收到：(request_id, 内容哈希, QImage, 是否实际解码)
+    loaded = pyqtSignal(int, str, QImage, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool.globalInstance()
+        self.request_ids = itertools.count(1)
+
+    def load(self, path, max_width, max_height, force=False):
+        # 图片文件：存进数据库后加载
+        request_id = next(self.request_ids)
+        self.pool.start(DecodeTask(self, request_id, None, path, max_width, max_height, force))
+        return request_id
+
+    def load_stored(self, digest, max_width, max_height, force=False):
+        # 数据库中已有的图片
+        request_id = next(self.request_ids)
+        self.pool.start(DecodeTask(self, request_id, digest, None, max_width, max_height, force))
+        return request_id
+
+
+_image_loader = None
+
+
+def get_image_loader():
+    global _image_loader
+    if _image_loader is None:
+        _image_loader = ImageLoader()
+    return _image_loader
+
+
+class BackgroundSource:
+    # 便签背景的原图，缩放版本都放在共享缓存里，相同图片和尺寸的便签共用一份
+    def __init__(self, key, pixmap):
+        self.key = key
+        self.pixmap = pixmap
+
+    @classmethod
+    def from_pixmap(cls, pixmap):
+        key = ('pixmap', pixmap.cacheKey())
+        pixmap_cache.put(key, pixmap)
+        return cls(key, pixmap)
+
+    @classmethod
+    def solid(cls, color, size):
+        key = ('solid', QColor(color).name(QColor.NameFormat.HexArgb), size.width(), size.height())
+        pixmap = pixmap_cache.get(key)
+        if pixmap is None:
+            pixmap = QPixmap(size)
+            pixmap.fill(QColor(color))
+            pixmap_cache.put(key, pixmap)
+        return cls(key, pixmap)
+
+    def size(self):
+        return self.pixmap.size()
+
+    def scaled(self, size, mode=Qt.AspectRatioMode.KeepAspectRatio):
+        if mode is None:  # 原始大小
+            return self.pixmap
+        if size == self.pixmap.size():
+            return self.pixmap
+        key = (self.key, size.width(), size.height(), mode)
+        pixmap = pixmap_cache.get(key)
+        if pixmap is None:
+            pixmap = self.pixmap.scaled(size, mode, Qt.TransformationMode.SmoothTransformation)
+            pixmap_cache.put(key, pixmap)
+        return pixmap
+
+    def preview(self, size, mode=Qt.AspectRatioMode.KeepAspectRatio):
+        # 调整大小过程中的快速预览，不进入缓存
+        if mode is None:
+            return self.pixmap
+        return self.pixmap.scaled(size, mode, Qt.TransformationMode.FastTransformation)
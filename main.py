@@ -1,81 +1,116 @@
+import time
+# 启动计时从导入Qt之前开始
+STARTUP_T0 = time.perf_counter()
+import json
+import os
 import sys
+import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QPushButton, QTextEdit, QColorDialog, QFontDialog,
                             QHBoxLayout, QLabel, QSpinBox, QComboBox, QMessageBox,
                             QToolBar, QStyle, QMenu, QColorDialog, QFontComboBox,
                             QToolButton, QFrame, QListWidget, QListWidgetItem,
-                            QGridLayout, QFileDialog)
-from PyQt6.QtCore import Qt, QPoint, QRect, QSize, QPropertyAnimation, QEasingCurve, QEvent
-from PyQt6.QtGui import QFont, QColor, QIcon, QAction, QPalette, QPixmap, QPainter, QTextDocument
-from database import Database
+                            QGridLayout, QFileDialog, QLineEdit)
+from PyQt6.QtCore import Qt, QPoint, QRect, QRectF, QSize, QPropertyAnimation, QEasingCurve, QEvent, QTimer, pyqtSignal
+from PyQt6.QtGui import QFont, QColor, QIcon, QAction, QPalette, QPixmap, QPainter, QPen, QTextDocument
+from autosave import AutoSaver, next_autosave_key
+from drag import DragMover
+from snap import Snapper
+from font_fit import font_fit_cache, text_digest
+from image_loader import BackgroundSource, get_image_loader, pixmap_cache
+import theme
+from hibernation import HibernationManager, is_on_screen
+from note_model import GEOMETRY_FIELDS, NoteModel, model_field
+from arrange import NoteIndex, cascade_rects, pack_rects, rect_tuple, tile_rects
+from screens import screen_layout
+from profiler import PROFILE_OUT_ENV, StatsOverlay, enabled_from_env, profiler
+# database（sqlite3）、字体目录和搜索在第一次使用时才导入，见 ControlPanel
+
+STARTUP_IMPORTED = time.perf_counter()
+# 启动预算：从导入到控制面板第一帧绘制完成（毫秒）
+STARTUP_BUDGET_MS = 250
+
+
+def font_catalog():
+    # 字体目录会导入数据库模块，第一次用到时才导入
+    from font_catalog import get_font_catalog
+    return get_font_catalog()
+
+
+def set_lazy_menu(button, create_menu, lazy=True):
+    # 第一次点击时才创建菜单，之后由按钮直接弹出
+    if not lazy:
+        button.setMenu(create_menu())
+        return
+
+    def show_menu():
+        button.clicked.disconnect(show_menu)
+        button.setMenu(create_menu())
+        button.showMenu()
+    button.clicked.connect(show_menu)
+
 
 class ColorButton(QToolButton):
-    def __init__(self, parent=None):
+    # 颜色块自绘，换颜色只需重绘，不再为每个按钮解析样式表
+    def __init__(self, parent=None, color='#FFFF99'):
         super().__init__(parent)
         self.setFixedSize(20, 20)
-        self.color = QColor('#FFFF99')
-        self.setStyleSheet(f"""
-            QToolButton {{
-                background-color: {self.color.name()};
-                border: 1px solid #CCCCCC;
-                border-radius: 3px;
-            }}
-        """)
+        self.color = QColor(color)
         
     def setColor(self, color):
         self.color = color
-        self.setStyleSheet(f"""
-            QToolButton {{
-                background-color: {self.color.name()};
-                border: 1px solid #CCCCCC;
-                border-radius: 3px;
-            }}
-        """)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QColor('#666666' if self.underMouse() else '#CCCCCC'))
+        painter.setBrush(self.color)
+        painter.drawRoundedRect(QRectF(self.rect()).adjusted(0.5, 0.5, -0.5, -0.5), 3, 3)
+
+    def enterEvent(self, event):
+        self.update()
+
+    def leaveEvent(self, event):
+        self.update()
 
 class FontPreviewWidget(QWidget):
+    clicked = pyqtSignal(str)
+
     def __init__(self, font_name, parent=None):
         super().__init__(parent)
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(2, 2, 2, 2)
-        layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # 预览文本
-        preview = QLabel("你好")
-        preview.setFont(QFont(font_name, 10))
-        preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        layout.addWidget(preview)
-        
-        self.setStyleSheet("""
-            QWidget {
-                background-color: transparent;
-            }
-            QLabel {
-                color: #333333;
-            }
-        """)
+        self.font_name = font_name
+        self.hovered = False
+        # 预览文字从共享的字体图集中绘制，不再为每个字体创建QLabel
+        self.catalog = font_catalog()
+        self.setFixedSize(self.catalog.atlas.cell_width, self.catalog.atlas.cell_height)
+        self.setToolTip(font_name)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.hovered:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor('#E0E0E0'))
+            painter.drawRoundedRect(self.rect(), 3, 3)
+        page, rect = self.catalog.preview(self.font_name)
+        painter.drawImage(self.rect(), page, rect)
         
     def enterEvent(self, event):
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #E0E0E0;
-                border-radius: 3px;
-            }
-            QLabel {
-                color: #333333;
-            }
-        """)
+        self.hovered = True
+        self.update()
         
     def leaveEvent(self, event):
-        self.setStyleSheet("""
-            QWidget {
-                background-color: transparent;
-            }
-            QLabel {
-                color: #333333;
-            }
-        """)
+        self.hovered = False
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.clicked.emit(self.font_name)
 
 class FontMenu(QMenu):
+    font_selected = pyqtSignal(str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowFlags(self.windowFlags() | Qt.WindowType.Popup | Qt.WindowType.NoDropShadowWindowHint)
@@ -93,27 +128,53 @@ class FontMenu(QMenu):
         main_layout = QVBoxLayout(self)
         main_layout.setSpacing(5)
         
+        # 字体搜索框，输入时在全部字体中查找
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索字体...")
+        self.search_edit.textChanged.connect(self.update_search)
+        main_layout.addWidget(self.search_edit)
+        
+        self.result_list = QListWidget()
+        self.result_list.itemClicked.connect(lambda item: self.select_font(item.text()))
+        self.result_list.hide()
+        main_layout.addWidget(self.result_list)
+        
         # 创建字体网格
-        grid_widget = QWidget()
-        grid_layout = QGridLayout(grid_widget)
-        grid_layout.setSpacing(5)
+        self.grid_widget = QWidget()
+        self.grid_layout = QGridLayout(self.grid_widget)
+        self.grid_layout.setSpacing(5)
         
-        # 从数据库获取最近使用的字体
-        self.db = Database()
-        recent_fonts = self.db.get_recent_fonts()
+        # 最近使用的字体和预览都来自内存中的字体目录，打开菜单不访问数据库
+        self.catalog = font_catalog()
+        self.catalog_version = None
+        self.populate_grid()
+        self.catalog.ready.connect(self.on_catalog_ready)
         
-        # 合并最近使用的字体和常用字体，去重
-        self.common_fonts = ['微软雅黑', '宋体', '黑体', 'Arial', 'Times New Roman', 
-                           '楷体', '仿宋', '幼圆', '方正舒体', '华文行楷']
-        all_fonts = list(dict.fromkeys(recent_fonts + self.common_fonts))
+        # 添加字体网格到主布局
+        main_layout.addWidget(self.grid_widget)
+        
+        # 设置菜单大小
+        self.setFixedWidth(300)
+        self.setFixedHeight(300)
+
+    def populate_grid(self):
+        if self.catalog_version == self.catalog.version:
+            return
+        self.catalog_version = self.catalog.version
+        while self.grid_layout.count():
+            widget = self.grid_layout.takeAt(0).widget()
+            if widget:
+                widget.deleteLater()
         
         row = 0
         col = 0
         max_cols = 3  # 每行最多显示3个字体
         
-        for font_name in all_fonts:
+        # 合并最近使用的字体和常用字体，去重
+        for font_name in self.catalog.menu_fonts():
             font_widget = FontPreviewWidget(font_name)
-            grid_layout.addWidget(font_widget, row, col)
+            font_widget.clicked.connect(self.select_font)
+            self.grid_layout.addWidget(font_widget, row, col)
             col += 1
             if col >= max_cols:
                 col = 0
@@ -134,23 +195,38 @@ class FontMenu(QMenu):
         """)
         more_widget.setAlignment(Qt.AlignmentFlag.AlignCenter)
         more_widget.mousePressEvent = lambda event: self.show_more_fonts()
-        grid_layout.addWidget(more_widget, row, col)
-        
-        # 添加字体网格到主布局
-        main_layout.addWidget(grid_widget)
-        
-        # 设置菜单大小
-        self.setFixedWidth(300)
-        self.setFixedHeight(300)
+        self.grid_layout.addWidget(more_widget, row, col)
+
+    def on_catalog_ready(self):
+        # 未显示的菜单等下次打开时再刷新
+        if self.isVisible():
+            self.populate_grid()
+
+    def showEvent(self, event):
+        # 最近字体有变化时才重建网格
+        self.populate_grid()
+        super().showEvent(event)
         
     def show_more_fonts(self):
-        font, ok = QFontDialog.getFont(QFont(), self)
-        if ok:
-            # 保存到最近使用的字体
-            self.db.add_recent_font(font.family())
-            # 通知父窗口更新字体
-            if self.parent():
-                self.parent().handle_font_selection(font.family())
+        # 在菜单内列出全部字体，不再打开阻塞的字体对话框
+        self.search_edit.setFocus()
+        self.update_search(self.search_edit.text(), show_all=True)
+
+    def update_search(self, text, show_all=False):
+        if not text and not show_all:
+            self.result_list.hide()
+            self.grid_widget.show()
+            return
+        self.result_list.clear()
+        self.result_list.addItems(self.catalog.search(text, limit=200))
+        self.grid_widget.hide()
+        self.result_list.show()
+
+    def select_font(self, font_name):
+        # 保存到最近使用的字体，并通知使用者更新字体
+        self.catalog.add_recent_font(font_name)
+        self.font_selected.emit(font_name)
+        self.close()
 
 class FontSizeMenu(QMenu):
     def __init__(self, parent=None):
@@ -247,18 +323,7 @@ class TextColorMenu(QMenu):
         max_cols = 5
         
         for color in common_colors:
-            color_btn = QPushButton()
-            color_btn.setFixedSize(20, 20)
-            color_btn.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {color};
-                    border: 1px solid #CCCCCC;
-                    border-radius: 3px;
-                }}
-                QPushButton:hover {{
-                    border: 1px solid #666666;
-                }}
-            """)
+            color_btn = ColorButton(color=color)
             color_btn.clicked.connect(lambda checked, c=color: self.apply_color(c))
             color_layout.addWidget(color_btn, row, col)
             col += 1
@@ -281,6 +346,8 @@ class TextColorMenu(QMenu):
         if self.parent():
             self.parent().text_color_btn.setColor(QColor(color))
             self.parent().text_edit.setTextColor(QColor(color))
+            self.parent().set_colors(self.parent().background_color, QColor(color).name())
+            self.parent().mark_dirty()
         self.close()
         
     def show_color_dialog(self):
@@ -291,21 +358,77 @@ class TextColorMenu(QMenu):
         self.close()
 
 class StickyNote(QWidget):
+    # 拖拽调整大小时使用快速预览，停顿或松开后再精细缩放并适配字体
+    live_resize_enabled = True
+    resize_frame_interval = 16  # 按约60帧/秒合并几何更新（毫秒）
+    resize_settle_delay = 150  # 停顿多久视为调整结束（毫秒）
+    # 长文本在输入停顿后再适配字体；超长文本在最小字号、最大尺寸下也放不下，
+    # 进入大便签模式：不再适配字体，显示滚动条
+    deferred_fit_chars = 2000
+    fit_idle_delay = 300  # 输入停顿多久后适配字体（毫秒）
+    large_note_chars = 20000
+    # 大便签每次保存都要读取、压缩整篇内容：连续输入时暂缓自动保存，停顿这么久或失去焦点后再保存（毫秒）
+    large_note_save_delay = 3000
+
+    # 需要保存的状态都在 NoteModel 中，控件上的同名属性直接读写模型
+    note_id = model_field('note_id')
+    background_color = model_field('background_color')
+    font_color = model_field('font_color')
+    is_top_most = model_field('is_top_most')
+    background_path = model_field('background_image')
+    background_blob = model_field('background_blob')  # 数据库中背景图片的内容哈希
+
     def __init__(self, parent=None, note_id=None, background_image=None):
         super().__init__(None)
         # 初始化基本属性
-        self.note_id = note_id
+        self.model = NoteModel(note_id)
+        self.model.listen(self.on_model_changed)
+        self.autosave_key = next_autosave_key()
+        self.autosave_enabled = False  # 构造及恢复期间不触发自动保存
         self.parent_control = parent
-        self.is_top_most = False
-        self.background_image = background_image
+        self.show_text_panel = False  # 是否绘制文本区域的底色和边框
+        self.highlighted = False  # 是否为搜索结果
+        self.initial_background = background_image
+        self.background_image = None  # 当前尺寸下绘制用的背景
+        self.background_source = None  # 保留的原图及其缩放版本
+        self.background_mode = Qt.AspectRatioMode.KeepAspectRatio
+        self.background_request = None  # 正在后台解码的图片请求
         self.resize_handle_size = 10
         self.is_resizing = False
         self.resize_start_pos = None
         self.resize_start_geometry = None
         self.control_bar_visible = False
         self.top_bar_visible = False
-        self.drag_start_pos = None
+        self.drag_mover = None  # 第一次拖动时创建
         self.is_dragging = False
+        self.relocated_pos = None  # relocate移到的临时位置，移到这里不保存
+        self.font_size_menu = None  # 控制栏的菜单在第一次打开时创建
+        self.last_active = time.monotonic()  # 最近一次鼠标移入、点击或修改，用于判断是否空闲
+        self.background_resize = True  # 背景图片加载完成后是否按图片调整窗口大小
+        
+        # 实时调整大小的状态
+        self.live_resize = False
+        self.pending_geometry = None
+        self.resize_frame_timer = QTimer(self)
+        self.resize_frame_timer.setSingleShot(True)
+        self.resize_frame_timer.setInterval(self.resize_frame_interval)
+        self.resize_frame_timer.timeout.connect(self.apply_pending_geometry)
+        self.resize_settle_timer = QTimer(self)
+        self.resize_settle_timer.setSingleShot(True)
+        self.resize_settle_timer.setInterval(self.resize_settle_delay)
+        self.resize_settle_timer.timeout.connect(self.settle_live_resize)
+        
+        # 长文本的字体适配
+        self.large_note = False
+        self.fit_timer = QTimer(self)
+        self.fit_timer.setSingleShot(True)
+        self.fit_timer.setInterval(self.fit_idle_delay)
+        self.fit_timer.timeout.connect(lambda: self.adjust_font_size_to_fit())
+        self.save_deferred = False  # 自动保存器在为True时跳过这个便签
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(self.large_note_save_delay)
+        self.save_timer.timeout.connect(self.end_deferred_save)
         
         # 初始化字体相关属性
         self.min_font_size = 8  # 最小字体大小
@@ -324,7 +447,9 @@ class StickyNote(QWidget):
         self.horizontal_padding = 30  # 水平方向额外padding
         
         # 初始化UI
+        get_image_loader().loaded.connect(self.on_background_loaded)
         self.initUI()
+        self.autosave_enabled = True
 
     def initUI(self):
         # 设置窗口基本属性
@@ -344,18 +469,13 @@ class StickyNote(QWidget):
         
         # 创建文本编辑器
         self.text_edit = QTextEdit()
-        self.text_edit.setStyleSheet(f"""
-            QTextEdit {{
-                background-color: transparent;
-                border: none;
-                padding: {self.text_margin}px;
-            }}
-        """)
+        # 样式来自应用级样式表
+        self.text_edit.setObjectName('noteText')
         self.text_edit.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.text_edit.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.text_edit.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents, False)
         self.text_edit.installEventFilter(self)
-        self.text_edit.textChanged.connect(self.adjust_font_size_to_fit)
+        self.text_edit.textChanged.connect(self.on_text_changed)
         
         # 设置默认字体
         default_font = QFont('微软雅黑', self.default_font_size)
@@ -390,7 +510,7 @@ class StickyNote(QWidget):
         close_button.setText('×')
         close_button.setFixedSize(20, 20)
         close_button.setToolTip("关闭")
-        close_button.clicked.connect(self.close)
+        close_button.clicked.connect(self.discard)
         close_button.setStyleSheet("""
             QToolButton {
                 color: #666666;
@@ -522,8 +642,7 @@ class StickyNote(QWidget):
         font_btn.setFixedSize(20, 20)
         font_btn.setToolTip("选择字体")
         font_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        self.font_menu = FontMenu(self)
-        font_btn.setMenu(self.font_menu)
+        set_lazy_menu(font_btn, self.create_font_menu)
         
         # 字体大小按钮
         font_size_btn = QToolButton()
@@ -531,8 +650,7 @@ class StickyNote(QWidget):
         font_size_btn.setFixedSize(20, 20)
         font_size_btn.setToolTip("字体大小")
         font_size_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        self.font_size_menu = FontSizeMenu(self)
-        font_size_btn.setMenu(self.font_size_menu)
+        set_lazy_menu(font_size_btn, self.create_font_size_menu)
         
         # 文字颜色选择
         self.text_color_btn = ColorButton()
@@ -540,8 +658,7 @@ class StickyNote(QWidget):
         self.text_color_btn.setFixedSize(20, 20)
         self.text_color_btn.setToolTip("文字颜色")
         self.text_color_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        self.text_color_menu = TextColorMenu(self)
-        self.text_color_btn.setMenu(self.text_color_menu)
+        set_lazy_menu(self.text_color_btn, lambda: TextColorMenu(self))
         
         # 置顶按钮
         self.top_button = QToolButton()
@@ -581,46 +698,92 @@ class StickyNote(QWidget):
         # 设置窗口大小和位置
         self.resize(300, 200)
         
-        # 获取屏幕尺寸并随机放置便签
-        screen = QApplication.primaryScreen().geometry()
-        import random
-        x = random.randint(50, max(50, screen.width() - self.width() - 50))
-        y = random.randint(50, max(50, screen.height() - self.height() - 50))
-        self.move(x, y)
+        # 随机放在鼠标所在的屏幕上
+        self.move(screen_layout().random_position(self.size()))
         
         # 初始隐藏控制栏
         self.control_bar.hide()
         self.top_bar.hide()
         
         # 设置背景
-        if self.background_image:
-            self.set_background(self.background_image)
+        if self.initial_background:
+            self.set_background(self.initial_background)
         else:
             self.set_default_background()
             
     def set_default_background(self):
         # 创建默认背景
-        pixmap = QPixmap(self.size())
-        pixmap.fill(QColor('#FFFF99'))  # 默认黄色背景
-        self.set_background(pixmap)
-        
-    def set_background(self, image):
+        self.set_solid_background(QColor('#FFFF99'))  # 默认黄色背景
+
+    def set_solid_background(self, color):
+        # 纯色背景按颜色和尺寸在所有便签间共享
+        self.background_request = None
+        self.background_source = BackgroundSource.solid(color, self.size())
+        self.background_mode = Qt.AspectRatioMode.KeepAspectRatio
+        self.update_background()
+        
+    def set_background(self, image, resize=True):
         if isinstance(image, str):
-            pixmap = QPixmap(image)
+            # 图片文件在线程池中解码，解码时直接缩小到便签最大尺寸
+            self.background_path = image
+            self.background_resize = resize
+            self.background_request = get_image_loader().load(image, self.max_width, self.max_height)
+            return
+
+        if not image.isNull():
+            # 如果是默认背景或透明背景，保留原图并调整大小以适应窗口
+            self.background_request = None
+            self.background_source = BackgroundSource.from_pixmap(image)
+            self.background_mode = Qt.AspectRatioMode.KeepAspectRatio
+            self.update_background()
+
+    def set_background_blob(self, digest, resize=False):
+        # 数据库中已存的背景图片，读取预先生成的缩放版本
+        self.background_blob = digest
+        self.background_resize = resize
+        self.background_request = get_image_loader().load_stored(digest, self.max_width, self.max_height)
+
+    def on_background_loaded(self, request_id, digest, image, decoded):
+        # 只处理本便签最近一次的请求
+        if request_id != self.background_request:
+            return
+        self.background_request = None
+        key = ('file', digest, self.max_width, self.max_height)
+        if decoded:
+            if image.isNull():
+                return
+            # 同时解码同一张图片时，以先放入缓存的为准
+            pixmap = pixmap_cache.get(key)
+            if pixmap is None:
+                pixmap = QPixmap.fromImage(image)
+                pixmap_cache.put(key, pixmap)
         else:
-            pixmap = image
-            
-        if not pixmap.isNull():
-            # 保持原始比例
-            if isinstance(image, str):  # 如果是从文件加载的图片
-                # 调整窗口大小以适应图片
-                self.resize(pixmap.size())
-                self.background_image = pixmap
-            else:  # 如果是默认背景或透明背景
-                # 调整图片大小以适应窗口
-                pixmap = pixmap.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                self.background_image = pixmap
-            self.update()
+            # 相同内容的图片已解码过，直接共用
+            pixmap = pixmap_cache.get(key)
+            if pixmap is None:
+                # 期间已被淘汰，重新解码
+                self.background_request = get_image_loader().load_stored(
+                    digest, self.max_width, self.max_height, force=True
+                )
+                return
+        # 新选择的图片已存进数据库，便签改为按哈希引用
+        self.background_blob = digest
+        self.background_source = BackgroundSource(key, pixmap)
+        if self.background_resize:
+            # 调整窗口大小以适应图片
+            self.background_mode = Qt.AspectRatioMode.KeepAspectRatio
+            self.resize(pixmap.size())
+        self.update_background()
+
+    def update_background(self, transform=Qt.TransformationMode.SmoothTransformation):
+        # 始终从原图缩放，避免在已缩放的图片上反复缩放损失画质
+        if self.background_source is None:
+            return
+        if transform == Qt.TransformationMode.SmoothTransformation:
+            self.background_image = self.background_source.scaled(self.size(), self.background_mode)
+        else:
+            self.background_image = self.background_source.preview(self.size(), self.background_mode)
+        self.update()
             
     def choose_background(self):
         file_name, _ = QFileDialog.getOpenFileName(
@@ -631,39 +794,66 @@ class StickyNote(QWidget):
         )
         if file_name:
             # 创建透明背景
-            transparent_pixmap = QPixmap(self.size())
-            transparent_pixmap.fill(Qt.GlobalColor.transparent)
-            self.set_background(transparent_pixmap)
+            self.set_solid_background(QColor(Qt.GlobalColor.transparent))
             
             # 加载并设置选择的背景图片
             self.set_background(file_name)
             
-            # 更新文本编辑器的背景为透明
-            self.text_edit.setStyleSheet("""
-                QTextEdit {
-                    background-color: transparent;
-                    border: none;
-                    padding: 5px;
-                }
-            """)
+            # 有背景图片时不再绘制文本区域的底色
+            self.show_text_panel = False
+            self.update()
+
+    def set_colors(self, background_color, font_color):
+        # 底色由便签自绘，文字颜色走调色板，都不需要重新解析样式表
+        self.background_color = background_color
+        self.font_color = font_color
+        theme.set_text_color(self.text_edit, font_color)
+        self.update()
             
     def paintEvent(self, event):
+        painter = QPainter(self)
         if self.background_image:
-            painter = QPainter(self)
             # 计算居中位置
             x = (self.width() - self.background_image.width()) // 2
             y = (self.height() - self.background_image.height()) // 2
             painter.drawPixmap(x, y, self.background_image)
+        if self.show_text_panel:
+            # 文本区域的底色和边框
+            rect = QRectF(self.text_edit.geometry().translated(self.text_edit.parentWidget().pos()))
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(theme.color(theme.NOTE_BORDER_COLOR))
+            painter.setBrush(theme.color(self.background_color))
+            painter.drawRoundedRect(rect.adjusted(0.5, 0.5, -0.5, -0.5), theme.NOTE_BORDER_RADIUS, theme.NOTE_BORDER_RADIUS)
+        if self.highlighted:
+            # 搜索命中的便签加上醒目的边框
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(QPen(theme.color(theme.HIGHLIGHT_COLOR), 3))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(QRectF(self.rect()).adjusted(1.5, 1.5, -1.5, -1.5), theme.NOTE_BORDER_RADIUS, theme.NOTE_BORDER_RADIUS)
+
+    def set_highlighted(self, highlighted):
+        if self.highlighted != highlighted:
+            self.highlighted = highlighted
+            self.update()
             
     def mousePressEvent(self, event):
+        self.last_active = time.monotonic()
         if event.button() == Qt.MouseButton.LeftButton:
             # 检查是否在调整大小的区域
             if self.is_in_resize_area(event.position().toPoint()):
                 self.is_resizing = True
                 self.resize_start_pos = event.position()
                 self.resize_start_geometry = self.geometry()
+                if self.live_resize_enabled:
+                    self.begin_live_resize()
             else:
-                self.drag_start_pos = event.position()
+                if self.drag_mover is None:
+                    self.drag_mover = DragMover(self)
+                note_index = getattr(self.parent_control, 'note_index', None)
+                snapper = None
+                if note_index is not None:
+                    snapper = Snapper(note_index.grid, self.autosave_key, screen_layout())
+                self.drag_mover.begin(event.globalPosition().toPoint(), snapper)
                 self.is_dragging = True
                 # 显示控制栏
                 if not self.control_bar_visible:
@@ -675,34 +865,37 @@ class StickyNote(QWidget):
         if self.is_resizing:
             # 计算新的窗口大小
             delta = event.position() - self.resize_start_pos
-            new_geometry = self.resize_start_geometry
+            new_geometry = QRect(self.resize_start_geometry)
             new_geometry.setWidth(max(100, new_geometry.width() + int(delta.x())))
             new_geometry.setHeight(max(100, new_geometry.height() + int(delta.y())))
-            self.setGeometry(new_geometry)
-            
-            # 更新背景图片大小
-            if self.background_image:
-                self.set_background(self.background_image)
-        elif self.is_dragging and self.drag_start_pos is not None:
-            # 计算移动距离
-            delta = event.position() - self.drag_start_pos
-            new_pos = self.pos() + QPoint(int(delta.x()), int(delta.y()))
-            
-            # 获取屏幕尺寸
-            screen = QApplication.primaryScreen().geometry()
-            
-            # 确保便签不会完全移出屏幕
-            new_pos.setX(max(-self.width() + 50, min(new_pos.x(), screen.width() - 50)))
-            new_pos.setY(max(-self.height() + 50, min(new_pos.y(), screen.height() - 50)))
-            
-            self.move(new_pos)
+            if self.live_resize:
+                # 多个移动事件合并为每帧一次几何更新
+                self.pending_geometry = new_geometry
+                if not self.resize_frame_timer.isActive():
+                    self.resize_frame_timer.start()
+            else:
+                self.setGeometry(new_geometry)
+        elif self.is_dragging:
+            # 多个移动事件合并为每帧一次移动
+            self.drag_mover.move_to(event.globalPosition().toPoint())
             
     def mouseReleaseEvent(self, event):
-        self.is_dragging = False
+        if self.live_resize:
+            self.end_live_resize()
+        if self.is_dragging:
+            self.drag_mover.end()
+            self.is_dragging = False
+            self.commit_position()
         self.is_resizing = False
-        self.drag_start_pos = None
         self.resize_start_pos = None
         self.resize_start_geometry = None
+
+    def commit_position(self):
+        # 拖动过程中不记录位置，松开后一次性保存最终位置
+        if self.model.update(position_x=self.x(), position_y=self.y()) and self.autosave_enabled:
+            autosaver = getattr(self.parent_control, 'autosaver', None)
+            if autosaver is not None:
+                autosaver.flush()
         
     def is_in_resize_area(self, pos):
         # 检查是否在右下角调整大小的区域
@@ -711,10 +904,149 @@ class StickyNote(QWidget):
         
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.background_image:
-            self.set_background(self.background_image)
+        if self.live_resize:
+            # 调整过程中只做快速预览
+            self.preview_background()
+            self.resize_settle_timer.start()
+        else:
+            self.update_background()
+            self.adjust_font_size_to_fit()
+        self.model.update(size_width=self.width(), size_height=self.height())
+
+    def begin_live_resize(self):
+        self.live_resize = True
+
+    def apply_pending_geometry(self):
+        if self.pending_geometry is not None:
+            geometry = self.pending_geometry
+            self.pending_geometry = None
+            self.setGeometry(geometry)
+
+    def preview_background(self):
+        self.update_background(Qt.TransformationMode.FastTransformation)
+
+    def settle_live_resize(self):
+        # 精细缩放和字体适配只在停顿或结束时执行一次
+        self.update_background()
         self.adjust_font_size_to_fit()
-            
+
+    def end_live_resize(self):
+        self.resize_frame_timer.stop()
+        self.resize_settle_timer.stop()
+        self.apply_pending_geometry()
+        self.live_resize = False
+        self.settle_live_resize()
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        if self.is_dragging:
+            return
+        if self.pos() == self.relocated_pos:
+            # relocate的临时位置：模型跟随窗口，但不记为修改
+            self.model.load({'position_x': self.x(), 'position_y': self.y()})
+            return
+        self.relocated_pos = None
+        self.model.update(position_x=self.x(), position_y=self.y())
+
+    def relocate(self, pos):
+        # 临时移动（例如所在的显示器已断开），不保存位置，数据库中仍是原来的位置
+        # 窗口系统可能在move()返回之后才发送moveEvent，按位置识别这次移动
+        self.relocated_pos = QPoint(pos)
+        self.move(pos)
+
+    def on_text_changed(self):
+        # 字符数直接从文档读取，输入时不复制文本
+        chars = self.text_edit.document().characterCount()
+        self.set_large_note(chars > self.large_note_chars)
+        if not self.large_note:
+            if chars > self.deferred_fit_chars:
+                self.fit_timer.start()
+            else:
+                # 通过属性查找调用，开启性能统计后替换的方法同样生效
+                self.adjust_font_size_to_fit()
+        elif self.autosave_enabled:
+            self.save_deferred = True
+            self.save_timer.start()
+        # 内容保存前才从文档读取，输入时只记录修改
+        self.model.touch('content')
+
+    def end_deferred_save(self):
+        self.save_timer.stop()
+        if self.save_deferred:
+            self.save_deferred = False
+            self.mark_dirty()
+
+    def set_large_note(self, large):
+        if large == self.large_note:
+            return
+        self.large_note = large
+        self.fit_timer.stop()
+        if not large:
+            self.end_deferred_save()
+        self.text_edit.setVerticalScrollBarPolicy(
+            Qt.ScrollBarPolicy.ScrollBarAsNeeded if large else Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        if large:
+            # 与字体适配放不下文本时的结果一致：窗口放大到最大尺寸，字号不变
+            if self.width() < self.max_width or self.height() < self.max_height:
+                self.resize(max(self.width(), self.max_width), max(self.height(), self.max_height))
+
+    def on_model_changed(self, model, field):
+        if field in GEOMETRY_FIELDS:
+            note_index = getattr(self.parent_control, 'note_index', None)
+            if note_index is not None:
+                note_index.update(self)
+        self.mark_dirty()
+
+    def set_note_geometry(self, rect):
+        # 排列便签时使用，位置和大小经 moveEvent/resizeEvent 记入模型
+        self.setGeometry(rect)
+
+    def mark_dirty(self):
+        # 交给控制面板的自动保存器合并写入
+        autosaver = getattr(self.parent_control, 'autosaver', None)
+        if autosaver is not None and self.autosave_enabled:
+            self.last_active = time.monotonic()
+            autosaver.mark_dirty(self)
+
+    def sync_model(self):
+        # 字体和内容由控件持有，保存前同步到模型
+        font = self.text_edit.font()
+        self.model.set('font_family', font.family(), notify=False)
+        self.model.set('font_size', font.pointSize(), notify=False)
+        if self.model.is_dirty('content'):
+            self.model.content = self.text_edit.toPlainText()
+
+    def take_changes(self):
+        # 修改过的字段，自动保存时只写这些列
+        self.sync_model()
+        return self.model.take_changes()
+
+    def to_note_data(self):
+        self.sync_model()
+        note_data = self.model.to_note_data()
+        del note_data['id']
+        return note_data
+
+    def apply_note_data(self, note_data):
+        # 从数据库记录恢复便签状态，恢复过程不产生写入
+        self.autosave_enabled = False
+        self.model.load(note_data)
+        self.resize(note_data['size_width'], note_data['size_height'])
+        self.move(note_data['position_x'], note_data['position_y'])
+        self.text_edit.setFont(QFont(note_data['font_family'], note_data['font_size']))
+        self.text_edit.setPlainText(note_data['content'])
+        self.text_color_btn.setColor(QColor(self.font_color))
+        if note_data['is_top_most']:
+            self.top_button.setChecked(True)
+        if note_data.get('background_blob'):
+            self.set_background_blob(note_data['background_blob'])
+        elif self.background_path:
+            # 升级前只记录了路径的图片，加载时存进数据库
+            self.set_background(self.background_path, resize=False)
+        # 与数据库一致，构造过程中记录的修改作废
+        self.model.dirty = 0
+        self.autosave_enabled = True
+
     def set_alignment(self, alignment):
         self.text_edit.setAlignment(alignment)
         # 更新按钮状态
@@ -729,6 +1061,7 @@ class StickyNote(QWidget):
                 btn.setChecked(False)
         
     def enterEvent(self, event):
+        self.last_active = time.monotonic()
         if not self.control_bar_visible:
             self.show_control_bar()
         if not self.top_bar_visible:
@@ -756,19 +1089,15 @@ class StickyNote(QWidget):
         self.top_bar.hide()
         self.top_bar_visible = False
         
+    def set_text_font(self, font):
+        self.text_edit.setFont(font)
+
     def handle_font_selection(self, font_name):
-        # 保存到最近使用的字体
-        self.db = Database()
-        self.db.add_recent_font(font_name)
-        
-        # 更新字体
+        # 更新字体（最近使用的字体由字体菜单记录，菜单下次打开时自行刷新）
         current_font = self.text_edit.font()
         new_font = QFont(font_name, current_font.pointSize())
         self.text_edit.setFont(new_font)
-        
-        # 更新字体菜单
-        self.font_menu = FontMenu(self)
-        self.findChild(QToolButton).setMenu(self.font_menu)
+        self.mark_dirty()
         
     def choose_text_color(self):
         # 这个方法现在可以删除，因为已经不需要了
@@ -786,6 +1115,7 @@ class StickyNote(QWidget):
             self.is_top_most = True
             self.top_button.setChecked(True)
         self.show()
+        self.mark_dirty()
         
     def restore_window_state(self):
         # 恢复窗口状态
@@ -794,6 +1124,12 @@ class StickyNote(QWidget):
         self.top_button.setChecked(False)
         self.show()
         
+    def discard(self):
+        # 用户主动关闭便签时删除其记录；程序退出时的关闭不删除
+        if self.parent_control:
+            self.parent_control.autosaver.mark_deleted(self)
+        self.close()
+
     def closeEvent(self, event):
         if self.parent_control:
             self.parent_control.remove_note(self)
@@ -806,6 +1142,8 @@ class StickyNote(QWidget):
                 if self.is_top_most:
                     self.toggle_top_most()
                     return True  # 事件已处理
+            elif event.type() == QEvent.Type.FocusOut:
+                self.end_deferred_save()
         return super().eventFilter(obj, event)
 
     def mouseDoubleClickEvent(self, event):
@@ -815,33 +1153,33 @@ class StickyNote(QWidget):
         # 不调用super().mouseDoubleClickEvent(event)，以防止事件继续传播
 
     def scale_background(self, mode, fit_width=False):
-        if not self.background_image:
+        if not self.background_source:
             return
+        source_size = self.background_source.size()
+        # 记录缩放方式，之后的尺寸变化都按它从原图缩放
+        self.background_mode = mode
             
         if mode is None:  # 原始大小
-            self.resize(self.background_image.size())
+            self.resize(source_size)
         else:
             if fit_width:
                 # 适应宽度
                 new_width = self.width()
-                new_height = int(self.background_image.height() * (new_width / self.background_image.width()))
+                new_height = int(source_size.height() * (new_width / source_size.width()))
                 self.resize(new_width, new_height)
             else:
                 # 适应高度
                 new_height = self.height()
-                new_width = int(self.background_image.width() * (new_height / self.background_image.height()))
+                new_width = int(source_size.width() * (new_height / source_size.height()))
                 self.resize(new_width, new_height)
                 
-            # 缩放背景图片
-            scaled_pixmap = self.background_image.scaled(
-                self.size(),
-                mode,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            self.background_image = scaled_pixmap
-            self.update()
+        # 缩放背景图片
+        self.update_background()
 
     def adjust_font_size_to_fit(self):
+        if self.large_note:
+            return
+        self.fit_timer.stop()
         # 获取当前文本内容
         text = self.text_edit.toPlainText()
         if not text:
@@ -855,14 +1193,9 @@ class StickyNote(QWidget):
         available_width = self.text_edit.width() - (self.text_margin * 2 + self.horizontal_padding)
         available_height = self.text_edit.height() - (self.text_margin * 2 + self.vertical_padding)
         
-        # 创建临时QTextDocument来计算文本大小
-        doc = QTextDocument()
-        doc.setDefaultFont(current_font)
-        doc.setPlainText(text)
-        
-        # 计算文本所需的大小
-        text_width = doc.size().width()
-        text_height = doc.size().height()
+        # 计算文本所需的大小（共享缓存，相同文本和字体不重复排版）
+        digest = text_digest(text)
+        text_width, text_height = font_fit_cache.text_size(text, current_font, digest=digest)
         
         # 如果文本大小超过可用空间，尝试调整便签大小
         if text_width > available_width or text_height > available_height:
@@ -883,31 +1216,17 @@ class StickyNote(QWidget):
             self.resize(new_width, new_height)
             
             # 更新背景图片
-            if self.background_image:
-                self.set_background(self.background_image)
+            self.update_background()
             
             # 重新计算可用空间
             available_width = self.text_edit.width() - (self.text_margin * 2 + self.horizontal_padding)
             available_height = self.text_edit.height() - (self.text_margin * 2 + self.vertical_padding)
         
-        # 使用二分查找合适的字体大小
-        min_size = self.min_font_size
-        max_size = self.max_font_size
-        best_size = current_size
-        
-        while min_size <= max_size:
-            mid_size = (min_size + max_size) // 2
-            test_font = QFont(current_font)
-            test_font.setPointSize(mid_size)
-            doc.setDefaultFont(test_font)
-            doc.setPlainText(text)
-            
-            # 检查文本是否适应可用空间
-            if doc.size().width() <= available_width and doc.size().height() <= available_height:
-                best_size = mid_size
-                min_size = mid_size + 1
-            else:
-                max_size = mid_size - 1
+        # 二分查找合适的字体大小，结果按（文本、字体、可用空间）缓存
+        best_size = font_fit_cache.best_size(
+            text, current_font, available_width, available_height,
+            self.min_font_size, self.max_font_size, digest
+        ) or current_size
         
         # 如果找到的字体大小与当前不同，则更新
         if best_size != current_size:
@@ -916,22 +1235,148 @@ class StickyNote(QWidget):
             self.text_edit.setFont(new_font)
             
             # 更新字体大小菜单的显示
-            if hasattr(self, 'font_size_menu'):
+            if self.font_size_menu is not None:
                 self.font_size_menu.size_label.setText(str(best_size))
 
+    def create_font_menu(self):
+        font_menu = FontMenu(self)
+        font_menu.font_selected.connect(self.handle_font_selection)
+        return font_menu
+
+    def create_font_size_menu(self):
+        self.font_size_menu = FontSizeMenu(self)
+        self.font_size_menu.size_label.setText(str(self.text_edit.font().pointSize()))
+        return self.font_size_menu
+
     def handle_font_size_change(self, size):
         # 更新字体大小
         current_font = self.text_edit.font()
         new_font = QFont(current_font.family(), size)
         self.text_edit.setFont(new_font)
         self.adjust_font_size_to_fit()
+        self.mark_dirty()
+
+# 性能统计计时的热点方法
+profiler.register(StickyNote, ('adjust_font_size_to_fit', 'set_background', 'paintEvent',
+                               'mouseMoveEvent', 'resizeEvent'))
+profiler.register(FontMenu, ('__init__',))
+
 
 class ControlPanel(QMainWindow):
+    # 上次的便签全部恢复后发出
+    restored = pyqtSignal()
+
+    # 先显示控制面板，菜单、字体目录和数据库在第一帧之后或第一次使用时才创建
+    lazy_startup = True
+    startup_fallback_ms = 1000  # 窗口一直没有绘制时，最晚多久开始恢复便签
+    short_query_delay = 300  # 一两个字的查询在输入停顿多久后搜索（毫秒）
+
     def __init__(self):
         super().__init__()
+        self.start_time = time.perf_counter()
         self.notes = []
-        self.db = Database()
+        self._db = None
+        self._autosaver = None
+        self._searcher = None
+        self.startup_finished = False
+        self.stop_event = threading.Event()
+        self.compaction_thread = None
+        self.stats_overlay = None
+        self.save_error_box = None
+        self.profiling_action = None
+        self.startup_stats = {}
+        self.restore_stats = {}
+        # 空闲或不在屏幕内的便签换成占位窗口，恢复完成后开始定期检查
+        self.hibernation = HibernationManager(self)
+        self.relocated = {}  # autosave_key -> (原位置, 临时位置)，因显示器断开而移动的便签
+        self.note_index = NoteIndex()  # 所有便签的位置索引，用于放置新便签和排列
+        theme.install_app_stylesheet()
+        # 退出前把尚未落盘的修改写完
+        QApplication.instance().aboutToQuit.connect(self.shutdown)
         self.initUI()
+        if enabled_from_env():
+            self.set_profiling(True)
+        if not self.lazy_startup:
+            self.load_services()
+        self.startup_stats['panel_ms'] = (time.perf_counter() - self.start_time) * 1000
+        # 第一帧绘制后再恢复上次的便签
+        QTimer.singleShot(self.startup_fallback_ms, self.finish_startup)
+
+    @property
+    def db(self):
+        if self._db is None:
+            from database import Database
+            self._db = Database()
+        return self._db
+
+    @property
+    def autosaver(self):
+        if self._autosaver is None:
+            self._autosaver = AutoSaver(self.db, parent=self)
+            self._autosaver.error.connect(self.show_save_error)
+        return self._autosaver
+
+    @property
+    def searcher(self):
+        # 全文搜索在后台线程执行
+        if self._searcher is None:
+            from search import NoteSearcher
+            self._searcher = NoteSearcher(self.db, sync=self.autosaver.wait_idle, parent=self)
+            self._searcher.results_ready.connect(self.show_search_results)
+        return self._searcher
+
+    def load_services(self):
+        # 立即打开数据库、启动自动保存和搜索线程以及字体目录
+        self.autosaver
+        self.searcher
+        self.start_font_catalog()
+
+    def start_font_catalog(self):
+        # 后台枚举字体并预渲染预览
+        font_catalog().start()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.startup_finished:
+            # 本轮绘制和刷新完成后再继续启动
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        if self.startup_finished:
+            return
+        self.startup_finished = True
+        now = time.perf_counter()
+        self.startup_stats['import_ms'] = (STARTUP_IMPORTED - STARTUP_T0) * 1000
+        self.startup_stats['first_frame_ms'] = (now - STARTUP_T0) * 1000
+        self.startup_stats['within_budget'] = self.startup_stats['first_frame_ms'] <= STARTUP_BUDGET_MS
+        self.start_font_catalog()
+        self.db
+        self.startup_stats['open_db_ms'] = (time.perf_counter() - now) * 1000
+        self.restore_notes()
+
+    def startup_report(self):
+        report = dict(self.startup_stats, budget_ms=STARTUP_BUDGET_MS)
+        report.update(self.restore_stats)
+        return report
+
+    @property
+    def stopping(self):
+        return self.stop_event.is_set()
+
+    def shutdown(self):
+        profile_out = os.environ.get(PROFILE_OUT_ENV)
+        if profile_out and profiler.enabled:
+            profiler.dump(profile_out)
+        # 关闭数据库连接前等后台线程结束
+        self.hibernation.stop()
+        self.stop_event.set()
+        if self._autosaver is not None:
+            self._autosaver.stop()
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        catalog_thread = font_catalog().thread
+        if catalog_thread is not None:
+            catalog_thread.join()
         
     def initUI(self):
         self.setWindowTitle('便签控制面板')
@@ -964,61 +1409,42 @@ class ControlPanel(QMainWindow):
         font_btn = QToolButton()
         font_btn.setText('字体')
         font_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        self.font_menu = FontMenu()
-        font_btn.setMenu(self.font_menu)
+        set_lazy_menu(font_btn, self.create_font_menu, self.lazy_startup)
         toolbar.addWidget(font_btn)
         
         # 背景颜色按钮
         bg_color_btn = QToolButton()
         bg_color_btn.setText('背景')
         bg_color_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        bg_color_menu = QMenu(bg_color_btn)
-        
-        # 创建颜色网格
-        color_grid = QWidget()
-        color_layout = QGridLayout(color_grid)
-        color_layout.setSpacing(2)
-        
-        # 添加常用颜色
-        common_colors = [
-            '#FFFF99', '#FFFFFF', '#FFE4E1', '#E0FFFF', '#F0FFF0',
-            '#FFB6C1', '#87CEEB', '#98FB98', '#DDA0DD', '#F0E68C'
-        ]
-        
-        row = 0
-        col = 0
-        max_cols = 5
-        
-        for color in common_colors:
-            color_btn = QPushButton()
-            color_btn.setFixedSize(20, 20)
-            color_btn.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {color};
-                    border: 1px solid #CCCCCC;
-                    border-radius: 3px;
-                }}
-                QPushButton:hover {{
-                    border: 1px solid #666666;
-                }}
-            """)
-            color_btn.clicked.connect(lambda checked, c=color: self.apply_bg_color(c))
-            color_layout.addWidget(color_btn, row, col)
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
-        
-        # 添加更多选项
-        more_btn = QPushButton("更多...")
-        more_btn.clicked.connect(self.choose_bg_color)
-        color_layout.addWidget(more_btn, row, col)
-        
-        bg_color_menu.setLayout(QVBoxLayout())
-        bg_color_menu.layout().addWidget(color_grid)
-        bg_color_btn.setMenu(bg_color_menu)
+        set_lazy_menu(bg_color_btn, lambda: self.create_bg_color_menu(bg_color_btn), self.lazy_startup)
         toolbar.addWidget(bg_color_btn)
         
+        # 搜索框，边输入边搜索
+        toolbar.addSeparator()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索便签...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.search_notes)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.short_query_delay)
+        self.search_timer.timeout.connect(self.run_search)
+        toolbar.addWidget(self.search_edit)
+        
+        # 排列菜单：平铺、层叠、紧凑排列
+        arrange_btn = QToolButton()
+        arrange_btn.setText('排列')
+        arrange_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        set_lazy_menu(arrange_btn, lambda: self.create_arrange_menu(arrange_btn), self.lazy_startup)
+        toolbar.addWidget(arrange_btn)
+        
+        # 诊断菜单：性能统计
+        diagnostics_btn = QToolButton()
+        diagnostics_btn.setText('诊断')
+        diagnostics_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        set_lazy_menu(diagnostics_btn, lambda: self.create_diagnostics_menu(diagnostics_btn), self.lazy_startup)
+        toolbar.addWidget(diagnostics_btn)
+        
         # 设置工具栏样式
         toolbar.setStyleSheet("""
             QToolBar {
@@ -1066,72 +1492,372 @@ class ControlPanel(QMainWindow):
         screen = QApplication.primaryScreen().geometry()
         self.move((screen.width() - self.width()) // 2, 0)
         
+    def create_font_menu(self):
+        font_menu = FontMenu()
+        font_menu.font_selected.connect(self.apply_font)
+        return font_menu
+
+    def create_bg_color_menu(self, bg_color_btn):
+        bg_color_menu = QMenu(bg_color_btn)
+        
+        # 创建颜色网格
+        color_grid = QWidget()
+        color_layout = QGridLayout(color_grid)
+        color_layout.setSpacing(2)
+        
+        # 添加常用颜色
+        common_colors = [
+            '#FFFF99', '#FFFFFF', '#FFE4E1', '#E0FFFF', '#F0FFF0',
+            '#FFB6C1', '#87CEEB', '#98FB98', '#DDA0DD', '#F0E68C'
+        ]
+        
+        row = 0
+        col = 0
+        max_cols = 5
+        
+        for color in common_colors:
+            color_btn = ColorButton(color=color)
+            color_btn.clicked.connect(lambda checked, c=color: self.apply_bg_color(c))
+            color_layout.addWidget(color_btn, row, col)
+            col += 1
+            if col >= max_cols:
+                col = 0
+                row += 1
+        
+        # 添加更多选项
+        more_btn = QPushButton("更多...")
+        more_btn.clicked.connect(self.choose_bg_color)
+        color_layout.addWidget(more_btn, row, col)
+        
+        bg_color_menu.setLayout(QVBoxLayout())
+        bg_color_menu.layout().addWidget(color_grid)
+        return bg_color_menu
+        
+    def create_arrange_menu(self, arrange_btn):
+        menu = QMenu(arrange_btn)
+        menu.addAction('平铺').triggered.connect(lambda: self.arrange_notes('tile'))
+        menu.addAction('层叠').triggered.connect(lambda: self.arrange_notes('cascade'))
+        menu.addAction('紧凑排列').triggered.connect(lambda: self.arrange_notes('pack'))
+        return menu
+
+    def arrange_notes(self, mode):
+        # 按便签所在的屏幕分组，在各屏幕的可用区域内排列；平铺会调整大小，层叠和紧凑排列保持大小
+        layout = screen_layout()
+        groups = {}
+        for note in self.notes:
+            info = layout.screen_for(note.geometry())
+            if info is not None:
+                groups.setdefault(id(info), (info, []))[1].append(note)
+        for info, notes in groups.values():
+            bounds = rect_tuple(info.available)
+            notes.sort(key=lambda note: (note.y(), note.x()))
+            sizes = [(note.width(), note.height()) for note in notes]
+            if mode == 'tile':
+                rects = tile_rects(len(notes), bounds)
+            elif mode == 'cascade':
+                rects = cascade_rects(sizes, bounds)
+            else:
+                rects = pack_rects(sizes, bounds)
+            for note, rect in zip(notes, rects):
+                note.set_note_geometry(QRect(*rect))
+        print(f"便签已排列: {len(self.notes)}个")
+
+    def create_diagnostics_menu(self, diagnostics_btn):
+        menu = QMenu(diagnostics_btn)
+        self.profiling_action = menu.addAction('性能统计')
+        self.profiling_action.setCheckable(True)
+        self.profiling_action.setChecked(profiler.enabled)
+        self.profiling_action.toggled.connect(self.set_profiling)
+        menu.addAction('导出统计...').triggered.connect(self.export_profile)
+        menu.addAction('清空统计').triggered.connect(profiler.reset)
+        menu.addSeparator()
+        menu.addAction('休眠空闲便签').triggered.connect(lambda: self.hibernation.check(idle_seconds=0))
+        menu.addAction('内存报告').triggered.connect(self.show_memory_report)
+        menu.addAction('存储报告').triggered.connect(self.show_storage_report)
+        return menu
+
+    def show_memory_report(self):
+        stats = self.hibernation.stats()
+        mb = 1024 * 1024
+        QMessageBox.information(self, "内存报告", "\n".join([
+            f"活动便签: {stats['awake_notes']}个, 约{stats['awake_bytes'] / mb:.1f}MB",
+            f"休眠便签: {stats['hibernated_notes']}个, 约{stats['placeholder_bytes'] / mb:.1f}MB",
+            f"内存目标: {stats['memory_target_bytes'] / mb:.0f}MB",
+            f"图片缓存: {stats['pixmap_cache_bytes'] / mb:.1f}MB",
+            f"累计休眠 {stats['hibernations']}次, 回收约{stats['reclaimed_bytes'] / mb:.1f}MB",
+            f"唤醒 {stats['wakes']}次, 平均{stats['avg_wake_ms']:.1f}ms, 最长{stats['max_wake_ms']:.1f}ms",
+        ]))
+
+    def show_save_error(self, message):
+        # 不阻塞界面；连续失败时只更新同一个提示框
+        if self.save_error_box is None:
+            self.save_error_box = QMessageBox(QMessageBox.Icon.Warning, "自动保存失败", "", parent=self)
+            self.save_error_box.setModal(False)
+        self.save_error_box.setText(f"便签的修改没有写入数据库，稍后会自动重试。\n{message}")
+        self.save_error_box.show()
+
+    def show_storage_report(self):
+        content = self.db.content_stats()
+        revision = self.db.revision_stats()
+        blob = self.db.blob_stats()
+        hot, cold = content['hot'], content['cold']
+        mb = 1024 * 1024
+        QMessageBox.information(self, "存储报告", "\n".join([
+            f"数据库文件: {content['file_bytes'] / mb:.1f}MB, 其中空闲{content['free_bytes'] / mb:.1f}MB",
+            f"热数据: {hot['notes']}个便签, {hot['bytes'] / mb:.1f}MB"
+            f"（压缩 {hot['compressed_notes']}个, {hot['compressed_bytes'] / mb:.1f}MB）",
+            f"冷数据: {cold['notes']}个便签, {cold['bytes'] / mb:.1f}MB, 预览{cold['preview_chars']}字",
+            f"历史版本: {revision['revisions']}个, {revision['bytes'] / mb:.1f}MB",
+            f"背景图片: {blob['images']}张, {blob['bytes'] / mb:.1f}MB",
+        ]))
+
+    def set_profiling(self, enabled):
+        # 开启时替换热点方法为计时版本并显示统计面板，关闭时恢复原方法
+        if enabled:
+            from database import Database, PROFILED_METHODS
+            profiler.register(Database, PROFILED_METHODS)
+            profiler.enable()
+            if self.stats_overlay is None:
+                self.stats_overlay = StatsOverlay()
+            self.stats_overlay.show()
+        else:
+            profiler.disable()
+            if self.stats_overlay is not None:
+                self.stats_overlay.hide()
+        if self.profiling_action is not None and self.profiling_action.isChecked() != enabled:
+            self.profiling_action.setChecked(enabled)
+
+    def export_profile(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出性能统计", "profile.json", "JSON (*.json)")
+        if file_name:
+            try:
+                profiler.dump(file_name)
+            except OSError as e:
+                QMessageBox.warning(self, "导出失败", str(e))
+
     def create_new_note(self):
         try:
             note = StickyNote(self)
+            note.background_color = self.current_bg_color
+            note.font_color = self.current_text_color
             note.text_edit.setFont(self.current_font)
-            note.text_edit.setStyleSheet(f"""
-                QTextEdit {{
-                    background-color: {self.current_bg_color};
-                    color: {self.current_text_color};
-                    border: 1px solid #CCCCCC;
-                    border-radius: 5px;
-                    padding: 5px;
-                }}
-            """)
+            self.apply_note_style(note)
+            # 放在鼠标所在屏幕上第一个空位，没有空位时保留随机位置
+            info = screen_layout().screen_under_cursor()
+            if info is not None:
+                pos = self.note_index.free_position(rect_tuple(info.available), (note.width(), note.height()))
+                if pos is not None:
+                    note.move(*pos)
             note.show()
             note.raise_()
             note.activateWindow()
             self.notes.append(note)
+            self.note_index.add(note)
+            note.mark_dirty()
             print(f"便签已创建: {len(self.notes)}个")
         except Exception as e:
             print(f"创建便签时出错: {str(e)}")
             
+    def restore_notes(self, batch_size=4):
+        # 置顶及屏幕内的便签优先，其余便签每轮事件循环创建几个
+        screen = screen_layout().virtual_geometry()
+        self.restore_iter = self.db.iter_notes((screen.x(), screen.y(), screen.width(), screen.height()))
+        self.restore_stats = {'restored': 0, 'first_note_ms': None, 'all_notes_ms': None}
+        self.restore_batch_size = batch_size
+        self.restore_next_batch()
+
+    def restore_next_batch(self):
+        for _ in range(self.restore_batch_size):
+            note_data = next(self.restore_iter, None)
+            if note_data is None:
+                self.finish_restore()
+                return
+            try:
+                rect = QRect(note_data['position_x'], note_data['position_y'],
+                             note_data['size_width'], note_data['size_height'])
+                if note_data['content'] is None:
+                    # 内容在冷表中的便签以休眠状态恢复，显示预览，唤醒时再读取内容
+                    note = self.hibernation.placeholder_for(note_data)
+                    if is_on_screen(rect):
+                        note.show()
+                elif is_on_screen(rect):
+                    note = self.build_note(note_data)
+                else:
+                    # 不在任何屏幕内的便签直接以休眠状态恢复，恢复完成后统一移到屏幕上
+                    note = self.hibernation.placeholder_for(note_data)
+                self.notes.append(note)
+                self.note_index.add(note)
+            except Exception as e:
+                print(f"恢复便签时出错: {str(e)}")
+                continue
+            self.restore_stats['restored'] += 1
+            if self.restore_stats['first_note_ms'] is None:
+                self.restore_stats['first_note_ms'] = (time.perf_counter() - self.start_time) * 1000
+        QTimer.singleShot(0, self.restore_next_batch)
+
+    def build_note(self, note_data, autosave_key=None):
+        # 按数据库记录创建并显示便签，显示过程不触发自动保存
+        note = StickyNote(self)
+        if autosave_key is not None:
+            note.autosave_key = autosave_key
+        note.apply_note_data(note_data)
+        self.apply_note_style(note)
+        # 导入的便签只有数据库中的图片，没有路径
+        if note.background_blob is not None or note.background_path is not None:
+            note.show_text_panel = False
+        note.autosave_enabled = False
+        note.show()
+        note.autosave_enabled = True
+        return note
+
+    def finish_restore(self):
+        self.restore_iter = None
+        self.restore_stats['all_notes_ms'] = (time.perf_counter() - self.start_time) * 1000
+        first_ms = self.restore_stats['first_note_ms']
+        if first_ms is not None:
+            print(f"便签已恢复: {self.restore_stats['restored']}个, "
+                  f"首个便签 {first_ms:.0f}ms, 全部 {self.restore_stats['all_notes_ms']:.0f}ms")
+        # 恢复完成后在后台整理过期的历史版本
+        self.compaction_thread = threading.Thread(target=self.compact_history, name='revision-compaction', daemon=True)
+        self.compaction_thread.start()
+        self.arrange_for_screens()
+        screen_layout().changed.connect(self.arrange_for_screens)
+        self.hibernation.start()
+        self.restored.emit()
+
+    def arrange_for_screens(self):
+        # 不在任何屏幕内的便签一次性移到最近的屏幕上，同一屏幕上的依次错开；
+        # 临时位置不保存，原来的显示器重新接入后移回原处
+        layout = screen_layout()
+        placed = {}  # 目标屏幕 -> 已移入的便签数
+        moved = 0
+        for note in self.notes:
+            key = note.autosave_key
+            if key in self.relocated:
+                original, relocated = self.relocated[key]
+                if note.pos() != relocated:
+                    # 用户已经移动过，以新位置为准
+                    del self.relocated[key]
+                elif layout.is_on_screen(QRect(original, note.size())):
+                    note.relocate(original)
+                    self.note_index.update(note)
+                    del self.relocated[key]
+                    moved += 1
+                    continue
+            rect = note.geometry()
+            if layout.is_on_screen(rect):
+                continue
+            info = layout.screen_for(rect)
+            index = placed.get(id(info), 0)
+            placed[id(info)] = index + 1
+            pos = layout.fit_position(rect, info, index)
+            original = self.relocated[key][0] if key in self.relocated else rect.topLeft()
+            note.relocate(pos)
+            self.note_index.update(note)
+            self.relocated[key] = (original, pos)
+            moved += 1
+        if moved:
+            print(f"屏幕布局变化: 移动了{moved}个便签")
+        return moved
+
+    def compact_history(self):
+        # 每轮只占用很短的时间，轮次之间让出数据库给自动保存
+        try:
+            while not self.stopping:
+                stats = self.db.compact_revisions()
+                if stats['notes']:
+                    print(f"历史版本整理: {stats['notes']}个便签, 删除{stats['deleted']}个版本, 耗时{stats['ms']:.0f}ms")
+                if stats['done']:
+                    break
+                self.stop_event.wait(0.5)
+            while not self.stopping:
+                stats = self.db.freeze_cold_notes()
+                if stats['notes']:
+                    print(f"冷存储: 移入{stats['notes']}个长期未修改的便签, {stats['bytes'] / 1024:.0f}KB, "
+                          f"耗时{stats['ms']:.0f}ms")
+                if stats['done']:
+                    break
+                self.stop_event.wait(0.5)
+            if not self.stopping:
+                stats = self.db.collect_blobs()
+                if stats['blobs']:
+                    print(f"背景图片整理: 删除{stats['blobs']}张不再使用的图片, {stats['bytes'] / 1024:.0f}KB")
+        except Exception as e:
+            print(f"整理历史版本失败: {e}")
+
+    def search_notes(self, text):
+        self.search_timer.stop()
+        if not text.strip():
+            for note in self.notes:
+                note.set_highlighted(False)
+            return
+        if len(text.strip()) < 3:
+            # 一两个字的查询要扫描全部内容，输入停顿后再搜索
+            self.search_timer.start()
+        else:
+            self.run_search()
+
+    def run_search(self):
+        # 先提交还没保存的修改，搜索线程等写入完成后再查询，新便签和刚改过的内容也能搜到
+        self.autosaver.flush()
+        self.searcher.search(self.search_edit.text())
+
+    def show_search_results(self, query, note_ids, elapsed_ms):
+        # 丢弃输入过程中已过期的结果
+        if query != self.search_edit.text():
+            return
+        ranks = {note_id: rank for rank, note_id in enumerate(note_ids)}
+        matched = []
+        for note in self.notes:
+            is_match = note.note_id in ranks
+            note.set_highlighted(is_match)
+            if is_match:
+                matched.append(note)
+        # 相关度最高的便签放在最上层
+        matched.sort(key=lambda note: ranks[note.note_id], reverse=True)
+        for note in matched:
+            note.raise_()
+
     def remove_note(self, note):
         if note in self.notes:
             self.notes.remove(note)
+            self.note_index.remove(note)
             print(f"便签已删除，剩余: {len(self.notes)}个")
             
     def apply_font(self, font_name):
         font = QFont(font_name)
         self.current_font = font
         for note in self.notes:
-            note.text_edit.setFont(font)
+            note.set_text_font(font)
+            note.mark_dirty()
             
     def choose_font(self):
         font, ok = QFontDialog.getFont(self.current_font, self)
         if ok:
             self.current_font = font
             for note in self.notes:
-                note.text_edit.setFont(font)
+                note.set_text_font(font)
+                note.mark_dirty()
                 
     def apply_bg_color(self, color):
         self.current_bg_color = color
         for note in self.notes:
-            note.text_edit.setStyleSheet(f"""
-                QTextEdit {{
-                    background-color: {color};
-                    color: {self.current_text_color};
-                    border: 1px solid #CCCCCC;
-                    border-radius: 5px;
-                    padding: 5px;
-                }}
-            """)
+            note.background_color = color
+            self.apply_note_style(note)
+            note.mark_dirty()
             
     def choose_bg_color(self):
         color = QColorDialog.getColor(QColor(self.current_bg_color))
         if color.isValid():
             self.current_bg_color = color.name()
             for note in self.notes:
-                note.text_edit.setStyleSheet(f"""
-                    QTextEdit {{
-                        background-color: {self.current_bg_color};
-                        color: {self.current_text_color};
-                        border: 1px solid #CCCCCC;
-                        border-radius: 5px;
-                        padding: 5px;
-                    }}
-                """)
+                note.background_color = self.current_bg_color
+                self.apply_note_style(note)
+                note.mark_dirty()
+
+    def apply_note_style(self, note):
+        note.show_text_panel = True
+        note.set_colors(note.background_color, note.font_color)
 
     def create_color_icon(self, color):
         pixmap = QPixmap(16, 16)
@@ -1147,14 +1873,41 @@ class ControlPanel(QMainWindow):
         # 强制退出应用程序
         QApplication.quit()
 
+def print_startup_report(control_panel):
+    # 机器可读的启动报告，一行JSON；超出预算时在标准错误输出警告
+    report = control_panel.startup_report()
+    print(json.dumps(report, ensure_ascii=False), flush=True)
+    if not report.get('within_budget', True):
+        print(f"启动超出预算: 第一帧 {report['first_frame_ms']:.0f}ms > {STARTUP_BUDGET_MS}ms", file=sys.stderr)
+
+
 def main():
+    # --startup-report（或环境变量 NOTE_STARTUP_REPORT=1）：便签恢复完成后输出启动报告
+    # --quit-after-startup：输出报告后退出，用于基准测试
+    report_startup = '--startup-report' in sys.argv or os.environ.get('NOTE_STARTUP_REPORT') == '1'
+    quit_after_startup = '--quit-after-startup' in sys.argv
     app = QApplication(sys.argv)
     
+    # --eager-startup：构造时就创建全部菜单并打开数据库（旧的启动方式，用于对比）
+    if '--eager-startup' in sys.argv:
+        ControlPanel.lazy_startup = False
+    
     # 创建控制面板实例
     control_panel = ControlPanel()
     control_panel.show()
+    if report_startup or quit_after_startup:
+        def on_restored():
+            if report_startup:
+                print_startup_report(control_panel)
+            if quit_after_startup:
+                app.quit()
+        control_panel.restored.connect(on_restored)
     
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    # 退出前关闭共享的数据库连接
+    from database import close_connections
+    close_connections()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
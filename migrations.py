@@ -0,0 +1,346 @@
+import sqlite3
+import time
+import revisions
+
+# 当前数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 8
+
+NOTE_COLUMNS = (
+    'content', 'position_x', 'position_y', 'size_width', 'size_height',
+    'created_at', 'updated_at', 'is_top_most', 'is_bottom_most',
+    'background_color', 'font_family', 'font_size', 'font_color',
+)
+
+# 旧版表结构中的列名 -> 新列名
+LEGACY_COLUMNS = {
+    'font': 'font_family',
+    'bg_color': 'background_color',
+    'text_color': 'font_color',
+}
+
+# 旧数据缺少的列使用的默认值（SQL表达式）
+COLUMN_DEFAULTS = {
+    'content': "''",
+    'position_x': '50',
+    'position_y': '50',
+    'size_width': '300',
+    'size_height': '200',
+    'created_at': 'CURRENT_TIMESTAMP',
+    'updated_at': 'CURRENT_TIMESTAMP',
+    'is_top_most': '0',
+    'is_bottom_most': '0',
+    'background_color': "'#FFFF99'",
+    'font_family': "'Arial'",
+    'font_size': '12',
+    'font_color': "'#000000'",
+}
+
+
+def _migrate_v1(cursor):
+    # 统一两套便签表结构，旧版数据原地迁移
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(notes)')]
+    if columns and not all(column in columns for column in NOTE_COLUMNS):
+        cursor.execute('ALTER TABLE notes RENAME TO notes_legacy')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT,
+            position_x INTEGER,
+            position_y INTEGER,
+            size_width INTEGER,
+            size_height INTEGER,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            is_top_most BOOLEAN,
+            is_bottom_most BOOLEAN,
+            background_color TEXT,
+            font_family TEXT,
+            font_size INTEGER,
+            font_color TEXT
+        )
+    ''')
+
+    if columns and not all(column in columns for column in NOTE_COLUMNS):
+        sources = {LEGACY_COLUMNS.get(column, column): column for column in columns}
+        if 'created_at' in columns:
+            sources.setdefault('updated_at', 'created_at')
+        select = []
+        for column in NOTE_COLUMNS:
+            if column in sources:
+                select.append(f"COALESCE({sources[column]}, {COLUMN_DEFAULTS[column]})")
+            else:
+                select.append(COLUMN_DEFAULTS[column])
+        cursor.execute(f'''
+            INSERT INTO notes (id, {", ".join(NOTE_COLUMNS)})
+            SELECT id, {", ".join(select)} FROM notes_legacy
+        ''')
+        cursor.execute('DROP TABLE notes_legacy')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recent_fonts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            font_name TEXT UNIQUE,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migrate_v2(cursor):
+    # 恢复便签时置顶的优先，列表按修改时间排序
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_restore ON notes (is_top_most, updated_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recent_fonts_last_used ON recent_fonts (last_used)')
+
+
+def _migrate_v3(cursor):
+    # 便签内容的全文索引；trigram分词按字符切分，适用于中文
+    # 旧版SQLite不支持trigram时跳过，搜索退回到LIKE扫描
+    cursor.execute('SAVEPOINT fts')
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                content, content='notes', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        cursor.execute('ROLLBACK TO fts')
+        cursor.execute('RELEASE fts')
+        print(f"当前SQLite不支持trigram全文索引，搜索将使用普通查询: {e}")
+        return
+    cursor.execute('RELEASE fts')
+
+    # 触发器保持索引与notes表同步
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF content ON notes
+        WHEN old.content IS NOT new.content BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+
+def _migrate_v4(cursor):
+    # 便签内容的历史版本：每个版本是对上一版本的差量，定期保存完整快照
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_revisions (
+            note_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (note_id, revision)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS note_revisions_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM note_revisions WHERE note_id = old.id;
+        END
+    ''')
+
+
+def _migrate_v5(cursor):
+    # 便签的背景图片路径，导出时按内容去重打包
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(notes)')]
+    if 'background_image' not in columns:
+        cursor.execute('ALTER TABLE notes ADD COLUMN background_image TEXT')
+
+
+def _migrate_v6(cursor):
+    # 背景图片存进数据库：按内容哈希存放原图及缩放版本，便签只引用哈希
+    # blobs 使用rowid表，大图片可以用增量blob I/O分块读写
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            id INTEGER PRIMARY KEY,
+            digest TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            format TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            UNIQUE (digest, variant)
+        )
+    ''')
+    # 引用计数由触发器随notes表维护，计数归零一段时间后的图片在整理时删除
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blob_refs (
+            digest TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(notes)')]
+    if 'background_blob' not in columns:
+        cursor.execute('ALTER TABLE notes ADD COLUMN background_blob TEXT')
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notes_blob_insert AFTER INSERT ON notes
+        WHEN new.background_blob IS NOT NULL BEGIN
+            INSERT INTO blob_refs (digest, refcount, updated_at) VALUES (new.background_blob, 1, {now})
+            ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1, updated_at = {now};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notes_blob_delete AFTER DELETE ON notes
+        WHEN old.background_blob IS NOT NULL BEGIN
+            UPDATE blob_refs SET refcount = refcount - 1, updated_at = {now} WHERE digest = old.background_blob;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notes_blob_update AFTER UPDATE OF background_blob ON notes
+        WHEN old.background_blob IS NOT new.background_blob BEGIN
+            UPDATE blob_refs SET refcount = refcount - 1, updated_at = {now} WHERE digest = old.background_blob;
+            INSERT INTO blob_refs (digest, refcount, updated_at)
+            SELECT new.background_blob, 1, {now} WHERE new.background_blob IS NOT NULL
+            ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1, updated_at = {now};
+        END
+    ''')
+
+
+def _migrate_v7(cursor):
+    # 较长的内容压缩保存；长期未修改的便签内容移到冷表，notes表只留一段预览，
+    # 恢复便签和按位置查询时不读取冷表
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(notes)')]
+    if 'preview' not in columns:
+        cursor.execute('ALTER TABLE notes ADD COLUMN preview TEXT')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cold_contents (
+            note_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cold_contents_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM cold_contents WHERE note_id = old.id;
+        END
+    ''')
+    # content为NULL表示内容在冷表中
+    cursor.execute("UPDATE notes SET content = '' WHERE content IS NULL")
+
+    # 全文索引不能再直接读取notes表中压缩过的内容：改为无内容的索引，由触发器通过note_text()写入原文
+    has_fts = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+    ).fetchone() is not None
+    if has_fts:
+        for trigger in ('notes_fts_insert', 'notes_fts_delete', 'notes_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute('DROP TABLE notes_fts')
+
+    note_ids = [row[0] for row in cursor.execute(
+        'SELECT id FROM notes WHERE length(content) >= ?', (revisions.CONTENT_COMPRESS_CHARS,))]
+    for note_id in note_ids:
+        content = cursor.execute('SELECT content FROM notes WHERE id = ?', (note_id,)).fetchone()[0]
+        cursor.execute('UPDATE notes SET content = ? WHERE id = ?', (revisions.pack_content(content), note_id))
+
+    if not has_fts:
+        return
+    cursor.execute('''
+        CREATE VIRTUAL TABLE notes_fts USING fts5(content, content='', tokenize='trigram')
+    ''')
+    cursor.execute('INSERT INTO notes_fts (rowid, content) SELECT id, note_text(content) FROM notes')
+    # 删除时索引需要原文：归档的便签从冷表读取（冷表的记录在AFTER触发器中才删除）
+    old_text = 'note_text(COALESCE(old.content, (SELECT data FROM cold_contents WHERE note_id = old.id)))'
+    cursor.execute('''
+        CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, note_text(new.content));
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER notes_fts_delete BEFORE DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, {old_text});
+        END
+    ''')
+    # 移到冷表时（新内容为NULL）索引不变，归档的便签仍然可以搜索
+    cursor.execute(f'''
+        CREATE TRIGGER notes_fts_update AFTER UPDATE OF content ON notes
+        WHEN old.content IS NOT new.content AND new.content IS NOT NULL BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, {old_text});
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, note_text(new.content));
+        END
+    ''')
+
+
+def _migrate_v8(cursor):
+    # 全文索引只收录内容的前revisions.FTS_INDEX_CHARS个字（note_index_text()），
+    # 修改大便签时不再在数据库锁内重建整篇的trigram索引；超出的部分搜索时用LIKE补查
+    has_fts = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+    ).fetchone() is not None
+    if not has_fts:
+        return
+    for trigger in ('notes_fts_insert', 'notes_fts_delete', 'notes_fts_update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('delete-all')")
+    cursor.execute('''
+        INSERT INTO notes_fts (rowid, content)
+        SELECT id, note_index_text(COALESCE(content, (SELECT data FROM cold_contents WHERE note_id = notes.id)))
+        FROM notes
+    ''')
+    old_text = 'note_index_text(COALESCE(old.content, (SELECT data FROM cold_contents WHERE note_id = old.id)))'
+    cursor.execute('''
+        CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, note_index_text(new.content));
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER notes_fts_delete BEFORE DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, {old_text});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER notes_fts_update AFTER UPDATE OF content ON notes
+        WHEN old.content IS NOT new.content AND new.content IS NOT NULL BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, {old_text});
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, note_index_text(new.content));
+        END
+    ''')
+
+
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+    (8, _migrate_v8),
+)
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    # 已是最新版本时直接返回，启动时不执行任何DDL
+    version = get_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    # 所有升级步骤放在同一个事务里，失败时整体回滚
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for target, step in MIGRATIONS:
+            if version < target:
+                step(cursor)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"数据库已从版本{version}升级到{SCHEMA_VERSION}，耗时{(time.perf_counter() - start) * 1000:.1f}ms")
+    return SCHEMA_VERSION
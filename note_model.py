@@ -0,0 +1,111 @@
+# 便签的持久化状态，与界面控件分开；记录哪些字段改过，保存时只写这些列
+
+NOTE_MODEL_FIELDS = (
+    'content', 'position_x', 'position_y', 'size_width', 'size_height', 'is_top_most',
+    'background_color', 'font_family', 'font_size', 'font_color', 'background_image', 'background_blob',
+)
+# 位置和大小，变化时同时更新便签的位置索引
+GEOMETRY_FIELDS = frozenset(('position_x', 'position_y', 'size_width', 'size_height'))
+# 每个字段在脏标记中占一位
+FIELD_BITS = {name: 1 << index for index, name in enumerate(NOTE_MODEL_FIELDS)}
+
+NOTE_MODEL_DEFAULTS = {
+    'content': '',
+    'position_x': 50,
+    'position_y': 50,
+    'size_width': 300,
+    'size_height': 200,
+    'is_top_most': False,
+    'background_color': '#FFFF99',
+    'font_family': 'Arial',
+    'font_size': 12,
+    'font_color': '#000000',
+    'background_image': None,
+    'background_blob': None,
+}
+
+
+class NoteModel:
+    # 十几万个便签也只占很少内存：固定槽位，脏标记用一个整数，没有监听者时不分配列表
+    __slots__ = ('note_id',) + NOTE_MODEL_FIELDS + ('dirty', 'listeners')
+
+    def __init__(self, note_id=None, **values):
+        self.note_id = note_id
+        for name in NOTE_MODEL_FIELDS:
+            setattr(self, name, values.get(name, NOTE_MODEL_DEFAULTS[name]))
+        self.dirty = 0
+        self.listeners = None
+
+    @classmethod
+    def from_note_data(cls, note_data):
+        model = cls()
+        model.load(note_data)
+        return model
+
+    def load(self, note_data):
+        # 从数据库记录或便签数据读取，不产生修改记录和通知
+        if 'id' in note_data:
+            self.note_id = note_data['id']
+        for name in NOTE_MODEL_FIELDS:
+            if name in note_data:
+                setattr(self, name, note_data[name])
+
+    def set(self, name, value, notify=True):
+        # 值不同时才记为修改并通知，返回是否修改
+        if getattr(self, name) == value:
+            return False
+        setattr(self, name, value)
+        bit = FIELD_BITS.get(name)
+        if bit is not None:
+            self.dirty |= bit
+            if notify:
+                self.notify(name)
+        return True
+
+    def update(self, **values):
+        return [name for name, value in values.items() if self.set(name, value)]
+
+    def touch(self, name):
+        # 值由控件持有、读取开销较大的字段（内容），只记录修改，保存前再读取
+        self.dirty |= FIELD_BITS[name]
+        self.notify(name)
+
+    def is_dirty(self, name=None):
+        if name is None:
+            return self.dirty != 0
+        return bool(self.dirty & FIELD_BITS[name])
+
+    def dirty_fields(self):
+        return tuple(name for name in NOTE_MODEL_FIELDS if self.dirty & FIELD_BITS[name])
+
+    def take_changes(self):
+        # 返回修改过的字段并清除修改记录
+        changes = {name: getattr(self, name) for name in self.dirty_fields()}
+        self.dirty = 0
+        return changes
+
+    def to_note_data(self):
+        note_data = {name: getattr(self, name) for name in NOTE_MODEL_FIELDS}
+        note_data['id'] = self.note_id
+        return note_data
+
+    def listen(self, callback):
+        # callback(model, 字段名)
+        if self.listeners is None:
+            self.listeners = []
+        self.listeners.append(callback)
+
+    def unlisten(self, callback):
+        if self.listeners and callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, name):
+        if self.listeners:
+            for callback in tuple(self.listeners):
+                callback(self, name)
+
+
+def model_field(name):
+    # 控件上的同名属性直接读写模型，修改时由模型记录并通知
+    return property(lambda self: getattr(self.model, name),
+                    lambda self, value: self.model.set(name, value))
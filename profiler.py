@@ -0,0 +1,192 @@
+import functools
+import json
+import os
+import threading
+import time
+from PyQt6.QtCore import QPoint, QRectF, Qt, QTimer
+from PyQt6.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PyQt6.QtWidgets import QApplication, QWidget
+
+# 环境变量 NOTE_PROFILE=1 时启动即开启统计，NOTE_PROFILE_OUT 指定退出时导出的JSON文件
+PROFILE_ENV = 'NOTE_PROFILE'
+PROFILE_OUT_ENV = 'NOTE_PROFILE_OUT'
+
+# 延迟直方图按2的幂分桶（微秒）：第i个桶统计 [2^(i-1), 2^i) 微秒的调用
+HISTOGRAM_BUCKETS = 25
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        index = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.buckets[index] += 1
+
+    def percentile(self, q):
+        # 返回所在桶的上界（毫秒），不超过实际最大值
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min((1 << index) / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'avg_ms': self.total * 1000 / self.count if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            # 桶上界（微秒） -> 调用次数
+            'histogram_us': {1 << index: count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class Profiler:
+    # 热点方法计时。关闭时类上是原始方法，没有任何额外开销；
+    # 开启时把登记的方法替换为计时包装，关闭时再换回来
+    def __init__(self):
+        self.enabled = False
+        self.targets = []  # (类, 方法名)
+        self.originals = {}  # (类, 方法名) -> 类字典中原有的属性（没有时为None）
+        self.stats = {}
+        self.started_at = None
+        self.lock = threading.Lock()  # 数据库方法会在后台线程上调用
+
+    def register(self, cls, names):
+        for name in names:
+            if (cls, name) not in self.targets:
+                self.targets.append((cls, name))
+                if self.enabled:
+                    self._patch(cls, name)
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started_at = time.time()
+        for cls, name in self.targets:
+            self._patch(cls, name)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for (cls, name), original in self.originals.items():
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+        self.originals.clear()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.started_at = time.time()
+
+    def _patch(self, cls, name):
+        original = cls.__dict__.get(name)
+        self.originals[(cls, name)] = original
+        setattr(cls, name, self._wrap(f'{cls.__name__}.{name}', getattr(cls, name)))
+
+    def _wrap(self, key, func):
+        perf_counter = time.perf_counter
+        record = self.record
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(key, perf_counter() - start)
+        return wrapper
+
+    def record(self, key, seconds):
+        with self.lock:
+            histogram = self.stats.get(key)
+            if histogram is None:
+                histogram = self.stats[key] = Histogram()
+            histogram.add(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {key: histogram.to_dict() for key, histogram in self.stats.items()}
+
+    def dump(self, path):
+        report = {
+            'started_at': self.started_at,
+            'duration_s': time.time() - self.started_at if self.started_at else 0.0,
+            'stats': self.snapshot(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+profiler = Profiler()
+
+
+def enabled_from_env():
+    return os.environ.get(PROFILE_ENV) == '1'
+
+
+class StatsOverlay(QWidget):
+    # 屏幕角落的半透明统计面板，按累计耗时排序显示各热点方法
+    def __init__(self, source=profiler, interval=500, rows=12):
+        super().__init__(None)
+        self.source = source
+        self.rows = rows
+        self.lines = []
+        self.setWindowFlags(Qt.WindowType.Tool | Qt.WindowType.FramelessWindowHint |
+                            Qt.WindowType.WindowStaysOnTopHint)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
+        self.text_font = QFont('Consolas', 9)
+        self.text_font.setStyleHint(QFont.StyleHint.Monospace)
+        self.line_height = QFontMetrics(self.text_font).height() + 2
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.refresh)
+        self.resize(520, self.line_height * (self.rows + 1) + 12)
+        screen = QApplication.primaryScreen().availableGeometry()
+        self.move(screen.topLeft() + QPoint(10, 60))
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+
+    def refresh(self):
+        stats = sorted(self.source.snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        self.lines = [f"{'方法':<34}{'次数':>7}{'平均ms':>9}{'p95':>8}{'最大':>8}"]
+        for key, stat in stats[:self.rows]:
+            self.lines.append(f"{key[:34]:<34}{stat['count']:>7}{stat['avg_ms']:>9.3f}"
+                              f"{stat['p95_ms']:>8.2f}{stat['max_ms']:>8.1f}")
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 180))
+        painter.drawRoundedRect(QRectF(self.rect()), 6, 6)
+        painter.setFont(self.text_font)
+        painter.setPen(QColor('#E0E0E0'))
+        for row, line in enumerate(self.lines):
+            painter.drawText(8, 6 + self.line_height * (row + 1) - 4, line)
+        painter.end()
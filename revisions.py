@@ -0,0 +1,106 @@
+import struct
+import zlib
+
+# 每隔多少个版本保存一次完整快照，读取任意版本最多回放这么多个差量
+SNAPSHOT_INTERVAL = 50
+# 超过这个字节数的文本才压缩
+COMPRESS_MIN_BYTES = 256
+
+# notes表中超过这个字数的内容压缩后以BLOB保存，编码与快照相同；较短的保持为TEXT
+CONTENT_COMPRESS_CHARS = 4096
+# 全文索引只收录内容的前这么多个字：整篇重建trigram索引每MB要数秒，而且在数据库锁内完成
+FTS_INDEX_CHARS = 20000
+
+KIND_SNAPSHOT = 0
+KIND_DELTA = 1
+
+_DELTA_HEADER = struct.Struct('<II')
+
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return b'\x01' + compressed
+    return b'\x00' + data
+
+
+def _unpack_text(blob):
+    data = blob[1:]
+    if blob[:1] == b'\x01':
+        data = zlib.decompress(data)
+    return data.decode('utf-8')
+
+
+def _common_prefix(a, b):
+    # 二分比较切片，长文本也只需要在C层比较O(log n)次
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _common_suffix(a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def encode_snapshot(text):
+    return _pack_text(text)
+
+
+def decode_snapshot(blob):
+    return _unpack_text(bytes(blob))
+
+
+def pack_content(text):
+    if text is not None and len(text) >= CONTENT_COMPRESS_CHARS:
+        return _pack_text(text)
+    return text
+
+
+def unpack_content(value):
+    # TEXT原样返回，BLOB解压；同时注册为SQL函数note_text，供全文索引的触发器使用
+    if isinstance(value, bytes):
+        return _unpack_text(value)
+    return value
+
+
+def index_text(value):
+    # 注册为SQL函数note_index_text：内容的前FTS_INDEX_CHARS个字，压缩的内容只解压需要的部分
+    if isinstance(value, bytes):
+        # UTF-8每个字最多4字节，多取4字节保证截断的半个字之前至少有FTS_INDEX_CHARS个字
+        limit = FTS_INDEX_CHARS * 4 + 4
+        data = value[1:limit + 1]
+        if value[:1] == b'\x01':
+            data = zlib.decompressobj().decompress(value[1:], limit)
+        return data.decode('utf-8', 'ignore')[:FTS_INDEX_CHARS]
+    if value is not None:
+        return value[:FTS_INDEX_CHARS]
+    return value
+
+
+def encode_delta(old, new):
+    # 便签的一次保存通常只改动一处：记录相同的前缀、后缀长度和中间替换的文本
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    middle = new[prefix:len(new) - suffix]
+    return _DELTA_HEADER.pack(prefix, suffix) + _pack_text(middle)
+
+
+def apply_delta(old, blob):
+    blob = bytes(blob)
+    prefix, suffix = _DELTA_HEADER.unpack_from(blob)
+    middle = _unpack_text(blob[_DELTA_HEADER.size:])
+    return old[:prefix] + middle + old[len(old) - suffix:]
@@ -0,0 +1,150 @@
+import random
+from PyQt6.QtCore import QObject, QPoint, QRect, QTimer, pyqtSignal
+from PyQt6.QtGui import QCursor
+from PyQt6.QtWidgets import QApplication
+
+# 拖动或恢复时便签至少保留在屏幕内的像素
+VISIBLE_MARGIN = 50
+# 新便签与屏幕可用区域边缘的距离
+PLACE_MARGIN = 50
+# 多个便签移到同一屏幕时依次错开的距离
+CASCADE_OFFSET = 30
+CASCADE_STEPS = 10
+
+
+def distance(rect, point):
+    # 点到矩形的距离的平方，点在矩形内时为0
+    dx = max(rect.left() - point.x(), 0, point.x() - rect.right())
+    dy = max(rect.top() - point.y(), 0, point.y() - rect.bottom())
+    return dx * dx + dy * dy
+
+
+def overlap_area(a, b):
+    intersection = a.intersected(b)
+    return intersection.width() * intersection.height()
+
+
+class ScreenInfo:
+    __slots__ = ('geometry', 'available')
+
+    def __init__(self, geometry, available):
+        self.geometry = geometry
+        self.available = available
+
+
+class ScreenLayout(QObject):
+    # 缓存整个虚拟桌面的屏幕布局，屏幕增减或几何变化时失效；
+    # 拖动、放置和恢复便签时都从缓存读取，不再逐次查询屏幕
+
+    # 布局变化后发出，同一轮事件循环内的多次变化合并为一次
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.info = None
+        self.version = 0
+        self.notify_timer = QTimer(self)
+        self.notify_timer.setSingleShot(True)
+        self.notify_timer.setInterval(0)
+        self.notify_timer.timeout.connect(self.changed)
+        app = QApplication.instance()
+        app.screenAdded.connect(self.on_screen_added)
+        app.screenRemoved.connect(lambda screen: self.invalidate())
+        for screen in app.screens():
+            self.watch(screen)
+
+    def watch(self, screen):
+        screen.geometryChanged.connect(lambda rect: self.invalidate())
+        screen.availableGeometryChanged.connect(lambda rect: self.invalidate())
+
+    def on_screen_added(self, screen):
+        self.watch(screen)
+        self.invalidate()
+
+    def invalidate(self):
+        self.info = None
+        self.version += 1
+        self.notify_timer.start()
+
+    def screens(self):
+        if self.info is None:
+            self.info = [ScreenInfo(screen.geometry(), screen.availableGeometry())
+                         for screen in QApplication.screens()]
+        return self.info
+
+    def virtual_geometry(self):
+        rect = QRect()
+        for info in self.screens():
+            rect = rect.united(info.geometry)
+        return rect
+
+    def is_on_screen(self, rect):
+        return any(info.geometry.intersects(rect) for info in self.screens())
+
+    def screen_at(self, point):
+        # 包含该点的屏幕，不在任何屏幕内时取最近的
+        screens = self.screens()
+        if not screens:
+            return None
+        return min(screens, key=lambda info: distance(info.geometry, point))
+
+    def screen_for(self, rect):
+        # 与矩形重叠最多的屏幕，都不重叠时取离矩形中心最近的
+        screens = self.screens()
+        if not screens:
+            return None
+        best = max(screens, key=lambda info: overlap_area(info.geometry, rect))
+        if overlap_area(best.geometry, rect) > 0:
+            return best
+        return self.screen_at(rect.center())
+
+    def clamp_position(self, rect, margin=VISIBLE_MARGIN):
+        # 拖动时的位置限制：便签至少有margin像素留在它所在的屏幕内
+        info = self.screen_for(rect)
+        if info is None:
+            return rect.topLeft()
+        bounds = info.geometry
+        x = max(bounds.left() - rect.width() + margin, min(rect.x(), bounds.left() + bounds.width() - margin))
+        y = max(bounds.top() - rect.height() + margin, min(rect.y(), bounds.top() + bounds.height() - margin))
+        return QPoint(x, y)
+
+    def fit_position(self, rect, info=None, index=0):
+        # 把矩形完整地放进屏幕的可用区域，index用于多个便签依次错开
+        info = info or self.screen_for(rect)
+        if info is None:
+            return rect.topLeft()
+        bounds = info.available
+        right = bounds.left() + bounds.width() - rect.width()
+        bottom = bounds.top() + bounds.height() - rect.height()
+        x = min(max(rect.x(), bounds.left()), right)
+        y = min(max(rect.y(), bounds.top()), bottom)
+        offset = index % CASCADE_STEPS * CASCADE_OFFSET
+        if offset:
+            x = x + offset if x + offset <= right else x - offset
+            y = y + offset if y + offset <= bottom else y - offset
+        return QPoint(max(x, bounds.left()), max(y, bounds.top()))
+
+    def screen_under_cursor(self):
+        return self.screen_at(QCursor.pos())
+
+    def random_position(self, size):
+        # 新便签随机放在鼠标所在屏幕的可用区域内
+        info = self.screen_under_cursor()
+        if info is None:
+            return QPoint(PLACE_MARGIN, PLACE_MARGIN)
+        bounds = info.available
+        x = random.randint(bounds.left() + PLACE_MARGIN,
+                           max(bounds.left() + PLACE_MARGIN, bounds.left() + bounds.width() - size.width() - PLACE_MARGIN))
+        y = random.randint(bounds.top() + PLACE_MARGIN,
+                           max(bounds.top() + PLACE_MARGIN, bounds.top() + bounds.height() - size.height() - PLACE_MARGIN))
+        return QPoint(x, y)
+
+
+_screen_layout = None
+
+
+def screen_layout():
+    global _screen_layout
+    if _screen_layout is None:
+        _screen_layout = ScreenLayout(QApplication.instance())
+    return _screen_layout
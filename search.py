@@ -0,0 +1,40 @@
+import threading
+import time
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class NoteSearcher(QObject):
+    # 搜索完成后在界面线程收到：(查询文本, 便签id列表, 耗时毫秒)
+    results_ready = pyqtSignal(str, list, float)
+
+    def __init__(self, db, limit=200, sync=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.limit = limit
+        self.sync = sync  # 查询前在搜索线程上调用，等待已提交的自动保存写完
+        self.pending = None  # 只保留最新的查询，输入过程中的旧查询直接丢弃
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._search_loop, name='note-search', daemon=True)
+        self.thread.start()
+
+    def search(self, query):
+        with self.condition:
+            self.pending = query
+            self.condition.notify()
+
+    def _search_loop(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                query = self.pending
+                self.pending = None
+            start = time.perf_counter()
+            try:
+                if self.sync is not None:
+                    self.sync()
+                note_ids = self.db.search_notes(query, self.limit)
+            except Exception as e:
+                print(f"搜索便签失败: {e}")
+                note_ids = []
+            self.results_ready.emit(query, note_ids, (time.perf_counter() - start) * 1000)
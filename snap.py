@@ -0,0 +1,112 @@
+from PyQt6.QtCore import QRect, Qt
+from PyQt6.QtGui import QPainter, QPen
+from PyQt6.QtWidgets import QWidget
+import theme
+from arrange import rect_tuple
+
+# 边缘相距不超过这个距离时吸附（像素）
+SNAP_DISTANCE = 10
+# 只考虑这个范围内的便签，用于对齐和贴靠
+NEIGHBOR_RANGE = 100
+
+
+def snap_axis(start, length, bounds_start, bounds_length, neighbours, axis, distance):
+    # 一个方向（axis为0时水平，1时垂直）上最近的吸附位置：(新的起点, 参考线坐标, 参考的便签)，
+    # 超出distance时返回None；屏幕边缘没有参考线
+    best = None
+    best_offset = distance + 1
+    if bounds_length is not None:
+        for target in (bounds_start, bounds_start + bounds_length - length):
+            offset = abs(target - start)
+            if offset < best_offset:
+                best, best_offset = (target, None, None), offset
+    end = start + length
+    for rect in neighbours:
+        near = rect[axis]
+        far = near + rect[axis + 2]
+        # 起点对齐或贴在对方的终点，终点贴在对方的起点或对齐
+        for edge, target in ((near, near), (far, far), (near, near - length), (far, far - length)):
+            offset = abs(target - start)
+            if offset < best_offset:
+                best, best_offset = (target, edge, rect), offset
+    return best
+
+
+def snap_rect(rect, neighbours, bounds=None, distance=SNAP_DISTANCE):
+    # 吸附到屏幕边缘和附近便签的边，两个方向分别选最近的；
+    # 返回 (x, y, 参考线)，参考线为 (x1, y1, x2, y2) 的列表
+    x, y, w, h = rect
+    bx, by, bw, bh = bounds if bounds is not None else (None, None, None, None)
+    snap_x = snap_axis(x, w, bx, bw, neighbours, 0, distance)
+    snap_y = snap_axis(y, h, by, bh, neighbours, 1, distance)
+    if snap_x is not None:
+        x = snap_x[0]
+    if snap_y is not None:
+        y = snap_y[0]
+    guides = []
+    if snap_x is not None and snap_x[2] is not None:
+        other = snap_x[2]
+        guides.append((snap_x[1], min(y, other[1]), snap_x[1], max(y + h, other[1] + other[3])))
+    if snap_y is not None and snap_y[2] is not None:
+        other = snap_y[2]
+        guides.append((min(x, other[0]), snap_y[1], max(x + w, other[0] + other[2]), snap_y[1]))
+    return x, y, guides
+
+
+class Snapper:
+    # 拖动期间每帧调用一次：从空间索引中取附近的便签，不遍历全部便签
+    def __init__(self, grid, key, layout):
+        self.grid = grid
+        self.key = key
+        self.layout = layout
+
+    def snap(self, rect):
+        neighbours = [self.grid.rects[key] for key in self.grid.nearby(rect, NEIGHBOR_RANGE, self.key)]
+        info = self.layout.screen_for(QRect(*rect))
+        return snap_rect(rect, neighbours, rect_tuple(info.available) if info is not None else None)
+
+
+class SnapGuides(QWidget):
+    # 对齐参考线：一个不接收输入的透明窗口，大小只覆盖参考线所在的范围
+    def __init__(self):
+        super().__init__(None)
+        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint
+                            | Qt.WindowType.Tool | Qt.WindowType.WindowTransparentForInput)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
+        self.guides = []
+
+    def show_guides(self, guides):
+        # 参考线不变时不做任何事，拖动时大多数帧都是这种情况
+        if guides == self.guides:
+            return
+        self.guides = guides
+        if not guides:
+            self.hide()
+            return
+        left = min(min(guide[0], guide[2]) for guide in guides) - 1
+        top = min(min(guide[1], guide[3]) for guide in guides) - 1
+        right = max(max(guide[0], guide[2]) for guide in guides) + 1
+        bottom = max(max(guide[1], guide[3]) for guide in guides) + 1
+        self.setGeometry(left, top, right - left + 1, bottom - top + 1)
+        self.update()
+        self.show()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        pen = QPen(theme.color(theme.GUIDE_COLOR), 1, Qt.PenStyle.DashLine)
+        painter.setPen(pen)
+        origin_x, origin_y = self.x(), self.y()
+        for x1, y1, x2, y2 in self.guides:
+            painter.drawLine(x1 - origin_x, y1 - origin_y, x2 - origin_x, y2 - origin_y)
+
+
+_snap_guides = None
+
+
+def snap_guides():
+    global _snap_guides
+    if _snap_guides is None:
+        _snap_guides = SnapGuides()
+    return _snap_guides
@@ -0,0 +1,85 @@
+# 便签矩形的空间索引，放置、排列和吸附时查询附近的便签
+# 矩形统一用 (x, y, 宽, 高) 元组，右边和下边不含
+
+# 网格边长与便签的常见尺寸相当，一个便签通常只登记在几个格子里
+DEFAULT_CELL_SIZE = 256
+
+
+def intersects(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+class SpatialGrid:
+    # 均匀网格：矩形按覆盖的格子登记，查询只检查相关格子里的矩形，
+    # 耗时与附近的矩形数量有关，与总数无关
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (列, 行) -> 键的集合
+        self.rects = {}  # 键 -> 矩形
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, key):
+        return key in self.rects
+
+    def cell_keys(self, rect):
+        size = self.cell_size
+        x, y, w, h = rect
+        for cx in range(x // size, (x + max(w, 1) - 1) // size + 1):
+            for cy in range(y // size, (y + max(h, 1) - 1) // size + 1):
+                yield cx, cy
+
+    def insert(self, key, rect):
+        old = self.rects.get(key)
+        if old == rect:
+            return
+        if old is not None:
+            self.remove(key)
+        self.rects[key] = rect
+        cells = self.cells
+        for cell in self.cell_keys(rect):
+            keys = cells.get(cell)
+            if keys is None:
+                cells[cell] = {key}
+            else:
+                keys.add(key)
+
+    def remove(self, key):
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self.cell_keys(rect):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.rects.clear()
+
+    def candidates(self, rect):
+        # 与矩形所在格子相同的键，可能并不相交
+        found = set()
+        cells = self.cells
+        for cell in self.cell_keys(rect):
+            keys = cells.get(cell)
+            if keys:
+                found.update(keys)
+        return found
+
+    def query(self, rect, exclude=None):
+        # 与矩形相交的键
+        rects = self.rects
+        return [key for key in self.candidates(rect) if key != exclude and intersects(rects[key], rect)]
+
+    def hits(self, rect, exclude=None):
+        # 与矩形相交的矩形
+        return [self.rects[key] for key in self.query(rect, exclude)]
+
+    def nearby(self, rect, distance, exclude=None):
+        # 与矩形距离不超过distance的键
+        x, y, w, h = rect
+        return self.query((x - distance, y - distance, w + 2 * distance, h + 2 * distance), exclude)
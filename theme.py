@@ -0,0 +1,44 @@
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QColor, QPalette
+
+# 应用级样式表，只在启动时解析一次；颜色不写在样式表里，
+# 而是通过调色板和便签自绘设置，改颜色时不需要重新解析样式表
+APP_STYLESHEET = """
+    QTextEdit#noteText {
+        background-color: transparent;
+        border: none;
+        padding: 5px;
+    }
+"""
+
+NOTE_BORDER_COLOR = '#CCCCCC'
+NOTE_BORDER_RADIUS = 5
+HIGHLIGHT_COLOR = '#FF9800'
+GUIDE_COLOR = '#2196F3'  # 拖动时的对齐参考线
+
+_installed = False
+_colors = {}
+
+
+def install_app_stylesheet(app=None):
+    global _installed
+    if _installed:
+        return
+    app = app or QApplication.instance()
+    app.setStyleSheet(app.styleSheet() + APP_STYLESHEET)
+    _installed = True
+
+
+def color(name):
+    # 复用解析过的颜色对象
+    value = _colors.get(name)
+    if value is None:
+        value = _colors[name] = QColor(name)
+    return value
+
+
+def set_text_color(widget, name):
+    # 只修改调色板的文字颜色，不触发样式表解析
+    palette = widget.palette()
+    palette.setColor(QPalette.ColorRole.Text, color(name))
+    widget.setPalette(palette)